@@ -0,0 +1,168 @@
+import numpy as np
+
+from connection import get_client
+from helpers import projection, scan_pages
+from metrics import metered
+from single_table.PlayerDAOV2 import PLAYER_NAME, PLAYER_SORT_KEY_PREFIX, SALARY, PlayerRecord
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME, TEAM_NAME, get_team_name
+from single_table.TeamDAOV2 import TEAM_SORT_KEY, WINS, TeamRecord
+from single_table.TeamSummaryPageDAO import SUMMARY_ATTRIBUTES
+from throttle import throttled
+from wire import RawTable
+
+# Payroll statistics across the league. Working these out over lists of records means a Python loop and a Decimal per
+# player for every statistic. Instead pages of items are loaded into NumPy arrays as they arrive, a team code (int32)
+# and an int64 salary per player plus the wins per team, and every statistic is a handful of array operations:
+#
+#   stats = PayrollStats.from_table(session)  # Scans the single table a page at a time, needs numpy (pip install numpy)
+#   stats.payroll()                           # {"Phillies": 31770001, ...}
+#   stats.top_k(3)                            # {"Phillies": [("P59", 559000), ...], ...}
+#   stats.salary_per_win()                    # [("Marlins", 61250.0), ...], cheapest wins first
+#
+# Running totals are updated per page, so payroll() and friends work on a stream of pages of any length. Medians and
+# top k need every salary, which are kept as the arrays themselves (12 bytes per player plus the name).
+
+_NO_WINS = np.nan  # Teams whose team item we haven't seen (yet)
+
+
+class PayrollStats():
+    def __init__(self):
+        self.team_names = []  # Team code -> name
+        self._team_codes = {}  # Team name -> code
+        self._wins = np.empty(0, dtype=np.float64)  # By team code, float so that missing wins can be NaN
+        self._payroll = np.empty(0, dtype=np.int64)  # Running totals by team code
+        self._player_counts = np.empty(0, dtype=np.int64)
+        self._chunks = []  # (team codes, salaries, player names) per page
+        self._sorted = None  # The chunks joined and sorted by team then salary, built when first needed
+
+    @classmethod
+    def from_table(cls, session, page_size=None):
+        # Scans the single table through the low level client, so numbers stay the strings Dynamo sent and go straight
+        # into the arrays without becoming Decimals first
+        stats = cls()
+        table = throttled(metered(RawTable(get_client(session), TABLE_NAME)))
+        scan_kwargs = {'Limit': page_size} if page_size else {}
+        for page in scan_pages(table, **projection(*SUMMARY_ATTRIBUTES), **scan_kwargs):
+            stats.add_wire_page(page)
+        return stats
+
+    def add_wire_page(self, items):
+        # A page of single table items in the wire format, from a scan or a query of the low level client
+        teams, player_names, salaries = [], [], []
+        for item in items:
+            sort_key = item[SORT_KEY]['S']
+            if sort_key.startswith(PLAYER_SORT_KEY_PREFIX):
+                teams.append(item[TEAM_NAME]['S'])
+                player_names.append(item[PLAYER_NAME]['S'])
+                salaries.append(item[SALARY]['N'])
+            elif sort_key == TEAM_SORT_KEY and WINS in item:
+                self.set_wins(item[TEAM_NAME]['S'], int(item[WINS]['N']))
+        self.add_players(teams, np.array(salaries, dtype=str).astype(np.int64), player_names)
+
+    def add_records(self, records):
+        # TeamRecords and PlayerRecords from the DAOs, for example a TeamSummaryPageDAO.iter_by_team
+        players = []
+        for record in records:
+            if isinstance(record, PlayerRecord):
+                players.append(record)
+            elif isinstance(record, TeamRecord) and record.wins is not None:
+                self.set_wins(record.team, int(record.wins))
+        self.add_players([player.team for player in players], np.array([int(player.salary) for player in players], dtype=np.int64),
+                         [player.player_name for player in players])
+
+    def set_wins(self, team_name, wins):
+        code = self._get_code(get_team_name(team_name))  # Before indexing, a new team grows the arrays
+        self._wins[code] = wins
+
+    def add_players(self, team_names, salaries, player_names=None):
+        # team_names and salaries (and player_names, if given) are one per player. Team names can be shard partition
+        # keys, each distinct name is only looked up once.
+        salaries = np.asarray(salaries, dtype=np.int64)
+        if not len(salaries):
+            return
+        unique_names, inverse = np.unique(np.asarray(team_names, dtype=str), return_inverse=True)
+        codes = np.array([self._get_code(get_team_name(name)) for name in unique_names.tolist()], dtype=np.int32)[inverse]
+
+        np.add.at(self._payroll, codes, salaries)  # Unlike bincount's float weights this stays exact in int64
+        self._player_counts += np.bincount(codes, minlength=len(self.team_names))
+        names = np.empty(len(codes), dtype=object)
+        if player_names is not None:
+            names[:] = player_names
+        self._chunks.append((codes, salaries, names))
+        self._sorted = None
+
+    # Statistics, all by team name
+
+    def payroll(self):
+        return self._by_team(self._payroll)
+
+    def player_counts(self):
+        return self._by_team(self._player_counts)
+
+    def mean_salary(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._by_team(self._payroll / self._player_counts, players_only=True)
+
+    def median_salary(self):
+        codes, salaries, _ = self._get_sorted()
+        counts = self._player_counts
+        starts = np.cumsum(counts) - counts  # Where each team's salaries start in the sorted arrays
+        has_players = counts > 0
+        low = (starts + (counts - 1) // 2)[has_players]
+        high = (starts + counts // 2)[has_players]
+        medians = np.full(len(counts), np.nan)
+        medians[has_players] = (salaries[low] + salaries[high]) / 2
+        return self._by_team(medians, players_only=True)
+
+    def top_k(self, k):
+        # The k highest paid players of each team as (player_name, salary), highest first
+        codes, salaries, names = self._get_sorted()
+        ends = np.cumsum(self._player_counts)
+        rank = ends[codes] - 1 - np.arange(len(codes))  # 0 for a team's highest paid, salaries are sorted ascending
+        selected = np.flatnonzero(rank < k)[::-1]
+        top = {self.team_names[code]: [] for code in np.unique(codes[selected])}
+        for code, name, salary in zip(codes[selected].tolist(), names[selected], salaries[selected].tolist()):
+            top[self.team_names[code]].append((name, salary))
+        return top
+
+    def salary_per_win(self):
+        # Payroll divided by wins for every team with wins, cheapest wins first
+        has_wins = self._wins > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            per_win = self._payroll / self._wins
+        codes = np.flatnonzero(has_wins)
+        codes = codes[np.argsort(per_win[codes], kind='stable')]
+        return [(self.team_names[code], value) for code, value in zip(codes.tolist(), per_win[codes].tolist())]
+
+    def columns(self):
+        # The raw arrays (team codes, salaries, player names, sorted by team then salary) and wins by team code, for
+        # anything the methods above don't cover
+        codes, salaries, names = self._get_sorted()
+        return {"team_names": np.array(self.team_names, dtype=object), "team_codes": codes, "salaries": salaries,
+                "player_names": names, "wins": self._wins}
+
+    def _get_code(self, team_name):
+        code = self._team_codes.get(team_name)
+        if code is None:
+            code = self._team_codes[team_name] = len(self.team_names)
+            self.team_names.append(team_name)
+            self._wins = np.append(self._wins, _NO_WINS)
+            self._payroll = np.append(self._payroll, np.int64(0))
+            self._player_counts = np.append(self._player_counts, np.int64(0))
+        return code
+
+    def _get_sorted(self):
+        if self._sorted is None:
+            if self._chunks:
+                codes, salaries, names = (np.concatenate(column) for column in zip(*self._chunks))
+            else:
+                codes, salaries, names = np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, object)
+            order = np.lexsort((salaries, codes))
+            self._sorted = codes[order], salaries[order], names[order]
+            self._chunks = [self._sorted]  # Keep the one sorted copy instead of the pages
+        return self._sorted
+
+    def _by_team(self, values, players_only=False):
+        values = values.tolist()
+        return {name: value for name, value, count in zip(self.team_names, values, self._player_counts.tolist())
+                if count or not players_only}
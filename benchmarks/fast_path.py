@@ -0,0 +1,52 @@
+import argparse
+import timeit
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from single_table.PlayerDAOV2 import PLAYER_NAME, SALARY, PlayerDAOV2
+from single_table.SingleTableDAO import TEAM_NAME, SORT_KEY
+from single_table.TeamDAOV2 import TEAM_SORT_KEY, WINS
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+
+# Compares decoding a team summary page the way the boto3 resource does it (TypeDeserializer on every attribute, then
+# TeamSummaryPageDAO._from_dynamo_item) with the fast_path decoding straight from the wire format. Both start from the
+# same parsed JSON response, so the network and the HTTP parsing are left out of the comparison.
+#   python -m benchmarks.fast_path --players 1000
+
+
+def make_page(players):
+    items = [{TEAM_NAME: {'S': "Phillies"}, SORT_KEY: {'S': TEAM_SORT_KEY}, WINS: {'N': "81"}}]
+    for i in range(players):
+        salary = 500000 + i * 1000
+        items.append({
+            TEAM_NAME: {'S': "Phillies"},
+            SORT_KEY: {'S': PlayerDAOV2._get_sort_key(salary)},
+            PLAYER_NAME: {'S': "Player %s" % i},
+            SALARY: {'N': str(salary)},
+        })
+    return items
+
+
+def resource_path(items, deserializer=TypeDeserializer()):
+    return TeamSummaryPageDAO._from_dynamo_item(
+        [{k: deserializer.deserialize(v) for k, v in item.items()} for item in items])
+
+
+def fast_path(items):
+    return TeamSummaryPageDAO._from_wire_item(items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resource vs low level client decoding of a team summary page")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    items = make_page(args.players)
+    assert resource_path(items) == fast_path(items)
+
+    resource_time = min(timeit.repeat(lambda: resource_path(items), number=1, repeat=args.repeat))
+    fast_time = min(timeit.repeat(lambda: fast_path(items), number=1, repeat=args.repeat))
+    print("resource path: %.2fms" % (resource_time * 1000))
+    print("fast path:     %.2fms" % (fast_time * 1000))
+    print("speedup:       %.1fx" % (resource_time / fast_time))
@@ -0,0 +1,213 @@
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import time
+
+import metrics
+from cache import LRUCache
+from local_dynamodb import LocalDynamoDB, LocalSession
+from multitable.PlayerDAO import PlayerDAO
+from multitable.TeamDAO import TeamDAO
+from provision import TABLE_SPECS
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.TeamDAOV2 import TeamDAOV2
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+
+# Reproducible benchmarks for the DAOs, run against local_dynamodb so they need no AWS account and give the same request
+# counts every run. `latency` is added to every request to stand in for the network round trip.
+#   python -m benchmarks.run --output bench.json
+# Results are written as JSON so that CI can compare them between runs.
+
+def make_session(args):
+    dynamo = LocalDynamoDB(latency=args.latency, seed=args.seed)
+    client = LocalSession(dynamo).client('dynamodb')
+    for table_name, spec in TABLE_SPECS.items():
+        client.create_table(TableName=table_name, **spec)
+    dynamo.calls.clear()
+    return dynamo, LocalSession(dynamo)
+
+
+def make_league(args):
+    teams = [("Team %s" % t, 60 + t % 50) for t in range(args.teams)]
+    players = [("Player %s-%s" % (t, p), 500000 + p * 100000, teams[t][0])
+               for t in range(args.teams) for p in range(args.players)]
+    return teams, players
+
+
+def measure(dynamo, function, operations=1):
+    calls = dynamo.calls.copy()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "ms_per_operation": seconds * 1000 / operations,
+        "requests": sum((dynamo.calls - calls).values()),
+    }
+
+
+def bench_writes(args):
+    # One put_item per player vs BatchWriteItem
+    teams, players = make_league(args)
+    results = {}
+    for name, write in (("write", lambda dao: [dao.write(*player) for player in players]),
+                        ("write_many", lambda dao: dao.write_many(players))):
+        dynamo, session = make_session(args)
+        results[name] = measure(dynamo, lambda: write(PlayerDAOV2(session)), len(players))
+        results[name]["items_per_second"] = len(players) / results[name]["seconds"]
+    return results
+
+
+def bench_cached_reads(args):
+    # Summary page reads straight from Dynamo (cold) vs from a warm LRUCache
+    dynamo, session = make_session(args)
+    teams, players = make_league(args)
+    TeamDAOV2(session).write_many(teams)
+    PlayerDAOV2(session).write_many(players)
+
+    cache = LRUCache()
+    summary_table = TeamSummaryPageDAO(session, cache=cache)
+    team_names = [team[0] for team in teams]
+    results = {
+        "cold": measure(dynamo, lambda: [summary_table.read(team_name) for team_name in team_names], len(team_names)),
+        "warm": measure(dynamo, lambda: [summary_table.read(team_name) for team_name in team_names], len(team_names)),
+    }
+    results["cache"] = cache.stats()
+    return results
+
+
+def bench_summary_page(args):
+    # What one summary page costs, through the boto3 resource and through the fast path
+    dynamo, session = make_session(args)
+    teams, players = make_league(args)
+    TeamDAOV2(session).write_many(teams)
+    PlayerDAOV2(session).write_many(players)
+
+    results = {}
+    for name, fast_path in (("resource", False), ("fast_path", True)):
+        summary_table = TeamSummaryPageDAO(session, fast_path=fast_path)
+        results[name] = measure(dynamo, lambda: [summary_table.read(team[0]) for team in teams], len(teams))
+        results[name]["items_per_page"] = args.players + 1
+    return results
+
+
+def bench_multitable_vs_single_table(args):
+    # The multitable design needs two requests for a summary page, the single table design one
+    dynamo, session = make_session(args)
+    teams, players = make_league(args)
+    TeamDAO(session).write_many(teams)
+    PlayerDAO(session).write_many(players)
+    TeamDAOV2(session).write_many(teams)
+    PlayerDAOV2(session).write_many(players)
+
+    # Also record what each operation cost in capacity units
+    sink = metrics.InMemorySink()
+    metrics.set_sink(sink)
+    try:
+        team_table, player_table = TeamDAO(session), PlayerDAO(session)
+        summary_table = TeamSummaryPageDAO(session)
+        team_names = [team[0] for team in teams]
+        return {
+            "multitable": measure(dynamo, lambda: [(team_table.read(team_name), player_table.get_by_team(team_name))
+                                                   for team_name in team_names], len(team_names)),
+            "single_table": measure(dynamo, lambda: [summary_table.read(team_name) for team_name in team_names],
+                                    len(team_names)),
+            "operations": sink.summary(),
+        }
+    finally:
+        metrics.set_sink(None)
+
+
+def bench_sharding(args):
+    # Summary pages for teams written unsharded and over 4 shards. Sharding costs a request per shard (plus one for the
+    # team item), but they run in parallel, so a page stays within a round trip or so of an unsharded one while each of
+    # a hot team's partitions takes a quarter of its reads and writes.
+    teams, players = make_league(args)
+    results = {}
+    for name, shards in (("unsharded", 1), ("4_shards", 4)):
+        dynamo, session = make_session(args)
+        TeamDAOV2(session).write_many(teams)
+        PlayerDAOV2(session, shards=shards).write_many(players)
+        summary_table = TeamSummaryPageDAO(session, shards=shards)
+        results[name] = measure(dynamo, lambda: [summary_table.read(team[0]) for team in teams], len(teams))
+    return results
+
+
+def bench_materialized_summary(args):
+    # A summary page from a query of the whole partition vs one get_item of the summary kept on the team item, which
+    # costs a transaction per write instead
+    teams, players = make_league(args)
+    dynamo, session = make_session(args)
+    results = {
+        "summary_writes": measure(dynamo, lambda: (TeamDAOV2(session, summary=True).write_many(teams),
+                                                   PlayerDAOV2(session, summary=True).write_many(players)),
+                                  len(teams) + len(players)),
+    }
+    for name, summary in (("query", False), ("materialized", True)):
+        summary_table = TeamSummaryPageDAO(session, summary=summary)
+        results[name] = measure(dynamo, lambda: [summary_table.read(team[0]) for team in teams], len(teams))
+    return results
+
+
+def bench_analytics(args):
+    # Payroll, median and salary per win for every team, from DAO records with Python and Decimals vs NumPy arrays
+    # loaded from a scan (see analytics.py)
+    from analytics import PayrollStats  # Needs numpy
+    dynamo, session = make_session(args)
+    teams, players = make_league(args)
+    TeamDAOV2(session).write_many(teams)
+    PlayerDAOV2(session).write_many(players)
+
+    def python_stats():
+        team_table, player_table = TeamDAOV2(session), PlayerDAOV2(session)
+        for team_name, _ in teams:
+            salaries = [player.salary for player in player_table.get_by_team(team_name)]
+            sum(salaries), statistics.median(salaries), sum(salaries) / team_table.read(team_name).wins
+
+    def numpy_stats():
+        stats = PayrollStats.from_table(session)
+        stats.payroll(), stats.median_salary(), stats.salary_per_win()
+
+    return {
+        "python": measure(dynamo, python_stats, len(teams)),
+        "numpy": measure(dynamo, numpy_stats, len(teams)),
+    }
+
+
+BENCHMARKS = {
+    "writes": bench_writes,
+    "cached_reads": bench_cached_reads,
+    "summary_page": bench_summary_page,
+    "multitable_vs_single_table": bench_multitable_vs_single_table,
+    "sharding": bench_sharding,
+    "materialized_summary": bench_materialized_summary,
+    "analytics": bench_analytics,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the DAOs against an in memory DynamoDB")
+    parser.add_argument("--teams", type=int, default=30)
+    parser.add_argument("--players", type=int, default=40, help="Players per team")
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds added to every request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append", help="Run only these benchmarks")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "parameters": {"teams": args.teams, "players": args.players, "latency": args.latency, "seed": args.seed},
+    }
+    with contextlib.redirect_stdout(sys.stderr):  # Keep the DAOs' progress messages out of the JSON
+        report["results"] = {name: BENCHMARKS[name](args) for name in (args.only or BENCHMARKS)}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
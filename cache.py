@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache():
+    # Teams and summary pages are read far more often than they change, and every get_item/query costs money and a network
+    # round trip. This is a small in process read-through cache that the DAOs can share.
+    #
+    # Entries are grouped by partition, for us (table name, team name), so that a write to any item in a team's partition
+    # can drop every cached view of that team (the team item and its summary page) in one call.
+    # Entries expire after ttl seconds, and the least recently used entries are evicted once max_bytes is exceeded.
+    #
+    # Loads happen outside the lock, so a read that started before a write can finish after the write invalidated the
+    # partition. Each partition has a generation that invalidate bumps: a load remembers the generation it started at and
+    # its value is only cached if that is still the current one, otherwise the stale value would live for the whole ttl.
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (partition, kind) -> (expires, size, value), oldest first
+        self._partitions = {}  # partition -> set of kinds cached for it
+        self._generations = {}  # partition -> times it has been invalidated
+        self._epoch = 0  # Times the whole cache has been cleared
+        self._lock = threading.Lock()
+
+    def get(self, partition, kind, loader):
+        value, generation = self._lookup(partition, kind)
+        if value is None:
+            # Load outside of the lock so a slow read doesn't block every other thread
+            value = loader()
+            if value is not None:
+                self.put(partition, kind, value, generation)
+        return value
+
+    def lookup(self, partition, kind):
+        # Returns None on a miss
+        return self._lookup(partition, kind)[0]
+
+    def _lookup(self, partition, kind):
+        # (value or None on a miss, the partition's generation)
+        key = (partition, kind)
+        with self._lock:
+            generation = self._get_generation(partition)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], generation
+            self.misses += 1
+            return None, generation
+
+    def put(self, partition, kind, value, generation=None):
+        # generation is the partition's generation when value was read, the put is skipped if it has been invalidated since
+        key = (partition, kind)
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._get_generation(partition):
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._partitions.setdefault(partition, set()).add(kind)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_many(self, partitions, kind, loader):
+        # loader is called once with the list of partitions that missed, and returns their values in the same order.
+        # A loader that returns None (it failed) counts as a miss for all of them.
+        values, generations = zip(*[self._lookup(partition, kind) for partition in partitions]) if partitions else ((), ())
+        values = list(values)
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            loaded = loader([partitions[i] for i in missing])
+            for i, value in zip(missing, loaded if loaded is not None else [None] * len(missing)):
+                values[i] = value
+                if value is not None:
+                    self.put(partitions[i], kind, value, generations[i])
+        return values
+
+    def invalidate(self, partition):
+        with self._lock:
+            self._generations[partition] = self._generations.get(partition, 0) + 1
+            for kind in list(self._partitions.get(partition, ())):
+                self._remove((partition, kind))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+            self._generations.clear()
+            self._epoch += 1  # Loads that started before the clear don't put their values back
+            self.size = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def _get_generation(self, partition):
+        return self._epoch, self._generations.get(partition, 0)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+            kinds = self._partitions[key[0]]
+            kinds.discard(key[1])
+            if not kinds:
+                del self._partitions[key[0]]
+
+    @staticmethod
+    def _estimate_size(value):
+        # A rough estimate, but cheap and good enough to keep the cache within its budget
+        return len(repr(value))
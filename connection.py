@@ -0,0 +1,61 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Creating a boto3 resource is surprisingly expensive: it loads and parses the service model and sets up its own
+# connection pool. Rather than every DAO calling session.resource('dynamodb'), they all share one resource per session
+# per thread (boto3 resources are not thread safe, so threads can't share one).
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/resources.html#multithreading-or-multiprocessing-with-resources
+
+_config_kwargs = dict(
+    max_pool_connections=50,  # The default of 10 is easily exhausted by the bulk loaders
+    tcp_keepalive=True,  # Keep idle connections open instead of paying for a new TLS handshake
+    retries={'mode': 'standard', 'max_attempts': 5},
+)
+_config = Config(**_config_kwargs)
+_local = threading.local()
+_lock = threading.Lock()  # Sessions are not thread safe either, so only build one thing from them at a time
+
+
+def configure(**config_kwargs):
+    # Override the botocore Config, for example configure(max_pool_connections=100, retries={'mode': 'adaptive'}).
+    # This only affects resources created afterwards, so call it before creating any DAOs.
+    global _config
+    _config_kwargs.update(config_kwargs)
+    _config = Config(**_config_kwargs)
+
+
+def make_session():
+    # A session for the command line scripts (load.py, export.py, provision.py), with the credentials from the environment.
+    # Call it once per thread that needs one, sessions are not thread safe.
+    return boto3.Session(
+        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+    )
+
+
+def get_resource(session):
+    resources = _local.__dict__.setdefault('resources', {})
+    if session not in resources:
+        with _lock:
+            resources[session] = session.resource('dynamodb', config=_config)
+    return resources[session]
+
+
+def get_async_resource(session):
+    # For the asyncio DAOs. session is an aioboto3.Session, and this returns an async context manager: the resource and
+    # its aiohttp connection pool live until the "async with" block exits, so open it once and share it between DAOs.
+    from aiobotocore.config import AioConfig  # Only needed (and installed) when using the asyncio DAOs
+    return session.resource('dynamodb', config=AioConfig(**_config_kwargs))
+
+
+def get_client(session):
+    # A plain low level client. Unlike get_resource(session).meta.client it does no (de)serialization of items, which is
+    # what the DAOs' fast_path mode relies on.
+    clients = _local.__dict__.setdefault('clients', {})
+    if session not in clients:
+        with _lock:
+            clients[session] = session.client('dynamodb', config=_config)
+    return clients[session]
@@ -0,0 +1,199 @@
+import argparse
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from connection import get_resource, make_session
+from helpers import projection, scan_pages
+from multitable.PlayerDAO import PLAYER_NAME as MULTITABLE_PLAYER_NAME, PLAYER_TABLE_NAME, PLAYER_TEAM, SALARY as MULTITABLE_SALARY, PlayerDAO
+from multitable.TeamDAO import TEAM_NAME as MULTITABLE_TEAM_NAME, TEAM_TABLE_NAME, WINS as MULTITABLE_WINS, TeamDAO
+from single_table.PlayerDAOV2 import PLAYER_SORT_KEY_PREFIX, PLAYER_TYPE, PlayerDAOV2
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME
+from single_table.TeamDAOV2 import TEAM_SORT_KEY, TEAM_TYPE, WINS, TeamDAOV2
+from single_table.TeamSummaryPageDAO import SUMMARY_ATTRIBUTES
+from throttle import throttled
+
+# Exports a table for analytics, for example:
+#   python export.py --table Baseball-abc123 --output league.ndjson.gz --segments 8
+#
+# Dynamo is built for the handful of queries an application makes, not for reading everything (see main.py), so the
+# way to get a table into an analytics store is a full Scan. A single Scan reads one page at a time, a parallel Scan
+# splits the table into segments that are read at the same time by a pool of threads.
+# Pages go through a bounded queue to a single writer, so memory stays at a few pages however big the table is, and the
+# scans slow down to the writer's pace instead of buffering.
+#
+# Every table is written with the same columns, the fields a record doesn't have are null:
+#   {"type": "Player", "team": "Phillies", "wins": null, "player_name": "Nick Williams", "salary": 555000}
+# Output is gzipped NDJSON (one JSON object per line), or Parquet with --format parquet, which needs pyarrow
+# (pip install pyarrow). The file is written under a temporary name next to the output and only renamed to it once every
+# segment has been scanned, so a failed export never leaves a partial file behind (or replaces a good one with it).
+
+COLUMNS = ("type", "team", "wins", "player_name", "salary")
+_DONE = object()  # Tells the writer that a segment has been scanned
+
+
+def _single_table_record(item):
+    if item[SORT_KEY] == TEAM_SORT_KEY and WINS in item:  # Without wins it is just a summary started by a player write
+        team = TeamDAOV2._from_dynamo_item(item)
+        return {"type": TEAM_TYPE, "team": team.team, "wins": team.wins}
+    if item[SORT_KEY].startswith(PLAYER_SORT_KEY_PREFIX):
+        player = PlayerDAOV2._from_dynamo_item(item)
+        return {"type": PLAYER_TYPE, "team": player.team, "player_name": player.player_name, "salary": player.salary}
+
+
+def _team_table_record(item):
+    return {"type": TEAM_TYPE, "team": item[MULTITABLE_TEAM_NAME][len(TeamDAO.key_prefix):], "wins": item[MULTITABLE_WINS]}
+
+
+def _player_table_record(item):
+    player = PlayerDAO._from_dynamo_item(item)
+    return {"type": PLAYER_TYPE, "team": player[PLAYER_TEAM], "player_name": player[MULTITABLE_PLAYER_NAME],
+            "salary": player[MULTITABLE_SALARY]}
+
+
+# table name -> (attributes to read, item -> record or None to leave the item out)
+EXPORTS = {
+    TABLE_NAME: (SUMMARY_ATTRIBUTES, _single_table_record),
+    TEAM_TABLE_NAME: ((MULTITABLE_TEAM_NAME, MULTITABLE_WINS), _team_table_record),
+    PLAYER_TABLE_NAME: ((MULTITABLE_PLAYER_NAME, PLAYER_TEAM, MULTITABLE_SALARY), _player_table_record),
+}
+
+
+class TableExporter():
+    # session_factory is called once per segment thread, like BulkLoader's
+    def __init__(self, session_factory, segments=8, queue_size=None):
+        self.session_factory = session_factory
+        self.segments = segments
+        self.queue_size = queue_size or 2 * segments  # Pages buffered between the scans and the writer
+
+    def export(self, table_name, path, output_format="ndjson"):
+        attribute_names, to_record = EXPORTS[table_name]
+        pages = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()  # Set if the writer fails, so that the scans don't wait on a full queue forever
+        start = time.monotonic()
+        temp_path = path + ".tmp"
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.segments) as executor:
+                futures = [executor.submit(self._scan_segment, table_name, attribute_names, to_record, segment, pages, stop)
+                           for segment in range(self.segments)]
+                try:
+                    with self._open_writer(temp_path, output_format) as write:
+                        written = 0
+                        for records in self._pages(pages):
+                            write(records)
+                            written += len(records)
+                finally:
+                    stop.set()
+                for future in futures:
+                    future.result()  # Re-raises any error from a scan
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, path)  # Atomic, readers see the old file or the whole new one
+
+        elapsed = time.monotonic() - start
+        print("Exported %s items from %s with %s segments in %.2fs (%.0f items/sec)" % (
+            written, table_name, self.segments, elapsed, written / elapsed if elapsed else 0))
+        return written
+
+    def _pages(self, pages):
+        done = 0
+        while done < self.segments:
+            records = pages.get()
+            if records is _DONE:
+                done += 1
+            else:
+                yield records
+
+    def _scan_segment(self, table_name, attribute_names, to_record, segment, pages, stop):
+        try:
+            table = throttled(get_resource(self.session_factory()).Table(table_name))
+            for items in scan_pages(table, Segment=segment, TotalSegments=self.segments, **projection(*attribute_names)):
+                records = [_plain(record) for record in map(to_record, items) if record is not None]
+                if records and not self._put(pages, records, stop):
+                    return
+        finally:
+            self._put(pages, _DONE, stop)
+
+    @staticmethod
+    def _put(pages, records, stop):
+        while not stop.is_set():
+            try:
+                pages.put(records, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @staticmethod
+    def _open_writer(path, output_format):
+        if output_format == "ndjson":
+            return _NDJSONWriter(path)
+        if output_format == "parquet":
+            return _ParquetWriter(path)
+        raise ValueError("Unknown format %s" % output_format)
+
+
+def _plain(record):
+    # The resource gives numbers back as Decimals, which JSON and Arrow don't take
+    return {column: _plain_number(record.get(column)) for column in COLUMNS}
+
+
+def _plain_number(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class _NDJSONWriter():
+    def __init__(self, path):
+        self.file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)  # 9 is a lot slower for little gain
+
+    def __enter__(self):
+        return self.write
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+    def write(self, records):
+        self.file.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+
+
+class _ParquetWriter():
+    # Each page becomes a row group's worth of Arrow data, the file is only complete once it is closed.
+    # Numbers are float64: _plain_number gives a float for anything that isn't a whole number, which an int64 column
+    # would reject. float64 holds every whole number up to 2**53 exactly, far more than any salary.
+    def __init__(self, path):
+        import pyarrow  # Only needed (and installed) for --format parquet
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([("type", pyarrow.string()), ("team", pyarrow.string()), ("wins", pyarrow.float64()),
+                                      ("player_name", pyarrow.string()), ("salary", pyarrow.float64())])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+
+    def __enter__(self):
+        return self.write
+
+    def __exit__(self, *exc_info):
+        self.writer.close()
+
+    def write(self, records):
+        self.writer.write_table(self.pyarrow.Table.from_pylist(records, schema=self.schema))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a table to gzipped NDJSON or Parquet with a parallel scan")
+    parser.add_argument("--table", choices=sorted(EXPORTS), default=TABLE_NAME)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--format", choices=("ndjson", "parquet"), default="ndjson")
+    parser.add_argument("--segments", type=int, default=8, help="Parallel scan segments, one thread each")
+    args = parser.parse_args()
+
+    TableExporter(make_session, segments=args.segments).export(args.table, args.output, args.format)
@@ -1,17 +1,248 @@
-def delete_table(client, table_name):
-    try:
-        client.delete_table(TableName=table_name)
-        print("%s already exists, removing" % table_name)
-        waiter = client.get_waiter('table_not_exists')
-        waiter.wait(TableName=table_name)
-    except client.exceptions.ResourceNotFoundException as e:
-        print("%s does not exist, creating" % table_name)
-
-def delete_table(client, table_name):
-    try:
-        client.delete_table(TableName=table_name)
-        print("%s already exists, removing" % table_name)
-        waiter = client.get_waiter('table_not_exists')
-        waiter.wait(TableName=table_name)
-    except client.exceptions.ResourceNotFoundException as e:
-        print("%s does not exist, creating" % table_name)
\ No newline at end of file
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+BATCH_WRITE_SIZE = 25  # BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_GET_SIZE = 100  # BatchGetItem accepts at most 100 keys per call
+TRANSACTION_SIZE = 100  # TransactWriteItems accepts at most 100 actions per call
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def chunked(iterable, size):
+    # Pull items off the iterable lazily so that callers can pass generators of any length
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def decorrelated_jitter(previous_delay, base=0.05, cap=5.0):
+    # The next delay to wait before retrying. Each delay is random between base and 3x the previous one, so retries back
+    # off quickly without clients that were throttled together retrying together.
+    # https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    return min(cap, random.uniform(base, max(base, previous_delay) * 3))
+
+
+def batch_write(table, items, key_names, max_retries=10, on_written=None):
+    # BatchWriteItem lets us send up to 25 items in a single round trip instead of one put_item call per item.
+    # Dynamo is allowed to only partially apply a batch (for example when a partition is being throttled), in which case
+    # the items it skipped are handed back as "UnprocessedItems" and it is up to us to send them again (after backing off,
+    # since it usually means we are being throttled).
+    # Dynamo rejects a batch that writes the same key twice, so items with the same key_names (the table's primary key)
+    # are de-duplicated first and the last one wins, like a put_item per item would have left it. boto3's
+    # batch_writer(overwrite_by_pkeys=...) does the same.
+    # on_written is called with each chunk of items once all of them have been written.
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/batch_write_item.html
+    # Returns the number of items written (counting the overwritten ones), metrics.py records how long it took.
+    client = table.meta.client
+    written = 0
+    for count, chunk in _unique_chunks(items, key_names, BATCH_WRITE_SIZE):
+        request_items = {table.name: [{'PutRequest': {'Item': item}} for item in chunk]}
+        attempt, delay = 0, 0
+        while request_items:
+            request_items = client.batch_write_item(RequestItems=request_items).get('UnprocessedItems')
+            if request_items:
+                if attempt >= max_retries:
+                    raise RuntimeError("%s items were still unprocessed after %s retries" % (
+                        len(request_items[table.name]), max_retries))
+                if not _paces_retries(client, 'batch_write_item'):
+                    delay = decorrelated_jitter(delay)
+                    time.sleep(delay)
+                attempt += 1
+        written += count
+        if on_written is not None:
+            on_written(chunk)
+    return written
+
+
+def _unique_chunks(items, key_names, size):
+    # (items taken, chunk) pairs, each chunk has up to size items with different keys
+    chunk, count = {}, 0
+    for item in items:
+        chunk[_key_values(item, key_names)] = item
+        count += 1
+        if len(chunk) == size:
+            yield count, list(chunk.values())
+            chunk, count = {}, 0
+    if chunk:
+        yield count, list(chunk.values())
+
+
+def batch_get(table, keys, max_retries=10, **request_kwargs):
+    # BatchGetItem fetches up to 100 items in one round trip. Like BatchWriteItem it can return only part of what was
+    # asked for, the rest come back as "UnprocessedKeys" which we retry with backoff. Dynamo rejects a batch that asks for
+    # the same key twice, so keys are de-duplicated first, and because results come back in no particular order we
+    # match them up with the keys that were asked for. Keys that don't exist come back as None.
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/batch_get_item.html
+    if not keys:
+        return []
+    client = table.meta.client
+    key_names = list(keys[0])
+    unique_keys = {}
+    for key in keys:
+        unique_keys.setdefault(_key_values(key, key_names), key)
+
+    found = {}
+    for chunk in chunked(unique_keys.values(), BATCH_GET_SIZE):
+        request_items = {table.name: dict(request_kwargs, Keys=chunk)}
+        attempt, delay = 0, 0
+        while request_items:
+            response = client.batch_get_item(RequestItems=request_items)
+            for item in response['Responses'].get(table.name, []):
+                found[_key_values(item, key_names)] = item
+            request_items = response.get('UnprocessedKeys')
+            if request_items:
+                if attempt >= max_retries:
+                    raise RuntimeError("%s keys were still unprocessed after %s retries" % (
+                        len(request_items[table.name]['Keys']), max_retries))
+                if not _paces_retries(client, 'batch_get_item'):
+                    delay = decorrelated_jitter(delay)
+                    time.sleep(delay)
+                attempt += 1
+
+    return [found.get(_key_values(key, key_names)) for key in keys]
+
+
+def _paces_retries(client, operation):
+    # A rate limited table (see throttle.py) already waits before resending what a batch handed back
+    return getattr(client, 'paces_retries', lambda operation: False)(operation)
+
+
+def _key_values(item, key_names):
+    return tuple(item[name] for name in key_names)
+
+
+def cancellation_reasons(error):
+    # For a cancelled TransactWriteItems, why each of its actions failed ('None' for the ones that would have succeeded).
+    # Empty for any other error.
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return []
+    return [reason.get('Code') for reason in error.response.get('CancellationReasons', [])]
+
+
+def projection(*attribute_names):
+    # A ProjectionExpression asks Dynamo to only send back the attributes we are going to use. Names are passed through
+    # ExpressionAttributeNames because many common words (e.g. "Name") are reserved in expressions.
+    # https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Expressions.ProjectionExpressions.html
+    placeholders = ['#p%s' % i for i in range(len(attribute_names))]
+    return {
+        'ProjectionExpression': ', '.join(placeholders),
+        'ExpressionAttributeNames': dict(zip(placeholders, attribute_names)),
+    }
+
+
+def query_items(table, page_size=None, limit=None, **query_kwargs):
+    # A single query returns at most 1MB of data, anything after that is only reachable by passing the LastEvaluatedKey
+    # back as the ExclusiveStartKey of the next query. Pages are requested lazily, so a caller that stops iterating early
+    # never pays for pages it didn't use.
+    # page_size is the "Limit" sent with each request and limit is the total number of items to return.
+    # https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Query.Pagination.html
+    pages = _QueryPages(page_size, limit, query_kwargs)
+    while pages.request is not None:
+        response = table.query(**pages.request)
+        yield from response['Items']
+        pages.advance(response)
+
+
+async def query_items_async(table, page_size=None, limit=None, **query_kwargs):
+    # The same as query_items, for an aioboto3 table
+    pages = _QueryPages(page_size, limit, query_kwargs)
+    while pages.request is not None:
+        response = await table.query(**pages.request)
+        for item in response['Items']:
+            yield item
+        pages.advance(response)
+
+
+class _QueryPages():
+    # The paging of query_items and query_items_async: request is the kwargs of the next query, None once there are no
+    # more pages (or enough items)
+    def __init__(self, page_size, limit, query_kwargs):
+        self.page_size = page_size
+        self.limit = limit
+        self.returned = 0
+        self.request = query_kwargs
+        if limit == 0:
+            self.request = None  # Dynamo rejects a Limit of 0
+        else:
+            self._set_limit()
+
+    def advance(self, response):
+        self.returned += len(response['Items'])
+        if 'LastEvaluatedKey' not in response or (self.limit is not None and self.returned >= self.limit):
+            self.request = None
+            return
+        self.request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        self._set_limit()
+
+    def _set_limit(self):
+        if self.limit is not None:
+            self.request['Limit'] = min(self.page_size or self.limit, self.limit - self.returned)
+        elif self.page_size is not None:
+            self.request['Limit'] = self.page_size
+
+
+def scan_pages(table, **scan_kwargs):
+    # Yields a Scan's results a page (up to 1MB) at a time, following LastEvaluatedKey. Pass Segment and TotalSegments to
+    # scan one part of the table, so that several threads can each scan a part at the same time.
+    # https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Scan.html#Scan.ParallelScan
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def scatter_gather(queries, key, reverse=False):
+    # Runs each query (a function returning an iterator of items sorted by key, see prefetch) on a shared thread pool at
+    # the same time, then merges their results into one sorted iterator. Used to read a partition that has been write
+    # sharded, see PlayerDAOV2. Only the queries' first pages are read in parallel, later pages are read when the merge
+    # gets to them, so a caller that stops early (or a limit) doesn't pay for every page of every partition.
+    futures = [get_executor(len(queries)).submit(query) for query in queries]
+    return heapq.merge(*[_result(future) for future in futures], key=key, reverse=reverse)
+
+
+def _result(future):
+    yield from future.result()
+
+
+def prefetch(items):
+    # Reads the first item of an iterator, and with it the first page of a query, before handing the iterator back
+    items = iter(items)
+    for item in items:
+        return chain([item], items)
+    return iter(())
+
+
+def get_executor(workers):
+    # One thread pool shared by every DAO's parallel queries, rather than a pool per DAO that is never shut down. It is
+    # replaced by a bigger one when a read needs more threads at once, the old one's threads exit once nothing uses it.
+    global _executor, _executor_workers
+    with _executor_lock:
+        if workers > _executor_workers:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dynamo-query")
+            _executor_workers = workers
+        return _executor
+
+
+class ThreadLocalTable():
+    # Stands in for a table in queries that move between threads, like the ones scatter_gather starts on its pool and
+    # the caller carries on with. boto3 resources are not thread safe, so every thread queries its own table, made by
+    # make_table the first time that thread needs one.
+    def __init__(self, make_table):
+        self.make_table = make_table
+        self._local = threading.local()
+
+    def query(self, **kwargs):
+        table = getattr(self._local, 'table', None)
+        if table is None:
+            table = self._local.table = self.make_table()
+        return table.query(**kwargs)
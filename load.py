@@ -0,0 +1,40 @@
+import argparse
+import csv
+import os
+from itertools import chain
+
+from connection import make_session
+from single_table.BulkLoader import BulkLoader
+from single_table.PlayerDAOV2 import PLAYER_TYPE
+from single_table.TeamDAOV2 import TEAM_TYPE
+
+# Bulk import for the single table design, for example:
+#   python load.py --teams teams.csv --players players.csv --workers 16
+# teams.csv rows are "team_name,wins" and players.csv rows are "player_name,salary,team"
+
+
+def read_teams(path):
+    with open(path, newline='') as f:
+        for team_name, wins in csv.reader(f):
+            yield TEAM_TYPE, team_name, int(wins)
+
+
+def read_players(path):
+    with open(path, newline='') as f:
+        for player_name, salary, team in csv.reader(f):
+            yield PLAYER_TYPE, player_name, int(salary), team
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load teams and players into the single table")
+    parser.add_argument("--teams", help="CSV file of team_name,wins")
+    parser.add_argument("--players", help="CSV file of player_name,salary,team")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--queue-size", type=int, default=1000, help="Records buffered per worker before reading blocks")
+    parser.add_argument("--shards", type=int, default=1, help="Partitions to spread each team's players over, read them "
+                                                                  "back with PlayerDAOV2(session, shards=...)")
+    args = parser.parse_args()
+
+    records = chain(read_teams(args.teams) if args.teams else (),
+                    read_players(args.players) if args.players else ())
+    BulkLoader(make_session, workers=args.workers, queue_size=args.queue_size, shards=args.shards).load(records)
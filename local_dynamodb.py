@@ -0,0 +1,797 @@
+import copy
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from decimal import Decimal
+from types import SimpleNamespace
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+# An in process stand in for the parts of DynamoDB this tutorial uses, so the DAOs (and main.py, with DYNAMO_LOCAL=1)
+# can be run and benchmarked without an AWS account:
+#
+#   dynamo = LocalDynamoDB(latency=0.005)  # 5ms per request, roughly a round trip to a nearby region
+#   session = LocalSession(dynamo)
+#   team_table = TeamDAOV2(session)
+#
+# LocalSession stands in for a boto3.Session: session.client('dynamodb') speaks the wire format like a low level client,
+# and session.resource('dynamodb') converts to and from Python types like the boto3 resource. Items are stored in the
+# wire format so both behave (and cost) like the real thing. Every request is counted in dynamo.calls, can be slowed
+# down with `latency` and can be throttled with `throttle_rate`, which is the chance of a request being throttled
+# (single item requests raise ProvisionedThroughputExceededException, batches return the throttled items unprocessed).
+# Requests made with ReturnConsumedCapacity get back the capacity units Dynamo would have charged for them.
+#
+# It is not a complete emulator, only key conditions, projections, batches, pagination, (segmented) scans and the common parts of condition
+# and update expressions (comparisons, attribute_(not_)exists, AND/OR/NOT, SET/ADD/REMOVE/DELETE, if_not_exists) are
+# supported. What it does support it validates like Dynamo does (duplicate keys in a batch, a Limit below 1, a BETWEEN
+# whose bounds are the wrong way around), it is only useful for testing if it is no more lenient than the real thing.
+
+PAGE_BYTES = 1024 * 1024  # Query returns at most 1MB per page
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+
+TRANSACTION_LIMIT = 100
+
+_KEY_CONDITION = re.compile(
+    r"begins_with\(([#\w]+), (:\w+)\)|([#\w]+) BETWEEN (:\w+) AND (:\w+)|([#\w]+) (=|<=|<|>=|>) (:\w+)")
+_EXPRESSION_TOKEN = re.compile(r"\s*([#:]?\w+|<>|<=|>=|[=<>(),.+-])")
+_MISSING = object()  # A path that isn't in the item
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+class ResourceNotFoundException(ClientError):
+    pass
+
+
+class ConditionalCheckFailedException(ClientError):
+    pass
+
+
+class TransactionCanceledException(ClientError):
+    pass
+
+
+def _error(code, message, operation, error_class=ClientError):
+    return error_class({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def _key_value(attribute_value):
+    # The Python value used to compare and sort key attributes
+    (attribute_type, value), = attribute_value.items()
+    return Decimal(value) if attribute_type == 'N' else value
+
+
+def _item_size(item):
+    # Roughly how Dynamo sizes items: attribute names plus values
+    return sum(len(name) + len(str(next(iter(value.values())))) for name, value in item.items())
+
+
+def _read_units(size, consistent_read=False):
+    # Reads cost one unit per 4KB (rounded up), eventually consistent reads half that
+    # https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/HowItWorks.ReadWriteCapacityMode.html
+    return max(1, math.ceil(size / 4096)) * (1 if consistent_read else 0.5)
+
+
+def _write_units(size):
+    # Writes cost one unit per 1KB (rounded up)
+    return max(1, math.ceil(size / 1024))
+
+
+def _to_python(wire_item):
+    return {name: _deserializer.deserialize(value) for name, value in wire_item.items()}
+
+
+def _to_wire(item):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+def _consumed_capacity(kwargs, table_name, units):
+    if kwargs.get('ReturnConsumedCapacity', 'NONE') == 'NONE':
+        return {}
+    return {'ConsumedCapacity': {'TableName': table_name, 'CapacityUnits': units}}
+
+
+class _Expression():
+    # Evaluates condition and update expressions against an item, all in Python types (see TypeDeserializer)
+    def __init__(self, expression, names, values):
+        self.tokens = _EXPRESSION_TOKEN.findall(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, *expected):
+        token = self.tokens[self.position] if self.position < len(self.tokens) else None
+        if expected:
+            return token is not None and token.upper() in expected
+        return token
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or expected is not None and token.upper() != expected:
+            raise _error('ValidationException', "Invalid expression: expected %s, got %s" % (expected, token), 'Expression')
+        self.position += 1
+        return token
+
+    def path(self):
+        path = [self._name(self.take())]
+        while self.peek('.'):
+            self.take('.')
+            path.append(self._name(self.take()))
+        return path
+
+    def _name(self, token):
+        return self.names[token] if token.startswith('#') else token
+
+    # Conditions
+
+    def condition(self, item):
+        result = self._and(item)
+        while self.peek('OR'):
+            self.take()
+            result = self._and(item) or result  # Evaluate both sides so that every token is consumed
+        return result
+
+    def _and(self, item):
+        result = self._not(item)
+        while self.peek('AND'):
+            self.take()
+            result = self._not(item) and result
+        return result
+
+    def _not(self, item):
+        if self.peek('NOT'):
+            self.take()
+            return not self._not(item)
+        if self.peek('('):
+            self.take('(')
+            result = self.condition(item)
+            self.take(')')
+            return result
+        if self.peek('ATTRIBUTE_EXISTS', 'ATTRIBUTE_NOT_EXISTS', 'BEGINS_WITH'):
+            function = self.take().upper()
+            self.take('(')
+            value = _get_path(item, self.path())
+            if function == 'BEGINS_WITH':
+                self.take(',')
+                prefix = self.operand(item)
+                self.take(')')
+                return isinstance(value, str) and value.startswith(prefix)
+            self.take(')')
+            return (value is not _MISSING) == (function == 'ATTRIBUTE_EXISTS')
+
+        left = self.operand(item)
+        if self.peek('BETWEEN'):
+            self.take()
+            low = self.operand(item)
+            self.take('AND')
+            return _compare(low, '<=', left) and _compare(left, '<=', self.operand(item))
+        operator = self.take()
+        return _compare(left, operator, self.operand(item))
+
+    def operand(self, item):
+        token = self.peek()
+        if token.startswith(':'):
+            self.take()
+            return self.values[token]
+        if self.peek('IF_NOT_EXISTS'):
+            self.take()
+            self.take('(')
+            value = _get_path(item, self.path())
+            self.take(',')
+            default = self.operand(item)
+            self.take(')')
+            return default if value is _MISSING else value
+        return _get_path(item, self.path())
+
+    # Updates
+
+    def update(self, item):
+        # Every value is worked out from the item as it was before the update, like Dynamo does
+        original, actions = copy.deepcopy(item), []
+        while self.peek():
+            clause = self.take().upper()
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.take('=')
+                    value = self.operand(original)
+                    if self.peek('+', '-'):
+                        operator, other = self.take(), self.operand(original)
+                        value = value + other if operator == '+' else value - other
+                    actions.append((_set_path, path, value))
+                elif clause == 'REMOVE':
+                    actions.append((_remove_path, path, None))
+                else:
+                    value = self.operand(original)
+                    current = _get_path(original, path)
+                    if clause == 'ADD':
+                        value = value if current is _MISSING else (current | value if isinstance(value, set) else current + value)
+                    else:  # DELETE
+                        value = set() if current is _MISSING else current - value
+                    actions.append((_set_path if value != set() else _remove_path, path, value))
+                if not self.peek(','):
+                    break
+                self.take(',')
+        for action, path, value in actions:
+            action(item, path, value)
+        return item
+
+
+def _get_path(item, path):
+    for name in path:
+        if not isinstance(item, dict) or name not in item:
+            return _MISSING
+        item = item[name]
+    return item
+
+
+def _set_path(item, path, value):
+    parent = _get_path(item, path[:-1])
+    if not isinstance(parent, dict):
+        raise _error('ValidationException', "The document path provided in the update expression is invalid for update",
+                     'UpdateItem')
+    parent[path[-1]] = value
+
+
+def _remove_path(item, path, value=None):
+    parent = _get_path(item, path[:-1])
+    if isinstance(parent, dict):
+        parent.pop(path[-1], None)
+
+
+def _compare(left, operator, right):
+    # Comparisons with a missing attribute, or between different types, are false
+    if left is _MISSING or right is _MISSING:
+        return False
+    if operator == '<>':
+        return left != right
+    if operator == '=':
+        return left == right
+    if type(left) is not type(right) or not isinstance(left, (str, Decimal)):
+        return False
+    return {
+        '<': lambda: left < right,
+        '<=': lambda: left <= right,
+        '>': lambda: left > right,
+        '>=': lambda: left >= right,
+    }[operator]()
+
+
+class _LocalTable():
+    def __init__(self, name, key_schema, attribute_definitions, global_indexes, local_indexes, billing_mode):
+        self.name = name
+        self.attribute_definitions = attribute_definitions
+        self.key_schema = key_schema
+        self.global_indexes = {index['IndexName']: index for index in global_indexes}
+        self.local_indexes = {index['IndexName']: index for index in local_indexes}
+        self.billing_mode = billing_mode
+        self.hash_key, self.range_key = self._key_names(key_schema)
+        self.partitions = {}  # hash key value -> {range key value: item}
+
+    def get_key_names(self, index_name=None):
+        if index_name is None:
+            return self.hash_key, self.range_key
+        index = self.global_indexes.get(index_name) or self.local_indexes.get(index_name)
+        if index is None:
+            raise _error('ValidationException', "The table does not have the specified index: %s" % index_name, 'Query')
+        return self._key_names(index['KeySchema'])
+
+    def primary_key(self, item):
+        return tuple(_key_value(item[name]) for name in (self.hash_key, self.range_key) if name)
+
+    def items(self):
+        for partition in self.partitions.values():
+            yield from partition.values()
+
+    @staticmethod
+    def _key_names(key_schema):
+        names = {key['KeyType']: key['AttributeName'] for key in key_schema}
+        return names['HASH'], names.get('RANGE')
+
+
+class LocalDynamoDB():
+    def __init__(self, latency=0.0, throttle_rate=0.0, page_bytes=PAGE_BYTES, seed=None):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.page_bytes = page_bytes
+        self.calls = Counter()  # Operation name -> number of requests
+        self.tables = {}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+
+    # Control plane
+
+    def create_table(self, TableName, KeySchema, AttributeDefinitions, GlobalSecondaryIndexes=(),
+                     LocalSecondaryIndexes=(), BillingMode='PROVISIONED', **kwargs):
+        self._request('CreateTable')
+        with self._lock:
+            if TableName in self.tables:
+                raise _error('ResourceInUseException', "Table already exists: %s" % TableName, 'CreateTable')
+            self.tables[TableName] = _LocalTable(TableName, KeySchema, AttributeDefinitions, GlobalSecondaryIndexes,
+                                                 LocalSecondaryIndexes, BillingMode)
+        return {'TableDescription': self.describe_table(TableName)['Table']}
+
+    def update_table(self, TableName, AttributeDefinitions=None, GlobalSecondaryIndexUpdates=(), BillingMode=None,
+                     **kwargs):
+        # Indexes are built instantly, there is no backfill to wait for
+        self._request('UpdateTable')
+        with self._lock:
+            table = self._get_table(TableName, 'UpdateTable')
+            for update in GlobalSecondaryIndexUpdates:
+                if 'Create' in update:
+                    if update['Create']['IndexName'] in table.global_indexes:
+                        raise _error('ValidationException', "Index already exists", 'UpdateTable')
+                    table.global_indexes[update['Create']['IndexName']] = update['Create']
+                elif 'Delete' in update:
+                    table.global_indexes.pop(update['Delete']['IndexName'], None)
+            if AttributeDefinitions is not None:
+                table.attribute_definitions = AttributeDefinitions
+            if BillingMode is not None:
+                table.billing_mode = BillingMode
+        return {'TableDescription': self.describe_table(TableName)['Table']}
+
+    def delete_table(self, TableName):
+        self._request('DeleteTable')
+        with self._lock:
+            description = self.describe_table(TableName)
+            del self.tables[TableName]
+        return {'TableDescription': description['Table']}
+
+    def describe_table(self, TableName):
+        table = self._get_table(TableName, 'DescribeTable')
+        description = {'Table': {
+            'TableName': table.name,
+            'TableStatus': 'ACTIVE',
+            'KeySchema': table.key_schema,
+            'AttributeDefinitions': table.attribute_definitions,
+            'BillingModeSummary': {'BillingMode': table.billing_mode},
+            'ItemCount': sum(len(partition) for partition in table.partitions.values()),
+        }}
+        if table.global_indexes:
+            description['Table']['GlobalSecondaryIndexes'] = [dict(index, IndexStatus='ACTIVE') for index in table.global_indexes.values()]
+        if table.local_indexes:
+            description['Table']['LocalSecondaryIndexes'] = list(table.local_indexes.values())
+        return description
+
+    def list_tables(self, **kwargs):
+        return {'TableNames': sorted(self.tables)}
+
+    # Data plane, everything here is in the wire format
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._request('PutItem', throttle=True)
+        table = self._get_table(TableName, 'PutItem')
+        with self._lock:
+            self._check_condition(self._get(table, Item), kwargs, 'PutItem')
+            self._put(table, Item)
+        return _consumed_capacity(kwargs, TableName, _write_units(_item_size(Item)))
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self._request('GetItem', throttle=True)
+        table = self._get_table(TableName, 'GetItem')
+        item = self._get(table, Key)
+        response = _consumed_capacity(kwargs, TableName, _read_units(_item_size(item or {}), kwargs.get('ConsistentRead')))
+        if item is not None:
+            response['Item'] = self._project(item, ProjectionExpression, ExpressionAttributeNames)
+        return response
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._request('DeleteItem', throttle=True)
+        table = self._get_table(TableName, 'DeleteItem')
+        with self._lock:
+            self._check_condition(self._get(table, Key), kwargs, 'DeleteItem')
+            self._delete(table, Key)
+        return _consumed_capacity(kwargs, TableName, _write_units(_item_size(Key)))
+
+    def update_item(self, TableName, Key, ReturnValues='NONE', **kwargs):
+        self._request('UpdateItem', throttle=True)
+        table = self._get_table(TableName, 'UpdateItem')
+        with self._lock:
+            old_item = self._get(table, Key)
+            self._check_condition(old_item, kwargs, 'UpdateItem')
+            new_item = self._update(old_item, Key, kwargs)
+            self._put(table, new_item)
+        response = _consumed_capacity(kwargs, TableName, _write_units(max(_item_size(old_item or {}), _item_size(new_item))))
+        if ReturnValues == 'ALL_NEW':
+            response['Attributes'] = new_item
+        elif ReturnValues == 'ALL_OLD' and old_item is not None:
+            response['Attributes'] = old_item
+        return response
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        # All or nothing: every condition is checked before anything is written
+        self._request('TransactWriteItems', throttle=True)
+        if len(TransactItems) > TRANSACTION_LIMIT:
+            raise _error('ValidationException', "Member must have length less than or equal to %s" % TRANSACTION_LIMIT,
+                         'TransactWriteItems')
+        actions = []
+        for action in TransactItems:
+            (action_type, request), = action.items()
+            table = self._get_table(request['TableName'], 'TransactWriteItems')
+            actions.append((action_type, request, table, request['Item'] if action_type == 'Put' else request['Key']))
+        keys = [(table.name, table.primary_key(key)) for _, _, table, key in actions]
+        if len(set(keys)) != len(keys):
+            raise _error('ValidationException', "Transaction request cannot include multiple operations on one item",
+                         'TransactWriteItems')
+
+        consumed = {}
+        with self._lock:
+            reasons, writes = [], []
+            for action_type, request, table, key in actions:
+                old_item = self._get(table, key)
+                if not self._condition_holds(old_item, request):
+                    reasons.append('ConditionalCheckFailed')
+                    continue
+                reasons.append('None')
+                if action_type == 'Put':
+                    writes.append((self._put, table, request['Item']))
+                elif action_type == 'Update':
+                    writes.append((self._put, table, self._update(old_item, key, request)))
+                elif action_type == 'Delete':
+                    writes.append((self._delete, table, key))
+                consumed[table.name] = consumed.get(table.name, 0) + 2 * _write_units(_item_size(old_item or key))
+            if 'ConditionalCheckFailed' in reasons:
+                error = _error('TransactionCanceledException', "Transaction cancelled, please refer cancellation reasons "
+                               "for specific reasons [%s]" % ", ".join(reasons), 'TransactWriteItems',
+                               TransactionCanceledException)
+                error.response['CancellationReasons'] = [{'Code': reason} for reason in reasons]
+                raise error
+            for write, table, item in writes:
+                write(table, item)
+        return self._batch_capacity({}, kwargs, consumed)
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, ExpressionAttributeNames=None,
+              IndexName=None, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, ProjectionExpression=None,
+              **kwargs):
+        self._request('Query', throttle=True)
+        self._check_limit(Limit, 'Query')
+        table = self._get_table(TableName, 'Query')
+        hash_key, range_key = table.get_key_names(IndexName)
+        names = ExpressionAttributeNames or {}
+        conditions = {}
+        for match in _KEY_CONDITION.finditer(KeyConditionExpression):
+            if match.group(1):
+                name, operator, values = match.group(1), 'begins_with', [match.group(2)]
+            elif match.group(3):
+                name, operator, values = match.group(3), 'BETWEEN', [match.group(4), match.group(5)]
+            else:
+                name, operator, values = match.group(6), match.group(7), [match.group(8)]
+            values = [_key_value(ExpressionAttributeValues[v]) for v in values]
+            if operator == 'BETWEEN' and values[0] > values[1]:
+                raise _error('ValidationException', "Invalid KeyConditionExpression: The BETWEEN operator requires upper "
+                             "bound to be greater than or equal to lower bound", 'Query')
+            conditions[names.get(name, name)] = (operator, values)
+
+        hash_value = conditions.pop(hash_key)[1][0]
+        with self._lock:
+            if IndexName is None:
+                candidates = list(table.partitions.get(hash_value, {}).values())
+            else:
+                # Indexes are sparse, items without the index's keys are not in it
+                candidates = [item for item in table.items() if hash_key in item and (range_key is None or range_key in item)
+                              and _key_value(item[hash_key]) == hash_value]
+
+        def sort_key(item):
+            return (_key_value(item[range_key]) if range_key else None,) + table.primary_key(item)
+
+        if range_key in conditions:
+            operator, values = conditions[range_key]
+            candidates = [item for item in candidates if self._matches(_key_value(item[range_key]), operator, values)]
+        candidates.sort(key=sort_key, reverse=not ScanIndexForward)
+
+        if ExclusiveStartKey is not None:
+            start = sort_key(ExclusiveStartKey)
+            candidates = [item for item in candidates if (sort_key(item) < start if not ScanIndexForward else sort_key(item) > start)]
+
+        response = self._page(table, candidates, Limit, ProjectionExpression, ExpressionAttributeNames,
+                              [hash_key, range_key])
+        # A query is charged for everything it read, not per item
+        response.update(_consumed_capacity(kwargs, TableName, _read_units(response.pop('_size'), kwargs.get('ConsistentRead'))))
+        return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._request('BatchWriteItem')
+        if sum(len(requests) for requests in RequestItems.values()) > BATCH_WRITE_LIMIT:
+            raise _error('ValidationException', "Too many items requested for the BatchWriteItem call", 'BatchWriteItem')
+        for table_name, requests in RequestItems.items():
+            table = self._get_table(table_name, 'BatchWriteItem')
+            keys = [table.primary_key(request['PutRequest']['Item'] if 'PutRequest' in request else request['DeleteRequest']['Key'])
+                    for request in requests]
+            if len(set(keys)) != len(keys):
+                # Dynamo can't tell which write should win, so it rejects the whole batch rather than picking one
+                raise _error('ValidationException', "Provided list of item keys contains duplicates", 'BatchWriteItem')
+        unprocessed, consumed = {}, {}
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                table = self._get_table(table_name, 'BatchWriteItem')
+                for request in requests:
+                    if self._throttled():
+                        unprocessed.setdefault(table_name, []).append(request)
+                    elif 'PutRequest' in request:
+                        self._put(table, request['PutRequest']['Item'])
+                        consumed[table_name] = consumed.get(table_name, 0) + _write_units(_item_size(request['PutRequest']['Item']))
+                    else:
+                        self._delete(table, request['DeleteRequest']['Key'])
+                        consumed[table_name] = consumed.get(table_name, 0) + 1
+        return self._batch_capacity({'UnprocessedItems': unprocessed}, kwargs, consumed)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._request('BatchGetItem')
+        if sum(len(request['Keys']) for request in RequestItems.values()) > BATCH_GET_LIMIT:
+            raise _error('ValidationException', "Too many items requested for the BatchGetItem call", 'BatchGetItem')
+        responses, unprocessed, consumed = {}, {}, {}
+        for table_name, request in RequestItems.items():
+            table = self._get_table(table_name, 'BatchGetItem')
+            keys = [table.primary_key(key) for key in request['Keys']]
+            if len(set(keys)) != len(keys):
+                raise _error('ValidationException', "Provided list of item keys contains duplicates", 'BatchGetItem')
+            found = responses.setdefault(table_name, [])
+            for key, wire_key in zip(keys, request['Keys']):
+                if self._throttled():
+                    unprocessed.setdefault(table_name, dict(request, Keys=[]))['Keys'].append(wire_key)
+                    continue
+                item = table.partitions.get(key[0], {}).get(key[1:])
+                consumed[table_name] = consumed.get(table_name, 0) + _read_units(_item_size(item or {}), request.get('ConsistentRead'))
+                if item is not None:
+                    found.append(self._project(item, request.get('ProjectionExpression'),
+                                               request.get('ExpressionAttributeNames')))
+        return self._batch_capacity({'Responses': responses, 'UnprocessedKeys': unprocessed}, kwargs, consumed)
+
+    def _request(self, operation, throttle=False):
+        self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle and self._throttled():
+            raise _error('ProvisionedThroughputExceededException',
+                         "The level of configured provisioned throughput for the table was exceeded", operation)
+
+    def scan(self, TableName, Segment=None, TotalSegments=None, Limit=None, ExclusiveStartKey=None,
+             ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        # Items are spread over segments by partition key, like Dynamo does, and come back in key order
+        self._request('Scan', throttle=True)
+        self._check_limit(Limit, 'Scan')
+        table = self._get_table(TableName, 'Scan')
+        if (Segment is None) != (TotalSegments is None) or TotalSegments is not None and not 0 <= Segment < TotalSegments:
+            raise _error('ValidationException', "Segment must be less than TotalSegments and both must be given", 'Scan')
+        with self._lock:
+            candidates = [item for hash_value, partition in table.partitions.items()
+                          if TotalSegments is None or zlib.crc32(str(hash_value).encode('utf-8')) % TotalSegments == Segment
+                          for item in partition.values()]
+        candidates.sort(key=table.primary_key)
+        if ExclusiveStartKey is not None:
+            start = table.primary_key(ExclusiveStartKey)
+            candidates = [item for item in candidates if table.primary_key(item) > start]
+
+        response = self._page(table, candidates, Limit, ProjectionExpression, ExpressionAttributeNames, [])
+        response.update(_consumed_capacity(kwargs, TableName, _read_units(response.pop('_size'), kwargs.get('ConsistentRead'))))
+        return response
+
+    @staticmethod
+    def _check_limit(limit, operation):
+        if limit is not None and limit < 1:
+            raise _error('ValidationException', "1 validation error detected: Value '%s' at 'limit' failed to satisfy "
+                         "constraint: Member must have value greater than or equal to 1" % limit, operation)
+
+    @staticmethod
+    def _batch_capacity(response, kwargs, consumed):
+        # Batches report consumed capacity as a list with one entry per table
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = [{'TableName': table_name, 'CapacityUnits': units}
+                                            for table_name, units in consumed.items()]
+        return response
+
+    def _check_condition(self, item, request, operation):
+        if not self._condition_holds(item, request):
+            raise _error('ConditionalCheckFailedException', "The conditional request failed", operation,
+                         ConditionalCheckFailedException)
+
+    @staticmethod
+    def _condition_holds(item, request):
+        if not request.get('ConditionExpression'):
+            return True
+        expression = _Expression(request['ConditionExpression'], request.get('ExpressionAttributeNames'),
+                                 _to_python(request.get('ExpressionAttributeValues') or {}))
+        return expression.condition(_to_python(item or {}))
+
+    @staticmethod
+    def _update(item, key, request):
+        # The updated copy of item (or of a new item with just the key), in the wire format
+        expression = _Expression(request['UpdateExpression'], request.get('ExpressionAttributeNames'),
+                                 _to_python(request.get('ExpressionAttributeValues') or {}))
+        return _to_wire(expression.update(_to_python(item or key)))
+
+    @staticmethod
+    def _get(table, key):
+        key = table.primary_key(key)
+        return table.partitions.get(key[0], {}).get(key[1:])
+
+    def _throttled(self):
+        return self.throttle_rate and self._random.random() < self.throttle_rate
+
+    def _get_table(self, table_name, operation):
+        table = self.tables.get(table_name)
+        if table is None:
+            raise _error('ResourceNotFoundException', "Requested resource not found: Table: %s not found" % table_name,
+                         operation, ResourceNotFoundException)
+        return table
+
+    def _page(self, table, items, limit, projection_expression, attribute_names, index_keys):
+        # Cut the results off at Limit items or page_bytes, whichever comes first, like Dynamo does
+        page, size = [], 0
+        for item in items:
+            if limit is not None and len(page) >= limit or size >= self.page_bytes:
+                break
+            page.append(item)
+            size += _item_size(item)
+
+        response = {
+            'Items': [self._project(item, projection_expression, attribute_names) for item in page],
+            'Count': len(page),
+            'ScannedCount': len(page),
+            '_size': size,
+        }
+        if len(page) < len(items):
+            key_names = set(filter(None, index_keys + [table.hash_key, table.range_key]))
+            response['LastEvaluatedKey'] = {name: page[-1][name] for name in key_names}
+        return response
+
+    @staticmethod
+    def _put(table, item):
+        key = table.primary_key(item)
+        table.partitions.setdefault(key[0], {})[key[1:]] = item
+
+    @staticmethod
+    def _delete(table, key):
+        key = table.primary_key(key)
+        partition = table.partitions.get(key[0], {})
+        partition.pop(key[1:], None)
+        if not partition:
+            table.partitions.pop(key[0], None)
+
+    @staticmethod
+    def _matches(value, operator, values):
+        if operator == 'begins_with':
+            return value.startswith(values[0])
+        if operator == 'BETWEEN':
+            return values[0] <= value <= values[1]
+        return {
+            '=': value == values[0],
+            '<': value < values[0],
+            '<=': value <= values[0],
+            '>': value > values[0],
+            '>=': value >= values[0],
+        }[operator]
+
+    @staticmethod
+    def _project(item, projection_expression, attribute_names):
+        if not projection_expression:
+            return item
+        names = attribute_names or {}
+        projected = (names.get(name.strip(), name.strip()) for name in projection_expression.split(','))
+        return {name: item[name] for name in projected if name in item}
+
+
+class _Waiter():
+    def wait(self, **kwargs):
+        pass  # Tables are created and deleted instantly
+
+
+class LocalClient():
+    # session.client('dynamodb'), a low level client that speaks the wire format
+    exceptions = SimpleNamespace(ClientError=ClientError, ResourceNotFoundException=ResourceNotFoundException,
+                                 ConditionalCheckFailedException=ConditionalCheckFailedException,
+                                 TransactionCanceledException=TransactionCanceledException)
+
+    def __init__(self, dynamo):
+        self.dynamo = dynamo
+
+    def get_waiter(self, waiter_name):
+        return _Waiter()
+
+    def __getattr__(self, operation):
+        return getattr(self.dynamo, operation)
+
+
+class _ResourceClient(LocalClient):
+    # get_resource(...).meta.client, takes and returns Python types like the boto3 resource's client does
+    def __getattr__(self, operation):
+        method = getattr(self.dynamo, operation)
+
+        def call(**kwargs):
+            return self._deserialize_response(method(**self._serialize_request(kwargs)))
+        return call
+
+    def _serialize_request(self, kwargs):
+        kwargs = dict(kwargs)
+        builder = ConditionExpressionBuilder()  # One per request so that placeholders don't clash
+        for name in ('KeyConditionExpression', 'ConditionExpression'):
+            condition = kwargs.get(name)
+            if isinstance(condition, ConditionBase):
+                expression = builder.build_expression(condition, is_key_condition=name == 'KeyConditionExpression')
+                kwargs[name] = expression.condition_expression
+                kwargs['ExpressionAttributeNames'] = dict(kwargs.get('ExpressionAttributeNames', {}),
+                                                          **expression.attribute_name_placeholders)
+                kwargs['ExpressionAttributeValues'] = dict(kwargs.get('ExpressionAttributeValues', {}),
+                                                           **expression.attribute_value_placeholders)
+        for name in ('Item', 'Key', 'ExpressionAttributeValues', 'ExclusiveStartKey'):
+            if name in kwargs:
+                kwargs[name] = self._serialize(kwargs[name])
+        if 'RequestItems' in kwargs:
+            kwargs['RequestItems'] = self._map_request_items(kwargs['RequestItems'], self._serialize)
+        if 'TransactItems' in kwargs:
+            kwargs['TransactItems'] = [{action_type: self._serialize_request(request) for action_type, request in action.items()}
+                                       for action in kwargs['TransactItems']]
+        return kwargs
+
+    def _deserialize_response(self, response):
+        response = dict(response)
+        for name in ('Item', 'Attributes', 'LastEvaluatedKey'):
+            if name in response:
+                response[name] = self._deserialize(response[name])
+        if 'Items' in response:
+            response['Items'] = [self._deserialize(item) for item in response['Items']]
+        if 'Responses' in response:
+            response['Responses'] = {table: [self._deserialize(item) for item in items]
+                                     for table, items in response['Responses'].items()}
+        for name in ('UnprocessedItems', 'UnprocessedKeys'):
+            if name in response:
+                response[name] = self._map_request_items(response[name], self._deserialize)
+        return response
+
+    @staticmethod
+    def _map_request_items(request_items, convert):
+        converted = {}
+        for table, requests in request_items.items():
+            if isinstance(requests, dict):  # BatchGetItem
+                converted[table] = dict(requests, Keys=[convert(key) for key in requests['Keys']])
+            else:  # BatchWriteItem
+                converted[table] = [
+                    {'PutRequest': {'Item': convert(request['PutRequest']['Item'])}} if 'PutRequest' in request
+                    else {'DeleteRequest': {'Key': convert(request['DeleteRequest']['Key'])}}
+                    for request in requests
+                ]
+        return converted
+
+    def _serialize(self, values):
+        return _to_wire(values)
+
+    def _deserialize(self, values):
+        return _to_python(values)
+
+
+class LocalTable():
+    # get_resource(...).Table(name)
+    def __init__(self, client, name):
+        self.meta = SimpleNamespace(client=client)
+        self.name = name
+
+    def __getattr__(self, operation):
+        method = getattr(self.meta.client, operation)
+        return lambda **kwargs: method(TableName=self.name, **kwargs)
+
+
+class LocalResource():
+    def __init__(self, dynamo):
+        self.meta = SimpleNamespace(client=_ResourceClient(dynamo))
+
+    def Table(self, name):
+        return LocalTable(self.meta.client, name)
+
+
+class LocalSession():
+    # Stands in for a boto3.Session
+    def __init__(self, dynamo):
+        self.dynamo = dynamo
+
+    def client(self, service_name, **kwargs):
+        return LocalClient(self.dynamo)
+
+    def resource(self, service_name, **kwargs):
+        return LocalResource(self.dynamo)
@@ -3,7 +3,7 @@ import os
 import boto3
 
 from single_table import SingleTableDAO
-from multitable.PlayerDAO import PLAYER_NAME, SALARY, PLAYER_TABLE_NAME, PlayerDAO, PLAYER_TEAM
+from multitable.PlayerDAO import LEAGUE, PLAYER_NAME, SALARY, PLAYER_TABLE_NAME, PlayerDAO, PLAYER_TEAM
 from single_table.PlayerDAOV2 import PlayerDAOV2
 from single_table.SingleTableDAO import TABLE_NAME, SORT_KEY
 from multitable.TeamDAO import TeamDAO, WINS, TEAM_TABLE_NAME, TEAM_NAME
@@ -20,15 +20,25 @@ from multitable.TeamDAO import TeamDAO, WINS, TEAM_TABLE_NAME, TEAM_NAME
 # First we need credentials
 from single_table.TeamDAOV2 import TeamDAOV2
 from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
-from helpers import delete_table
-
-session = boto3.Session(
-    aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
-    aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
-    # aws_session_token=os.environ["AWS_SESSION_TOKEN"] # Note that you may not have a session token if you are using an IAM User, just comment this out
-)
+from single_table.UnitOfWork import UnitOfWork, VersionConflict
+from provision import TABLE_SPECS, provision_table
+from cache import LRUCache
+from local_dynamodb import LocalDynamoDB, LocalSession
+
+if os.environ.get("DYNAMO_LOCAL"):
+    # Set DYNAMO_LOCAL=1 to run the walk through against an in memory stand in for Dynamo instead of AWS
+    session = LocalSession(LocalDynamoDB())
+else:
+    session = boto3.Session(
+        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+        # aws_session_token=os.environ["AWS_SESSION_TOKEN"] # Note that you may not have a session token if you are using an IAM User, just comment this out
+    )
 client = session.client('dynamodb')
 
+# Every DAO below is built from this session. Rather than each one creating its own boto3 resource (and connection pool),
+# connection.get_resource hands them all the same one, so creating a DAO is cheap and connections are reused.
+
 
 def create_team_table():
     # Now let's create our first table.
@@ -72,21 +82,14 @@ def create_team_table():
         },
     ]
 
-    # First lets make sure the table doesn't already exist
-    delete_table(client, TEAM_TABLE_NAME)
-
-    # Then we can create the Teams table
-    print("Creating Table: %s" % TEAM_TABLE_NAME)
-    client.create_table(
-        AttributeDefinitions=AttributeDefinitions,
-        KeySchema=KeySchema,
-        TableName=TEAM_TABLE_NAME,
-        BillingMode='PAY_PER_REQUEST'  # TODO: explain provisioned
-    )
-
-    print("Waiting for table creation")
-    waiter = client.get_waiter('table_exists')
-    waiter.wait(TableName=TEAM_TABLE_NAME)
+    # Then we can create the Teams table. Deleting and recreating it on every run would throw its data away, so instead
+    # provision_table (see provision.py) calls create_table with these arguments only if the table doesn't exist yet, and
+    # waits until it is ready to use
+    provision_table(client, TEAM_TABLE_NAME, {
+        'AttributeDefinitions': AttributeDefinitions,
+        'KeySchema': KeySchema,
+        'BillingMode': 'PAY_PER_REQUEST',  # TODO: explain provisioned
+    })
 
     print(client.describe_table(
         TableName=TEAM_TABLE_NAME
@@ -97,10 +100,10 @@ def create_team_table():
     # https://en.wikipedia.org/wiki/Data_access_object#:~:text=In%20computer%20software%2C%20a%20data,exposing%20details%20of%20the%20database.
     teams = [("Phillies", 81), ("Yankees", 103), ("Dodgers", 106)]
 
+    # When loading more than a handful of items we can use write_many, which groups the puts into BatchWriteItem calls of
+    # 25 items each, so a bulk load only costs about 1/25th of the round trips
     team_table = TeamDAO(session)
-
-    for team in teams:
-        team_table.write(team[0], team[1])
+    team_table.write_many(teams)
 
 
 def get_team_data():
@@ -109,6 +112,12 @@ def get_team_data():
     # Now we are ready to complete our first query. Let's get the number of wins the Phillies had in 2019
     print("The Philles had %s wins in 2019" % team_table.read("Phillies")[WINS])
 
+    # When we need several teams at once (for example a standings page) we can fetch up to 100 of them in a single
+    # BatchGetItem round trip instead of calling read once per team
+    team_names = ["Phillies", "Yankees", "Dodgers"]
+    for team_name, team in zip(team_names, team_table.read_many(team_names)):
+        print("The %s had %s wins in 2019" % (team_name, team[WINS]))
+
     # If we were to request an attribute that didn't exist we get a key error, this is just coming from
     # Python in this case, since the Dynamo API just returns an object
     try:
@@ -157,21 +166,14 @@ def create_player_table():
         }
     ]
 
-    # First lets make sure the table doesn't already exist
-    delete_table(client, PLAYER_TABLE_NAME)
-
-    # Then we can create the players table
-    print("Creating Table: %s" % PLAYER_TABLE_NAME)
-    client.create_table(
-        AttributeDefinitions=AttributeDefinitions,
+    # Then we can create the players table. Its spec in provision.py is these same arguments plus the league salary index
+    # we use further down (and the League attribute it is keyed on). provision_table creates the table if it doesn't
+    # exist, and adds the index to one that was created before the index was
+    provision_table(client, PLAYER_TABLE_NAME, dict(
+        TABLE_SPECS[PLAYER_TABLE_NAME],
+        AttributeDefinitions=AttributeDefinitions + [{'AttributeName': LEAGUE, 'AttributeType': 'S'}],
         KeySchema=KeySchema,
-        TableName=PLAYER_TABLE_NAME,
-        BillingMode='PAY_PER_REQUEST',
-    )
-
-    print("Waiting for table creation")
-    waiter = client.get_waiter('table_exists')
-    waiter.wait(TableName=PLAYER_TABLE_NAME)
+    ))
 
     print(client.describe_table(
         TableName=PLAYER_TABLE_NAME
@@ -183,9 +185,7 @@ def create_player_table():
                ("Homer Bailey", 23000000, "Dodgers"), ("Justin Turner", 19000000, "Dodgers")]
 
     player_table = PlayerDAO(session)
-
-    for player in players:
-        player_table.write(player[0], player[1], player[2])
+    player_table.write_many(players)
 
 
 def get_player_data():
@@ -196,7 +196,13 @@ def get_player_data():
     for player in phillies:
         print(player[PLAYER_NAME])
 
-    print("The top paid player is %s"%(phillies[0][PLAYER_NAME]))
+    # Salary is our sort key, so the query above returns the players lowest paid first. Rather than reading the whole team
+    # to find the top paid player we can ask Dynamo to read the partition backwards and stop after the first item
+    print("The top paid player is %s"%(player_table.get_top_paid(team_name="Phillies")[0][PLAYER_NAME]))
+
+    # Across the whole league there is no partition to read backwards. Instead a Global Secondary Index keyed on a League
+    # attribute and Salary keeps every player sorted by salary for us (see provision.py)
+    print("The top paid players in the league are %s" % [player[PLAYER_NAME] for player in player_table.get_by_salary(n=3)])
 
 def single_table():
     # So what happens if we are at huge scale? Right now if we want a "Team Summary" page that includes information about both players and teams. Right now we would have to make two queries to get that
@@ -236,42 +242,70 @@ def single_table():
     # # they must have the same parition key, but do not require a copy of your data and do not have the same consistency
     # # concerns as GSIs. In this case we are going to use a LSI because query #3 will still be using "Team" as the parition key.
     #
-    # First lets make sure the table doesn't already exist
-    delete_table(client, TABLE_NAME)
-
-    # Then we can create the players table
-    print("Creating Table: %s" % TABLE_NAME)
-    client.create_table(
-        AttributeDefinitions=AttributeDefinitions,
+    # Then we can create the single table. Its spec in provision.py is these same arguments plus two GSIs on the numeric
+    # salary (by team and league wide), which provision_table also adds to an existing table that doesn't have them yet
+    # (an LSI can only be created along with the table)
+    provision_table(client, TABLE_NAME, dict(
+        TABLE_SPECS[TABLE_NAME],
+        AttributeDefinitions=AttributeDefinitions + [{'AttributeName': SALARY, 'AttributeType': 'N'},
+                                                     {'AttributeName': LEAGUE, 'AttributeType': 'S'}],
         KeySchema=KeySchema,
-        TableName=TABLE_NAME,
-        BillingMode='PAY_PER_REQUEST',
-    )
-
-    print("Waiting for table creation")
-    waiter = client.get_waiter('table_exists')
-    waiter.wait(TableName=TABLE_NAME)
+    ))
 
     teams = [("Phillies", 81), ("Yankees", 103), ("Dodgers", 106)]
 
     team_table = TeamDAOV2(session)
-
-    for team in teams:
-        team_table.write(team[0], team[1])
+    team_table.write_many(teams)
 
     players = [("Rhys Hoskins", 57500, "Phillies"), ("Bryce Harper", 11538462, "Phillies"),
                ("J.A. Happ", 17000000, "Yankees"), ("Giancarlo Stanton", 26000000, "Yankees"),
                ("Homer Bailey", 23000000, "Dodgers"), ("Justin Turner", 19000000, "Dodgers")]
 
     player_table = PlayerDAOV2(session)
-
-    for player in players:
-        player_table.write(player[0], player[1], player[2])
+    player_table.write_many(players)
 
 def get_single_data():
     team_summary_table = TeamSummaryPageDAO(session)
     print(team_summary_table.read("Phillies"))
 
+    # Player sort keys are PLAYER# followed by the zero padded salary, so they sort by salary and we can push the
+    # "highest paid" and "salary between" queries down to Dynamo
+    player_table = PlayerDAOV2(session)
+    print("The top paid Yankee is %s" % player_table.get_top_paid("Yankees")[0][PLAYER_NAME])
+    print("Phillies earning between $1M and $20M: %s" % player_table.get_salary_range("Phillies", 1000000, 20000000))
+
+    # The same questions can be asked of the TeamSalary and LeagueSalary indexes, which sort by the numeric salary.
+    # Team items have no salary, so they aren't in the indexes at all (a "sparse" index)
+    print("The top paid Dodger is %s" % player_table.get_by_salary("Dodgers")[0][PLAYER_NAME])
+    print("The league's top 3: %s" % player_table.get_by_salary(n=3))
+
+    # Summary pages are read far more often than they change. Putting a cache in front of the DAOs means repeat reads
+    # don't cost us a query at all. Writes through TeamDAOV2/PlayerDAOV2 sharing the same cache invalidate the team.
+    cache = LRUCache(ttl=60)
+    team_summary_table = TeamSummaryPageDAO(session, cache=cache)
+    team_summary_table.read("Phillies")
+    team_summary_table.read("Phillies")  # Served from the cache
+    PlayerDAOV2(session, cache=cache).write("Nick Williams", 555000, "Phillies")
+    print(team_summary_table.read("Phillies"))  # The write invalidated the cached page, so this goes back to Dynamo
+    print(cache.stats())
+
+    # A trade touches two teams: the player leaves one and joins the other. Written one at a time, a failure halfway
+    # through would leave him on both rosters (or neither). A UnitOfWork sends all the writes as one transaction, and the
+    # version numbers make sure nobody changed the teams since we read them
+    trade = UnitOfWork(session, cache=cache)
+    # The player's version too: they may already be a Yankee from an earlier run, and a put is checked like an update
+    phillies_version, yankees_version, player_version = trade.versions(team_names=["Phillies", "Yankees"],
+                                                                       players=[("Yankees", 555000)])
+    trade.delete_player("Phillies", 555000)
+    trade.put_player("Nick Williams", 555000, "Yankees", version=player_version)
+    trade.update_team("Phillies", 81, version=phillies_version)
+    trade.update_team("Yankees", 103, version=yankees_version)
+    try:
+        print("Committed the trade, the teams are now at versions %s" % trade.commit()[2:])
+    except VersionConflict as e:
+        print("Someone else changed %s, read them again and retry" % e.conflicts)
+    print(team_summary_table.read("Yankees"))
+
 
 
 
@@ -281,6 +315,8 @@ def get_single_data():
 # Backups/Global tables for higher reliability
 # DynamoDB table throttle metrics
 # 80% of any table's available read or write IOPS
+# throttle.configure_table(TABLE_NAME, read_capacity=..., write_capacity=...) keeps all of the DAOs under that, and backs
+# off when the table starts throttling us
 
 
 if __name__ == "__main__":
@@ -0,0 +1,344 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+from throttle import READ_OPERATIONS, THROTTLE_ERRORS
+
+# Instrumentation for the DAOs. Every DAO operation (TeamSummaryPageDAO.read, PlayerDAO.get_by_team, ...) produces one
+# OperationRecord with its latency and everything its requests cost: consumed RCU/WCU, items, bytes and retries. That
+# makes it easy to compare access patterns, for example a summary page from the single table against TeamDAO.read plus
+# PlayerDAO.get_by_team from the multitable design.
+#
+#   sink = metrics.InMemorySink()
+#   metrics.set_sink(sink)  # Before creating the DAOs
+#   ...
+#   print(sink.summary())
+#
+# With no sink set (the default) the DAOs' tables are not wrapped and each operation only checks one global.
+
+_sink = None
+# The current operation's record. A context variable rather than a thread local so that operations running as asyncio
+# tasks on the same thread (the asyncio DAOs) each get their own, while a task started by an operation counts towards it.
+_record = ContextVar('record', default=None)
+_log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds, for Prometheus
+
+
+def set_sink(sink):
+    # Send records to sink, or pass None to turn instrumentation off
+    global _sink
+    _sink = sink
+
+
+class OperationRecord():
+    __slots__ = ('dao', 'method', 'table', 'seconds', 'requests', 'read_units', 'write_units', 'items', 'bytes',
+                 'retries', 'error', '_lock')
+
+    def __init__(self, dao, method, table):
+        self.dao = dao
+        self.method = method
+        self.table = table
+        self.seconds = 0.0
+        self.requests = 0
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.items = 0
+        self.bytes = 0
+        self.retries = 0  # Throttled requests and batches that came back with unprocessed items
+        self.error = None
+        # Requests made on other threads (see bind) add to the same record, and += on an attribute isn't atomic
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    @property
+    def labels(self):
+        return self.dao, self.method, self.table
+
+
+def instrumented(table_name):
+    # Decorates a DAO method, or an asyncio DAO's coroutine. Nested instrumented calls (read calling read_many, ...) count
+    # towards the outer operation.
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                sink = _sink
+                if sink is None or _record.get() is not None:
+                    return await method(self, *args, **kwargs)
+                with _operation(sink, self, method, table_name):
+                    return await method(self, *args, **kwargs)
+            return wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            sink = _sink
+            if sink is None or _record.get() is not None:
+                return method(self, *args, **kwargs)
+            with _operation(sink, self, method, table_name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _operation(sink, dao, method, table_name):
+    record = OperationRecord(type(dao).__name__, method.__name__, table_name)
+    token = _record.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.seconds = time.perf_counter() - start
+        _record.reset(token)
+        sink.record(record)
+
+
+def bind(function):
+    # Lets requests made by function on another thread (the parallel shard queries) count towards the current operation
+    record = _record.get()
+    if record is None:
+        return function
+
+    def call(*args, **kwargs):
+        token = _record.set(record)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _record.reset(token)
+    return call
+
+
+def metered(table):
+    # Wraps a boto3 Table (or wire.RawTable) so each request adds its cost to the current operation's record
+    if _sink is None:
+        return table
+    return MeteredTable(table)
+
+
+def metered_async(table):
+    # The same for an aioboto3 Table
+    if _sink is None:
+        return table
+    return AsyncMeteredTable(table)
+
+
+class MeteredTable():
+    def __init__(self, table):
+        self.table = table
+        self.name = table.name
+        if hasattr(table, 'meta'):
+            # helpers.batch_write/batch_get go through table.meta.client
+            self.meta = SimpleNamespace(client=_MeteredClient(table.meta.client))
+
+    def __getattr__(self, operation):
+        return _meter(getattr(self.table, operation), operation)
+
+
+class AsyncMeteredTable(MeteredTable):
+    def __getattr__(self, operation):
+        return _meter_async(getattr(self.table, operation), operation)
+
+
+class _MeteredClient():
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, operation):
+        return _meter(getattr(self.client, operation), operation)
+
+
+def _meter(method, operation):
+    def call(**kwargs):
+        record = _record.get()
+        if record is None:
+            return method(**kwargs)
+        try:
+            response = method(**dict(kwargs, ReturnConsumedCapacity=kwargs.get('ReturnConsumedCapacity', 'TOTAL')))
+        except ClientError as e:
+            _add_error(record, e)
+            raise
+        _add_response(record, operation, kwargs, response)
+        return response
+    return call
+
+
+def _meter_async(method, operation):
+    async def call(**kwargs):
+        record = _record.get()
+        if record is None:
+            return await method(**kwargs)
+        try:
+            response = await method(**dict(kwargs, ReturnConsumedCapacity=kwargs.get('ReturnConsumedCapacity', 'TOTAL')))
+        except ClientError as e:
+            _add_error(record, e)
+            raise
+        _add_response(record, operation, kwargs, response)
+        return response
+    return call
+
+
+def _add_error(record, error):
+    record.add(requests=1, retries=int(error.response['Error']['Code'] in THROTTLE_ERRORS))
+
+
+def _add_response(record, operation, kwargs, response):
+    consumed = response.get('ConsumedCapacity') or []
+    units = sum(entry.get('CapacityUnits', 0) for entry in (consumed if isinstance(consumed, list) else [consumed]))
+    items = _response_items(response) if operation in READ_OPERATIONS else _request_items(kwargs)
+    record.add(
+        requests=1,
+        read_units=units if operation in READ_OPERATIONS else 0,
+        write_units=0 if operation in READ_OPERATIONS else units,
+        items=len(items),
+        bytes=sum(len(repr(item)) for item in items),  # A rough size, but cheap
+        retries=int(bool(response.get('UnprocessedItems') or response.get('UnprocessedKeys'))),
+    )
+
+
+def _response_items(response):
+    if 'Items' in response:
+        return response['Items']
+    if 'Item' in response:
+        return [response['Item']]
+    return [item for items in response.get('Responses', {}).values() for item in items]
+
+
+def _request_items(kwargs):
+    if 'Item' in kwargs:
+        return [kwargs['Item']]
+    if 'Key' in kwargs:
+        return [kwargs['Key']]
+    if 'RequestItems' in kwargs:
+        return [request for requests in kwargs['RequestItems'].values() for request in requests]
+    return kwargs.get('TransactItems', [])
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class InMemorySink():
+    # Keeps totals per (dao, method, table) and the latest `samples` latencies to work out p50/p99
+    def __init__(self, samples=10000):
+        self.samples = samples
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            totals = self.operations.get(record.labels)
+            if totals is None:
+                totals = self.operations[record.labels] = {
+                    "count": 0, "errors": 0, "requests": 0, "read_units": 0.0, "write_units": 0.0, "items": 0,
+                    "bytes": 0, "retries": 0, "latencies": deque(maxlen=self.samples),
+                }
+            totals["count"] += 1
+            totals["errors"] += record.error is not None
+            for name in ("requests", "read_units", "write_units", "items", "bytes", "retries"):
+                totals[name] += getattr(record, name)
+            totals["latencies"].append(record.seconds)
+
+    def summary(self):
+        with self._lock:
+            summary = {}
+            for (dao, method, table), totals in self.operations.items():
+                latencies = sorted(totals["latencies"])
+                summary["%s.%s" % (dao, method)] = dict(
+                    {name: value for name, value in totals.items() if name != "latencies"},
+                    table=table,
+                    p50_ms=percentile(latencies, 0.5) * 1000,
+                    p99_ms=percentile(latencies, 0.99) * 1000,
+                )
+            return summary
+
+    def clear(self):
+        with self._lock:
+            self.operations.clear()
+
+
+class LogSink():
+    # One log line per operation
+    def __init__(self, logger=_log, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def record(self, record):
+        self.logger.log(self.level, "%s.%s table=%s seconds=%.4f requests=%s rcu=%s wcu=%s items=%s bytes=%s retries=%s error=%s",
+                        record.dao, record.method, record.table, record.seconds, record.requests, record.read_units,
+                        record.write_units, record.items, record.bytes, record.retries, record.error)
+
+
+class PrometheusSink():
+    # Aggregates records into a latency histogram and counters, render() returns the Prometheus text format to serve
+    # from a /metrics endpoint.
+    # https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+    COUNTERS = (
+        ("requests", "dynamo_requests_total", "Requests sent to DynamoDB"),
+        ("read_units", "dynamo_consumed_read_capacity_units_total", "Consumed read capacity units"),
+        ("write_units", "dynamo_consumed_write_capacity_units_total", "Consumed write capacity units"),
+        ("items", "dynamo_items_total", "Items read or written"),
+        ("bytes", "dynamo_bytes_total", "Approximate bytes of items read or written"),
+        ("retries", "dynamo_retries_total", "Throttled requests and batches with unprocessed items"),
+    )
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            totals = self.operations.get(record.labels)
+            if totals is None:
+                totals = self.operations[record.labels] = dict(
+                    {name: 0 for name, _, _ in self.COUNTERS}, count=0, sum=0.0, buckets=[0] * len(self.buckets))
+            totals["count"] += 1
+            totals["sum"] += record.seconds
+            for i, bucket in enumerate(self.buckets):
+                if record.seconds <= bucket:
+                    totals["buckets"][i] += 1
+            for name, _, _ in self.COUNTERS:
+                totals[name] += getattr(record, name)
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP dynamo_operation_seconds Latency of DAO operations",
+                "# TYPE dynamo_operation_seconds histogram",
+            ]
+            for labels, totals in self.operations.items():
+                label_text = self._labels(labels)
+                for bucket, count in zip(self.buckets, totals["buckets"]):
+                    lines.append('dynamo_operation_seconds_bucket{%s,le="%s"} %s' % (label_text, bucket, count))
+                lines.append('dynamo_operation_seconds_bucket{%s,le="+Inf"} %s' % (label_text, totals["count"]))
+                lines.append('dynamo_operation_seconds_sum{%s} %s' % (label_text, totals["sum"]))
+                lines.append('dynamo_operation_seconds_count{%s} %s' % (label_text, totals["count"]))
+            for name, metric, description in self.COUNTERS:
+                lines.append("# HELP %s %s" % (metric, description))
+                lines.append("# TYPE %s counter" % metric)
+                for labels, totals in self.operations.items():
+                    lines.append("%s{%s} %s" % (metric, self._labels(labels), totals[name]))
+            return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels):
+        return ",".join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                        for name, value in zip(("dao", "method", "table"), labels))
@@ -1,25 +1,40 @@
+from operator import itemgetter
+
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
+from connection import get_resource
+from helpers import batch_get, batch_write, query_items
+from metrics import instrumented, metered
+from single_table.SingleTableDAO import get_partition_key, get_shard_partitions
+from throttle import throttled
+
 PLAYER_NAME = "PlayerName"
 SALARY = "Salary"
 PLAYER_TEAM = "Team"
 PLAYER_TABLE_NAME = "Players-abc123"
 SALARY_INDEX = 'TeamSalary'
+# The league wide leaderboard, a GSI of LEAGUE and Salary. Like PlayerDAOV2's it is spread over LEADERBOARD_SHARDS
+# partitions so that the whole league's writes don't land on one.
+LEAGUE = "League"
+LEAGUE_NAME = "MLB"
+LEAGUE_SALARY_INDEX = 'LeagueSalary'
+LEADERBOARD_SHARDS = 4
 
 class PlayerDAO():
     def __init__(self, session):
-        self.player_table = session.resource('dynamodb').Table(PLAYER_TABLE_NAME)
+        self.player_table = throttled(metered(get_resource(session).Table(PLAYER_TABLE_NAME)))
 
+    @instrumented(PLAYER_TABLE_NAME)
     def write(self, player_name, salary, team):
-        self.player_table.put_item(
-            Item={
-                PLAYER_NAME: player_name,
-                SALARY: salary,
-                PLAYER_TEAM: team
-            }
-        )
+        self.player_table.put_item(Item=self._to_dynamo_item(player_name, salary, team))
+
+    @instrumented(PLAYER_TABLE_NAME)
+    def write_many(self, players):
+        # players is any iterable of (player_name, salary, team) tuples, it is consumed 25 items at a time
+        return batch_write(self.player_table, (self._to_dynamo_item(*player) for player in players), (PLAYER_TEAM, SALARY))
 
+    @instrumented(PLAYER_TABLE_NAME)
     def read(self, player_name):
         try:
             response = self.player_table.get_item(Key={PLAYER_NAME: player_name})
@@ -28,19 +43,74 @@ class PlayerDAO():
         else:
             return response['Item']
 
+    @instrumented(PLAYER_TABLE_NAME)
+    def read_many(self, keys):
+        # keys are (team, salary) pairs, the key of this table. Returns the players in the order they were asked for,
+        # None for players that don't exist
+        try:
+            return batch_get(self.player_table, [{PLAYER_TEAM: team, SALARY: salary} for team, salary in keys])
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return [None] * len(keys)  # Still one per player, like when they don't exist
+
+    @instrumented(PLAYER_TABLE_NAME)
     def get_by_team(self, team_name):
-        return self.player_table.query(
+        return list(self.iter_by_team(team_name))
+
+    def iter_by_team(self, team_name, page_size=None, limit=None):
+        # Follows LastEvaluatedKey so that teams bigger than a single 1MB page are not cut off
+        return query_items(
+            self.player_table,
+            page_size=page_size,
+            limit=limit,
             KeyConditionExpression=Key(PLAYER_TEAM).eq(team_name)
-        )["Items"]
+        )
+
+    @instrumented(PLAYER_TABLE_NAME)
+    def get_top_paid(self, team_name, n=1):
+        # Salary is this table's (numeric) sort key, so reading backwards and stopping after n items only reads n players
+        return list(query_items(
+            self.player_table,
+            limit=n,
+            KeyConditionExpression=Key(PLAYER_TEAM).eq(team_name),
+            ScanIndexForward=False
+        ))
+
+    @instrumented(PLAYER_TABLE_NAME)
+    def get_salary_range(self, team_name, low, high):
+        # Players earning between low and high (inclusive), lowest paid first
+        return list(query_items(
+            self.player_table,
+            KeyConditionExpression=Key(PLAYER_TEAM).eq(team_name) & Key(SALARY).between(low, high)
+        ))
+
+    @instrumented(PLAYER_TABLE_NAME)
+    def get_by_salary(self, team_name=None, n=1):
+        # The n highest paid players of team_name, or without a team of the whole league, highest paid first.
+        # Salary is already this table's sort key, so a team needs no index (see get_top_paid). League wide there is no
+        # one partition to query, so we read the top n of each leaderboard partition from the index and keep the top n.
+        if team_name is not None:
+            return self.get_top_paid(team_name, n)
+        players = []
+        for partition in get_shard_partitions(LEAGUE_NAME, LEADERBOARD_SHARDS):
+            players.extend(query_items(
+                self.player_table,
+                limit=n,
+                IndexName=LEAGUE_SALARY_INDEX,
+                KeyConditionExpression=Key(LEAGUE).eq(partition),
+                ScanIndexForward=False
+            ))
+        return sorted(players, key=itemgetter(SALARY), reverse=True)[:n]
+
+    @staticmethod
+    def _to_dynamo_item(player_name, salary, team):
+        return {
+            PLAYER_NAME: player_name,
+            SALARY: salary,
+            PLAYER_TEAM: team,
+            LEAGUE: get_partition_key(LEAGUE_NAME, player_name, LEADERBOARD_SHARDS)
+        }
 
     @staticmethod
     def _from_dynamo_item(dynamo_item):
         return {k: dynamo_item[k] for k in (PLAYER_NAME, PLAYER_TEAM, SALARY)}
-
-    # def get_by_salary(self, team_name):
-    #     return self.player_table.query(
-    #         IndexName=SALARY_INDEX,
-    #         KeyConditionExpression=Key(PLAYER_TEAM).eq(team_name),
-    #         ScanIndexForward=False,
-    #         Limit=1
-    #     )["Items"]
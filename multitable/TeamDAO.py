@@ -1,5 +1,10 @@
 from botocore.exceptions import ClientError
 
+from connection import get_resource
+from helpers import batch_get, batch_write
+from metrics import instrumented, metered
+from throttle import throttled
+
 TEAM_NAME = "TeamName"
 WINS = "Wins"
 TEAM_TABLE_NAME = "Teams-abc123"
@@ -7,21 +12,59 @@ TEAM_TABLE_NAME = "Teams-abc123"
 class TeamDAO():
     key_prefix = "team_"
 
-    def __init__(self, session):
-        self.team_table = session.resource('dynamodb').Table(TEAM_TABLE_NAME)
+    def __init__(self, session, cache=None):
+        self.team_table = throttled(metered(get_resource(session).Table(TEAM_TABLE_NAME)))
+        self.cache = cache  # Optional cache.LRUCache, can be shared with other DAOs
 
+    @instrumented(TEAM_TABLE_NAME)
     def write(self, team_name, wins):
-        self.team_table.put_item(
-            Item={
-                TEAM_NAME: self.key_prefix + team_name,
-                WINS: wins,
-            }
-        )
+        item = self._to_dynamo_item(team_name, wins)
+        self.team_table.put_item(Item=item)
+        self._invalidate([item])
+
+    @instrumented(TEAM_TABLE_NAME)
+    def write_many(self, teams):
+        # teams is any iterable of (team_name, wins) tuples, it is consumed 25 items at a time
+        return batch_write(self.team_table, (self._to_dynamo_item(*team) for team in teams), (TEAM_NAME,),
+                           on_written=self._invalidate)
 
+    @instrumented(TEAM_TABLE_NAME)
     def read(self, team_name):
+        if self.cache is None:
+            return self._read(team_name)
+        return self.cache.get((TEAM_TABLE_NAME, self.key_prefix + team_name), "Team", lambda: self._read(team_name))
+
+    @instrumented(TEAM_TABLE_NAME)
+    def read_many(self, team_names):
+        # Returns the teams in the order they were asked for, None for teams that don't exist
+        if self.cache is None:
+            return self._read_many(team_names)
+        return self.cache.get_many([(TEAM_TABLE_NAME, self.key_prefix + team_name) for team_name in team_names], "Team",
+                                   lambda partitions: self._read_many([p[1][len(self.key_prefix):] for p in partitions]))
+
+    def _read_many(self, team_names):
+        try:
+            return batch_get(self.team_table, [{TEAM_NAME: self.key_prefix + team_name} for team_name in team_names])
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return [None] * len(team_names)  # Still one per team, like when they don't exist
+
+    def _read(self, team_name):
         try:
             response = self.team_table.get_item(Key={TEAM_NAME: self.key_prefix + team_name})
         except ClientError as e:
             print(e.response['Error']['Message'])
         else:
-            return response['Item']
\ No newline at end of file
+            return response['Item']
+
+    def _to_dynamo_item(self, team_name, wins):
+        return {
+            TEAM_NAME: self.key_prefix + team_name,
+            WINS: wins,
+        }
+
+    def _invalidate(self, items):
+        # Called after the items are written so the next read goes back to Dynamo
+        if self.cache is not None:
+            for item in items:
+                self.cache.invalidate((TEAM_TABLE_NAME, item[TEAM_NAME]))
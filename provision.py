@@ -0,0 +1,157 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from connection import make_session
+from multitable.PlayerDAO import (LEAGUE as MULTITABLE_LEAGUE, LEAGUE_SALARY_INDEX as MULTITABLE_LEAGUE_SALARY_INDEX,
+                                  PLAYER_NAME as MULTITABLE_PLAYER_NAME, PLAYER_TABLE_NAME, PLAYER_TEAM,
+                                  SALARY as MULTITABLE_SALARY)
+from multitable.TeamDAO import TEAM_NAME as MULTITABLE_TEAM_NAME, TEAM_TABLE_NAME
+from single_table.PlayerDAOV2 import LEAGUE, LEAGUE_SALARY_INDEX, PLAYER_NAME, SALARY, SALARY_INDEX
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME, TEAM_NAME
+
+# Creates the tables the DAOs use, or brings existing ones up to date, without touching their data:
+#   python provision.py          # Waits until every table is ready to use
+#   python provision.py --fast   # Doesn't wait on tables that are already ACTIVE
+#
+# Each table is described once below, as the arguments to create_table. Provisioning compares that with what
+# describe_table says the table looks like and only makes the changes that are missing: tables that don't exist are
+# created (all at the same time), indexes that are missing are added. Anything that can't be changed on an existing
+# table, like its keys, is reported rather than fixed by dropping the table.
+
+
+def _keys(hash_key, range_key=None):
+    keys = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+    if range_key:
+        keys.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+    return keys
+
+
+def _attributes(*attributes):
+    # Only the attributes used in a key (of the table or an index) are declared, everything else is schemaless
+    return [{'AttributeName': name, 'AttributeType': attribute_type} for name, attribute_type in attributes]
+
+
+TABLE_SPECS = {
+    TEAM_TABLE_NAME: {
+        'AttributeDefinitions': _attributes((MULTITABLE_TEAM_NAME, 'S')),
+        'KeySchema': _keys(MULTITABLE_TEAM_NAME),
+        'BillingMode': 'PAY_PER_REQUEST',
+    },
+    PLAYER_TABLE_NAME: {
+        'AttributeDefinitions': _attributes((PLAYER_TEAM, 'S'), (MULTITABLE_SALARY, 'N'), (MULTITABLE_LEAGUE, 'S')),
+        'KeySchema': _keys(PLAYER_TEAM, MULTITABLE_SALARY),
+        'GlobalSecondaryIndexes': [{
+            # The league wide salary leaderboard, see PlayerDAO.get_by_salary
+            'IndexName': MULTITABLE_LEAGUE_SALARY_INDEX,
+            'KeySchema': _keys(MULTITABLE_LEAGUE, MULTITABLE_SALARY),
+            'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': [MULTITABLE_PLAYER_NAME]},
+        }],
+        'BillingMode': 'PAY_PER_REQUEST',
+    },
+    TABLE_NAME: {
+        'AttributeDefinitions': _attributes((TEAM_NAME, 'S'), (SORT_KEY, 'S'), (SALARY, 'N'), (LEAGUE, 'S')),
+        'KeySchema': _keys(TEAM_NAME, SORT_KEY),
+        'GlobalSecondaryIndexes': [{
+            # Players by team and numeric salary. Only player items have a salary, so team items stay out of the index.
+            'IndexName': SALARY_INDEX,
+            'KeySchema': _keys(TEAM_NAME, SALARY),
+            'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': [PLAYER_NAME]},
+        }, {
+            # The league wide salary leaderboard, just as sparse, see PlayerDAOV2.get_by_salary
+            'IndexName': LEAGUE_SALARY_INDEX,
+            'KeySchema': _keys(LEAGUE, SALARY),
+            'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': [PLAYER_NAME]},
+        }],
+        'BillingMode': 'PAY_PER_REQUEST',
+    },
+}
+
+
+def provision(client, specs=None, fast=False):
+    # Provisions every table in specs (all of TABLE_SPECS by default) at the same time, boto3 clients are thread safe.
+    # Returns {table name: [changes made]}.
+    specs = TABLE_SPECS if specs is None else specs
+    with ThreadPoolExecutor(max_workers=max(1, len(specs))) as executor:
+        futures = {table_name: executor.submit(provision_table, client, table_name, spec, fast)
+                   for table_name, spec in specs.items()}
+    return {table_name: future.result() for table_name, future in futures.items()}
+
+
+def provision_table(client, table_name, spec=None, fast=False):
+    spec = spec or TABLE_SPECS[table_name]
+    try:
+        table = client.describe_table(TableName=table_name)['Table']
+    except client.exceptions.ResourceNotFoundException:
+        print("Creating Table: %s" % table_name)
+        client.create_table(TableName=table_name, **spec)
+        print("Waiting for table creation")
+        client.get_waiter('table_exists').wait(TableName=table_name)  # A new table can't be used until it is ACTIVE
+        return ["created"]
+
+    if table['TableStatus'] != 'ACTIVE' or not fast:
+        table = _wait_until_active(client, table_name)
+
+    if _key_names(table['KeySchema']) != _key_names(spec['KeySchema']):
+        print("%s has the keys %s but the spec has %s. Keys can't be changed, the table would have to be recreated" % (
+            table_name, _key_names(table['KeySchema']), _key_names(spec['KeySchema'])))
+        return ["keys differ"]
+
+    changes = []
+    billing_mode = table.get('BillingModeSummary', {}).get('BillingMode', 'PROVISIONED')
+    if billing_mode != spec.get('BillingMode', 'PROVISIONED'):
+        print("Changing %s from %s to %s" % (table_name, billing_mode, spec['BillingMode']))
+        client.update_table(TableName=table_name, BillingMode=spec['BillingMode'],
+                            **({'ProvisionedThroughput': spec['ProvisionedThroughput']} if 'ProvisionedThroughput' in spec else {}))
+        changes.append("billing mode")
+        table = _wait_until_active(client, table_name)
+
+    existing_indexes = {index['IndexName']: index for index in table.get('GlobalSecondaryIndexes', [])}
+    missing_indexes = [index for index in spec.get('GlobalSecondaryIndexes', []) if index['IndexName'] not in existing_indexes]
+    for i, index in enumerate(missing_indexes):
+        # UpdateTable only takes one new index at a time, and the table has to finish building it (backfilling it from
+        # the existing items) before it takes the next
+        print("Adding index %s to %s" % (index['IndexName'], table_name))
+        client.update_table(TableName=table_name, AttributeDefinitions=spec['AttributeDefinitions'],
+                            GlobalSecondaryIndexUpdates=[{'Create': index}])
+        changes.append("index %s" % index['IndexName'])
+        if i < len(missing_indexes) - 1 or not fast:
+            _wait_until_active(client, table_name)
+
+    for index in spec.get('GlobalSecondaryIndexes', []):
+        existing = existing_indexes.get(index['IndexName'])
+        if existing and _key_names(existing['KeySchema']) != _key_names(index['KeySchema']):
+            print("Index %s on %s has the keys %s but the spec has %s, delete it to have it recreated" % (
+                index['IndexName'], table_name, _key_names(existing['KeySchema']), _key_names(index['KeySchema'])))
+    existing_local_indexes = {index['IndexName'] for index in table.get('LocalSecondaryIndexes', [])}
+    for index in spec.get('LocalSecondaryIndexes', []):
+        if index['IndexName'] not in existing_local_indexes:
+            print("%s is missing local index %s, which can only be added when the table is created" % (table_name, index['IndexName']))
+
+    if not changes:
+        print("%s is up to date" % table_name)
+    return changes
+
+
+def _wait_until_active(client, table_name, delay=5):
+    # The table_exists waiter only checks the table, an index can still be building after the table is ACTIVE
+    while True:
+        table = client.describe_table(TableName=table_name)['Table']
+        if table['TableStatus'] == 'ACTIVE' and all(index.get('IndexStatus', 'ACTIVE') == 'ACTIVE'
+                                                    for index in table.get('GlobalSecondaryIndexes', [])):
+            return table
+        time.sleep(delay)
+
+
+def _key_names(key_schema):
+    return {key['KeyType']: key['AttributeName'] for key in key_schema}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the tables, or add what is missing to existing ones")
+    parser.add_argument("--table", choices=sorted(TABLE_SPECS), action="append", help="Only these tables")
+    parser.add_argument("--fast", action="store_true", help="Don't wait on tables that are already ACTIVE")
+    args = parser.parse_args()
+
+    specs = {table_name: TABLE_SPECS[table_name] for table_name in (args.table or TABLE_SPECS)}
+    provision(make_session().client('dynamodb'), specs, fast=args.fast)
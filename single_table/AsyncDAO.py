@@ -0,0 +1,17 @@
+from metrics import metered_async
+from single_table.SingleTableDAO import TABLE_NAME
+from throttle import throttled_async
+
+
+class AsyncDAO():
+    # Base of the asyncio DAOs. dynamo is an open resource from connection.get_async_resource
+    def __init__(self, dynamo):
+        self.dynamo = dynamo
+        self.table = None
+
+    async def _get_table(self):
+        # aioboto3 creates tables asynchronously, so this can't be done in the constructor. Like the other DAOs' tables its
+        # requests go through the table's rate limits (throttle.py) and count towards the current operation (metrics.py).
+        if self.table is None:
+            self.table = throttled_async(metered_async(await self.dynamo.Table(TABLE_NAME)))
+        return self.table
@@ -0,0 +1,41 @@
+from boto3.dynamodb.conditions import Key
+
+from helpers import projection, query_items_async
+from metrics import instrumented
+from single_table.AsyncDAO import AsyncDAO
+from single_table.PlayerDAOV2 import PLAYER_ATTRIBUTES, PLAYER_SORT_KEY_PREFIX, PlayerDAOV2
+from single_table.SingleTableDAO import TABLE_NAME, TEAM_NAME, SORT_KEY
+
+
+class AsyncPlayerDAOV2(AsyncDAO):
+    # asyncio version of PlayerDAOV2, see AsyncDAO
+    @instrumented(TABLE_NAME)
+    async def write(self, player_name, salary, team):
+        table = await self._get_table()
+        await table.put_item(Item=PlayerDAOV2._to_dynamo_item(player_name, salary, team))
+
+    @instrumented(TABLE_NAME)
+    async def get_by_team(self, team_name):
+        return [player async for player in self.iter_by_team(team_name)]
+
+    async def iter_by_team(self, team_name, page_size=None, limit=None):
+        table = await self._get_table()
+        async for item in query_items_async(
+            table,
+            page_size=page_size,
+            limit=limit,
+            KeyConditionExpression=Key(TEAM_NAME).eq(team_name) & Key(SORT_KEY).begins_with(PLAYER_SORT_KEY_PREFIX),
+            **projection(*PLAYER_ATTRIBUTES)
+        ):
+            yield PlayerDAOV2._from_dynamo_item(item)
+
+    @instrumented(TABLE_NAME)
+    async def get_top_paid(self, team_name, n=1):
+        table = await self._get_table()
+        return [PlayerDAOV2._from_dynamo_item(item) async for item in query_items_async(
+            table,
+            limit=n,
+            KeyConditionExpression=Key(TEAM_NAME).eq(team_name) & Key(SORT_KEY).begins_with(PLAYER_SORT_KEY_PREFIX),
+            ScanIndexForward=False,
+            **projection(*PLAYER_ATTRIBUTES)
+        )]
@@ -0,0 +1,26 @@
+from botocore.exceptions import ClientError
+
+from helpers import projection
+from metrics import instrumented
+from single_table.AsyncDAO import AsyncDAO
+from single_table.SingleTableDAO import TABLE_NAME, TEAM_NAME, SORT_KEY
+from single_table.TeamDAOV2 import TEAM_ATTRIBUTES, TEAM_SORT_KEY, TeamDAOV2
+
+
+class AsyncTeamDAOV2(AsyncDAO):
+    # asyncio version of TeamDAOV2, see AsyncDAO
+    @instrumented(TABLE_NAME)
+    async def write(self, team_name, wins):
+        table = await self._get_table()
+        await table.put_item(Item=TeamDAOV2._to_dynamo_item(team_name, wins))
+
+    @instrumented(TABLE_NAME)
+    async def read(self, team_name):
+        table = await self._get_table()
+        try:
+            response = await table.get_item(Key={TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY},
+                                            **projection(*TEAM_ATTRIBUTES))
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+        else:
+            return TeamDAOV2._from_dynamo_item(response['Item'])
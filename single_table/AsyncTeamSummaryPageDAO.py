@@ -0,0 +1,40 @@
+import asyncio
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from helpers import projection, query_items_async
+from metrics import instrumented
+from single_table.AsyncDAO import AsyncDAO
+from single_table.SingleTableDAO import TABLE_NAME, TEAM_NAME
+from single_table.TeamSummaryPageDAO import SUMMARY_ATTRIBUTES, TeamSummaryPageDAO
+
+
+class AsyncTeamSummaryPageDAO(AsyncDAO):
+    # asyncio version of TeamSummaryPageDAO, see AsyncDAO
+    @instrumented(TABLE_NAME)
+    async def read(self, team_name):
+        table = await self._get_table()
+        try:
+            items = [item async for item in query_items_async(
+                table,
+                KeyConditionExpression=Key(TEAM_NAME).eq(team_name),
+                ScanIndexForward=False,
+                **projection(*SUMMARY_ATTRIBUTES)
+            )]
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+        else:
+            return TeamSummaryPageDAO._from_dynamo_item(items)
+
+    @instrumented(TABLE_NAME)
+    async def read_many(self, team_names, concurrency=32):
+        # Reads the summary pages at the same time, with at most `concurrency` queries in flight so a big request can't
+        # exhaust the connection pool. Results are in the same order as team_names.
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def read(team_name):
+            async with semaphore:
+                return await self.read(team_name)
+
+        return await asyncio.gather(*(read(team_name) for team_name in team_names))
@@ -0,0 +1,82 @@
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from connection import get_resource
+from helpers import batch_write
+from single_table.PlayerDAOV2 import PLAYER_TYPE, PlayerDAOV2
+from single_table.SingleTableDAO import PRIMARY_KEY, TABLE_NAME, TEAM_NAME, SORT_KEY, get_partition_key, get_shard_count
+from single_table.TeamDAOV2 import TEAM_TYPE, TeamDAOV2
+from throttle import throttled
+
+_DONE = object()  # Tells a worker that there are no more records coming
+
+
+class BulkLoader():
+    # A single batch_write call only ever has one request in flight, so a big import is bound by round trip latency.
+    # The loader fans the records out over a pool of threads, each with its own boto3 session (sessions and resources are
+    # not thread safe) so that each worker gets its own connection pool.
+    #
+    # Records are routed to a worker by their partition key (the team, or the team's shard when shards is set the same
+    # way as PlayerDAOV2's). This keeps every write for a partition on a single worker, so workers don't compete for the
+    # same partition's throughput while other partitions sit idle.
+    # It also means records with the same key reach the same worker, whose batch_write keeps the last of them (a CSV can
+    # list two players on the same team and salary, which Dynamo won't take in one batch).
+    # Each worker has a bounded queue, if the workers fall behind the producer blocks instead of buffering the whole file.
+    #
+    # Records are (TEAM_TYPE, team_name, wins) or (PLAYER_TYPE, player_name, salary, team) tuples.
+    def __init__(self, session_factory, workers=4, queue_size=1000, shards=1):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self.shards = shards
+
+    def load(self, records):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._worker, q) for q in queues]
+            try:
+                for item in map(self._to_dynamo_item, records):
+                    worker = self._get_worker(item[TEAM_NAME])
+                    if not self._put(queues[worker], futures[worker], item):
+                        break  # A worker died, stop reading and let its error surface below
+            finally:
+                for q, future in zip(queues, futures):
+                    self._put(q, future, _DONE)
+            written = sum(future.result() for future in futures)  # Re-raises any error from a worker
+
+        elapsed = time.monotonic() - start
+        print("Loaded %s items with %s workers in %.2fs (%.0f items/sec)" % (
+            written, self.workers, elapsed, written / elapsed if elapsed else 0))
+        return written
+
+    def _worker(self, records):
+        table = throttled(get_resource(self.session_factory()).Table(TABLE_NAME))
+        return batch_write(table, iter(records.get, _DONE), PRIMARY_KEY)
+
+    def _get_worker(self, partition_key):
+        # crc32 rather than hash() so that a partition always lands on the same worker between runs
+        return zlib.crc32(partition_key.encode('utf-8')) % self.workers
+
+    @staticmethod
+    def _put(records, future, record):
+        # Blocks while the worker's queue is full, but gives up if the worker has died so we don't wait forever
+        while not future.done():
+            try:
+                records.put(record, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _to_dynamo_item(self, record):
+        if record[0] == TEAM_TYPE:
+            return TeamDAOV2._to_dynamo_item(*record[1:])
+        if record[0] == PLAYER_TYPE:
+            item = PlayerDAOV2._to_dynamo_item(*record[1:])
+            item[TEAM_NAME] = get_partition_key(record[3], item[SORT_KEY], get_shard_count(self.shards, record[3]))
+            return item
+        raise ValueError("Unknown record type %s" % record[0])
@@ -1,44 +1,317 @@
+import math
+from decimal import Decimal
+from itertools import islice
+from operator import attrgetter
+
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
-from single_table.SingleTableDAO import TEAM_NAME, SORT_KEY, TABLE_NAME
+from connection import get_client, get_resource
+from helpers import (TRANSACTION_SIZE, ThreadLocalTable, batch_get, batch_write, cancellation_reasons, chunked, prefetch,
+                     projection, query_items, scatter_gather)
+from metrics import bind, instrumented, metered
+from single_table.SingleTableDAO import (PRIMARY_KEY, TEAM_NAME, SORT_KEY, TABLE_NAME, Record, get_partition_key, get_shard_count,
+                                         get_shard_partitions, get_team_name)
+from single_table.TeamDAOV2 import PAYROLL, PLAYER_COUNT, ROSTER, TEAM_SORT_KEY
+from throttle import throttled
+from wire import RawTable, decode_number
 
 PLAYER_SORT_KEY_PREFIX = "PLAYER#"
 PLAYER_TYPE = "Player"
 PLAYER_NAME = "PlayerName"
 SALARY = "Salary"
-SALARY_INDEX = 'TeamSalary'
+SALARY_INDEX = 'TeamSalary'  # GSI of Team and the numeric Salary, see provision.py
+# The league wide salary leaderboard is the GSI LEAGUE_SALARY_INDEX, keyed on LEAGUE and Salary. Only player items have a
+# LEAGUE attribute, so the index is sparse: team items (and their summaries) are left out of it. Every player in one
+# index partition would put the whole league's writes on it, so players are spread over LEADERBOARD_SHARDS partitions
+# ("MLB#SHARD#0", ...) the same way a hot team is sharded, and read back with one query per shard. Players written
+# before the attribute existed only show up once they are written again (for example by reloading with load.py).
+LEAGUE = "League"
+LEAGUE_NAME = "MLB"
+LEAGUE_SALARY_INDEX = 'LeagueSalary'
+LEADERBOARD_SHARDS = 4
+SALARY_KEY_WIDTH = 12  # Digits in the sort key, enough for salaries up to $999,999,999,999
+PLAYER_ATTRIBUTES = (PLAYER_NAME, TEAM_NAME, SALARY)  # The attributes we read back, everything else is left out by the projection
+SUMMARY_WRITE_SIZE = TRANSACTION_SIZE // 2  # Players per transaction, each can need its team's summary updated too
+SUMMARY_WRITE_ATTEMPTS = 3
+
+
+class PlayerRecord(Record):
+    # See Record, player.player_name is also player[PLAYER_NAME] and so on
+    __slots__ = ("player_name", "team", "salary")
+    _fields = __slots__
+    _keys = PLAYER_ATTRIBUTES
 
 class PlayerDAOV2():
-    def __init__(self, session):
-        self.player_table = session.resource('dynamodb').Table(TABLE_NAME)
+    def __init__(self, session, cache=None, fast_path=False, shards=1, summary=False):
+        self.session = session
+        self.player_table = throttled(metered(get_resource(session).Table(TABLE_NAME)))
+        self.cache = cache  # Optional cache.LRUCache, share it with TeamDAOV2 and TeamSummaryPageDAO
+        # With fast_path queries skip the resource's (de)serialization, see wire.py
+        self.fast_table = throttled(metered(RawTable(get_client(session), TABLE_NAME))) if fast_path else None
+        # Write sharding for hot teams, see SingleTableDAO.py. Either a shard count for every team or {team_name: count}.
+        # Readers and writers of a team must agree on its count, so change it only for a new (or reloaded) table.
+        self.shards = shards
+        # Keep the team items' materialized summaries up to date, see TeamDAOV2. Every writer of a team has to use it.
+        self.summary = summary
+        # For the shard queries, which run on several threads
+        self.thread_table = ThreadLocalTable(self._make_table)
 
+    @instrumented(TABLE_NAME)
     def write(self, player_name, salary, team):
-        self.player_table.put_item(
-            Item={
-                TEAM_NAME: team,
-                SORT_KEY: self._get_sort_key(salary),
-                PLAYER_NAME: player_name,
-                SALARY: salary,
-            }
-        )
+        item = self._to_sharded_item(player_name, salary, team)
+        if self.summary:
+            self._write_with_summary([item])
+        else:
+            self.player_table.put_item(Item=item)
+        self._invalidate([item])
 
+    @instrumented(TABLE_NAME)
+    def write_many(self, players):
+        # players is any iterable of (player_name, salary, team) tuples, it is consumed 25 items at a time
+        items = (self._to_sharded_item(*player) for player in players)
+        if self.summary:
+            written = 0
+            for chunk in chunked(items, SUMMARY_WRITE_SIZE):
+                written += self._write_with_summary(chunk)
+                self._invalidate(chunk)
+            return written
+        return batch_write(self.player_table, items, PRIMARY_KEY, on_written=self._invalidate)
+
+    @instrumented(TABLE_NAME)
+    def read_many(self, keys):
+        # keys are (team, salary) pairs, which together make up a player's key. Returns the players in the order they
+        # were asked for, None for players that don't exist
+        sort_keys = [(team, self._get_sort_key(salary)) for team, salary in keys]
+        try:
+            items = batch_get(self.player_table, [{TEAM_NAME: self._get_partition_key(team, sort_key), SORT_KEY: sort_key}
+                                                  for team, sort_key in sort_keys],
+                              **projection(SORT_KEY, *PLAYER_ATTRIBUTES))  # batch_get needs the whole key to match up results
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return [None] * len(sort_keys)  # Still one per player, like when they don't exist
+        else:
+            return [item and self._from_dynamo_item(item) for item in items]
+
+    @instrumented(TABLE_NAME)
     def get_by_team(self, team_name):
-        return list(map(self._from_dynamo_item, self.player_table.query(
-            KeyConditionExpression=Key(TEAM_NAME).eq(team_name) & Key(SORT_KEY).begins_with(PLAYER_SORT_KEY_PREFIX)
-        )["Items"]))
+        return list(self.iter_by_team(team_name))
+
+    def iter_by_team(self, team_name, page_size=None, limit=None):
+        # Follows LastEvaluatedKey so that teams bigger than a single 1MB page are not cut off
+        return self._query(team_name, Key(SORT_KEY).begins_with(PLAYER_SORT_KEY_PREFIX), page_size=page_size, limit=limit)
+
+    @instrumented(TABLE_NAME)
+    def get_top_paid(self, team_name, n=1):
+        # The sort key orders players by salary, so reading the partition backwards and stopping after n items means
+        # Dynamo only reads the n players we want instead of the whole roster
+        return list(self._query(team_name, Key(SORT_KEY).begins_with(PLAYER_SORT_KEY_PREFIX), limit=n, reverse=True))
 
-    # def get_by_salary(self, team_name):
-    #     return list(map(self._from_dynamo_item,self.player_table.query(
-    #         # IndexName=SALARY_INDEX,
-    #         KeyConditionExpression=Key(TEAM_NAME).eq(team_name),
-    #         ScanIndexForward=False,
-    #     )["Items"]))
+    @instrumented(TABLE_NAME)
+    def get_salary_range(self, team_name, low, high):
+        # Players earning between low and high (inclusive), lowest paid first. Salaries are whole dollars, so fractional
+        # bounds are rounded inwards (1000.5 to 2000.5 is 1001 to 2000), and bounds past what a sort key holds are
+        # clamped to it (-1 to infinity is every player). Dynamo rejects a BETWEEN whose bounds are the wrong way around,
+        # which rounding can lead to (5.2 to 5.8 is 6 to 5), so an empty range isn't sent at all.
+        low, high = math.ceil(max(low, 0)), math.floor(min(high, 10 ** SALARY_KEY_WIDTH - 1))
+        if low > high:
+            return []
+        return list(self._query(team_name, Key(SORT_KEY).between(self._get_sort_key(low), self._get_sort_key(high))))
+
+    @instrumented(TABLE_NAME)
+    def get_by_salary(self, team_name=None, n=1):
+        # The n highest paid players of team_name, or without a team of the whole league, highest paid first. Both come
+        # from an index sorted by the numeric Salary, read backwards with Limit n, so Dynamo reads n items per index
+        # partition instead of a roster (or the whole table) we'd sort ourselves. Indexes are eventually consistent, a
+        # player written a moment ago may not be in the results yet.
+        if team_name is None:
+            partitions = get_shard_partitions(LEAGUE_NAME, LEADERBOARD_SHARDS)
+            return list(self._query_partitions(LEAGUE, partitions, None, limit=n, reverse=True, index_name=LEAGUE_SALARY_INDEX))
+        return list(self._query(team_name, None, limit=n, reverse=True, index_name=SALARY_INDEX))
+
+    def _query(self, team_name, sort_condition, page_size=None, limit=None, reverse=False, index_name=None):
+        # Queries the team's players in salary order
+        partitions = get_shard_partitions(team_name, get_shard_count(self.shards, team_name))
+        return self._query_partitions(TEAM_NAME, partitions, sort_condition, page_size, limit, reverse, index_name)
+
+    def _query_partitions(self, key_name, partitions, sort_condition, page_size=None, limit=None, reverse=False, index_name=None):
+        # Several partitions (a sharded team's, or the leaderboard's) are queried in parallel and merged. Each partition is
+        # sorted by salary, so the merged result is sorted too. Pages after the first are read as the results are used.
+        if len(partitions) == 1:
+            return map(self._get_mapper(), self._query_partition(
+                self.fast_table or self.player_table, key_name, partitions[0], sort_condition, page_size, limit, reverse, index_name))
+
+        queries = [bind(lambda partition=partition: prefetch(map(self._get_mapper(), self._query_partition(
+            self.thread_table, key_name, partition, sort_condition, page_size, limit, reverse, index_name))))
+                   for partition in partitions]
+        return islice(scatter_gather(queries, key=attrgetter('salary'), reverse=reverse), limit)
+
+    @staticmethod
+    def _query_partition(table, key_name, partition_key, sort_condition, page_size, limit, reverse, index_name=None):
+        query_kwargs = {'ScanIndexForward': False} if reverse else {}
+        if index_name:
+            query_kwargs['IndexName'] = index_name
+        key_condition = Key(key_name).eq(partition_key)
+        return query_items(
+            table,
+            page_size=page_size,
+            limit=limit,  # The top n overall are within the top n of every partition
+            KeyConditionExpression=key_condition & sort_condition if sort_condition else key_condition,
+            **projection(*PLAYER_ATTRIBUTES),
+            **query_kwargs
+        )
+
+    def _make_table(self):
+        if self.fast_table:
+            return throttled(metered(RawTable(get_client(self.session), TABLE_NAME)))
+        return throttled(metered(get_resource(self.session).Table(TABLE_NAME)))
+
+    def _write_with_summary(self, items):
+        # Writes the players and adds them to their teams' summaries in one transaction, so a summary never counts a
+        # player that wasn't written (or misses one that was). Players are only counted when they are new, which the
+        # transaction checks with a condition on each put. If a player already exists the transaction is cancelled, and
+        # the same players are sent again as one transaction with that player counted as existing.
+        items = list({(item[TEAM_NAME], item[SORT_KEY]): item for item in items}.values())  # A transaction touches an item once
+        new = [True] * len(items)
+        teams = {}
+        for i, item in enumerate(items):
+            teams.setdefault(get_team_name(item[TEAM_NAME]), []).append(i)
+        attempts, summary_attempts = SUMMARY_WRITE_ATTEMPTS, SUMMARY_WRITE_ATTEMPTS
+        while True:
+            try:
+                self.player_table.meta.client.transact_write_items(
+                    TransactItems=[self._put_action(item, is_new) for item, is_new in zip(items, new)] +
+                                  [self._summary_action(team_name, [items[i] for i in team_items], [new[i] for i in team_items])
+                                   for team_name, team_items in teams.items()])
+                return len(items)
+            except ClientError as e:
+                reasons = cancellation_reasons(e)
+                failed_puts = [i for i, reason in enumerate(reasons[:len(items)]) if reason == 'ConditionalCheckFailed']
+                failed_summaries = [team_name for team_name, reason in zip(teams, reasons[len(items):])
+                                    if reason == 'ConditionalCheckFailed']
+                if not failed_puts and not failed_summaries:
+                    raise
+                if failed_puts:
+                    # Players that already existed (or, written as existing, have been deleted since) change sides
+                    attempts -= 1
+                    if attempts == 0:
+                        raise
+                    for i in failed_puts:
+                        new[i] = not new[i]
+                if failed_summaries:
+                    # The team has no summary yet (its players came before the team, or were written without one), start
+                    # one from the players it already has
+                    summary_attempts -= 1
+                    if summary_attempts == 0:
+                        raise
+                    for team_name in failed_summaries:
+                        self._start_summary(team_name)
+
+    @staticmethod
+    def _put_action(item, new):
+        return {'Put': {
+            'TableName': TABLE_NAME,
+            'Item': item,
+            'ConditionExpression': 'attribute_not_exists(#sk)' if new else 'attribute_exists(#sk)',
+            'ExpressionAttributeNames': {'#sk': SORT_KEY},
+        }}
+
+    @staticmethod
+    def _summary_action(team_name, items, new):
+        # The roster is keyed by sort key, so rewriting a player only changes the name. Only new players (new is a flag
+        # per item) add to the count and payroll.
+        names = {'#roster': ROSTER}
+        values = {}
+        roster_updates = []
+        for i, item in enumerate(items):
+            names['#p%s' % i] = item[SORT_KEY]
+            values[':p%s' % i] = item[PLAYER_NAME]
+            roster_updates.append('#roster.#p%s = :p%s' % (i, i))
+        update_expression = 'SET ' + ', '.join(roster_updates)
+        new_items = [item for item, is_new in zip(items, new) if is_new]
+        if new_items:
+            update_expression += ' ADD #player_count :player_count, #payroll :payroll'
+            names.update({'#player_count': PLAYER_COUNT, '#payroll': PAYROLL})
+            values.update({':player_count': len(new_items), ':payroll': sum(item[SALARY] for item in new_items)})
+        return {'Update': {
+            'TableName': TABLE_NAME,
+            'Key': {TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY},
+            'UpdateExpression': update_expression,
+            'ConditionExpression': 'attribute_exists(#roster)',  # Dynamo can't add to a map that isn't there
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }}
+
+    def _start_summary(self, team_name):
+        # Works the summary out from the players already in the team's partition, so they are counted just like the ones
+        # added to it later. Only if the team still has no summary: whoever started it first has counted them already.
+        players = [player for player in self.iter_by_team(team_name) if isinstance(player, PlayerRecord)]
+        try:
+            self.player_table.update_item(ConditionExpression='attribute_not_exists(#roster)',
+                                          **self._summary_update(team_name, players))
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    @classmethod
+    def _summary_update(cls, team_name, players):
+        # update_item arguments that set the team's summary to players (PlayerRecords), see TeamSummaryPageDAO.rebuild
+        return dict(
+            Key={TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY},
+            UpdateExpression="SET #roster = :roster, #player_count = :player_count, #payroll = :payroll",
+            ExpressionAttributeNames={'#roster': ROSTER, '#player_count': PLAYER_COUNT, '#payroll': PAYROLL},
+            ExpressionAttributeValues={
+                ':roster': {cls._get_sort_key(player.salary): player.player_name for player in players},
+                ':player_count': len(players),
+                ':payroll': sum(player.salary for player in players),
+            },
+        )
+
+    def _get_mapper(self):
+        return self._from_wire_item if self.fast_table else self._from_dynamo_item
+
+    def _invalidate(self, items):
+        # Players are part of their team's summary page, so drop everything cached for the team
+        if self.cache is not None:
+            for item in items:
+                self.cache.invalidate((TABLE_NAME, get_team_name(item[TEAM_NAME])))
 
     @staticmethod
     def _get_sort_key(salary):
-        # We reverse the salary so that larger numbers are longer strings (and there for are sorted alphabetically)
-        return PLAYER_SORT_KEY_PREFIX + str(salary)[::-1]
+        # Sort keys are strings, which Dynamo compares character by character. Zero padding the salary to a fixed width
+        # makes that the same as comparing the numbers ("000000057500" < "000011538462"), so Dynamo can sort and filter
+        # by salary for us.
+        # Salaries are whole dollars. Anything else is rejected rather than truncated, a sort key of 57500 for a stored
+        # Salary of 57500.5 would put the player in the wrong place for get_top_paid and get_salary_range.
+        if isinstance(salary, bool) or not isinstance(salary, (int, float, Decimal)) or int(salary) != salary:
+            raise ValueError("Salary %r is not a whole number of dollars" % (salary,))
+        salary = int(salary)
+        if not 0 <= salary < 10 ** SALARY_KEY_WIDTH:
+            raise ValueError("Salary %s does not fit in a %s digit sort key" % (salary, SALARY_KEY_WIDTH))
+        return PLAYER_SORT_KEY_PREFIX + str(salary).zfill(SALARY_KEY_WIDTH)
+
+    def _get_partition_key(self, team_name, sort_key):
+        return get_partition_key(team_name, sort_key, get_shard_count(self.shards, team_name))
+
+    def _to_sharded_item(self, player_name, salary, team):
+        item = self._to_dynamo_item(player_name, salary, team)
+        item[TEAM_NAME] = self._get_partition_key(team, item[SORT_KEY])
+        return item
+
+    @classmethod
+    def _to_dynamo_item(cls, player_name, salary, team):
+        return {
+            TEAM_NAME: team,
+            SORT_KEY: cls._get_sort_key(salary),
+            PLAYER_NAME: player_name,
+            SALARY: salary,
+            LEAGUE: get_partition_key(LEAGUE_NAME, player_name, LEADERBOARD_SHARDS),
+        }
 
     @staticmethod
     def _from_dynamo_item(dynamo_item):
-        return {k: dynamo_item[k] for k in (PLAYER_NAME, TEAM_NAME, SALARY)}
+        return PlayerRecord(dynamo_item[PLAYER_NAME], get_team_name(dynamo_item[TEAM_NAME]), dynamo_item[SALARY])
+
+    @staticmethod
+    def _from_wire_item(wire_item):
+        return PlayerRecord(wire_item[PLAYER_NAME]['S'], get_team_name(wire_item[TEAM_NAME]['S']), decode_number(wire_item[SALARY]['N']))
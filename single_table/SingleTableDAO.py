@@ -1,3 +1,82 @@
+import zlib
+from collections.abc import Mapping
+
 TABLE_NAME = "Baseball-abc123"
 TEAM_NAME = "Team" # This is our Partition Key
-SORT_KEY = "SK"
\ No newline at end of file
+SORT_KEY = "SK"
+PRIMARY_KEY = (TEAM_NAME, SORT_KEY)
+
+# Write sharding. Every item for a team shares one partition key, so a popular team is limited to what a single
+# partition can do (3000 RCU / 1000 WCU). Sharding spreads the team's players over n partition keys, "Phillies#SHARD#0"
+# to "Phillies#SHARD#<n-1>", and reads query all of them in parallel and merge the results. The team item itself stays
+# under the plain team name.
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/bp-partition-sharding.html
+SHARD_SEPARATOR = "#SHARD#"
+
+
+def get_shard_count(shards, team_name):
+    # shards is either a count for every team or a dict of {team_name: count} for just the hot ones
+    if isinstance(shards, int):
+        return shards
+    return shards.get(team_name, 1)
+
+
+def get_partition_key(team_name, sort_key, shard_count):
+    # The shard comes from the sort key rather than at random so that an item can still be read back by its key.
+    # crc32 rather than hash() so that it is the same between runs.
+    if shard_count == 1:
+        return team_name
+    return "%s%s%s" % (team_name, SHARD_SEPARATOR, zlib.crc32(sort_key.encode('utf-8')) % shard_count)
+
+
+def get_shard_partitions(team_name, shard_count):
+    if shard_count == 1:
+        return [team_name]
+    return ["%s%s%s" % (team_name, SHARD_SEPARATOR, shard) for shard in range(shard_count)]
+
+
+def get_team_name(partition_key):
+    return partition_key.partition(SHARD_SEPARATOR)[0]
+
+
+class Record(Mapping):
+    # What the DAOs read back, instead of a dict per item. Values are kept in __slots__, with no per instance __dict__,
+    # which keeps large rosters small, and are read as attributes (player.salary). Records are also read only Mappings of
+    # the item's attribute names, like the dicts we used to return: player[SALARY], SALARY in player, player.get(...),
+    # player.keys() and dict(player) all work. json.dumps only takes real dicts, so use json.dumps(dict(player)).
+    __slots__ = ()
+    _fields = ()  # Attribute names of the record
+    _keys = ()  # The item attribute names they come from, in the same order
+
+    def __init__(self, *values):
+        if len(values) != len(self._fields):
+            raise TypeError("%s takes %s values, got %s" % (type(self).__name__, len(self._fields), len(values)))
+        for field, value in zip(self._fields, values):
+            object.__setattr__(self, field, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._fields[self._keys.index(key)])
+        except ValueError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read only" % type(self).__name__)  # Records are shared, for example by the cache
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join("%s=%r" % (field, getattr(self, field)) for field in self._fields))
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self._fields)
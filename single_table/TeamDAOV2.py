@@ -1,33 +1,138 @@
 from botocore.exceptions import ClientError
 
-from single_table.SingleTableDAO import TABLE_NAME, TEAM_NAME, SORT_KEY
+from connection import get_client, get_resource
+from helpers import TRANSACTION_SIZE, batch_get, batch_write, chunked, projection
+from metrics import instrumented, metered
+from single_table.SingleTableDAO import PRIMARY_KEY, TABLE_NAME, TEAM_NAME, SORT_KEY, Record
+from throttle import throttled
+from wire import RawTable, decode_number
 
 TEAM_TYPE = "Team"
 WINS = "Wins"
 TEAM_SORT_KEY = "TEAM#"
+TEAM_ATTRIBUTES = (TEAM_NAME, WINS)  # The attributes we read back, everything else is left out by the projection
+
+# The materialized summary. With summary=True the team item also keeps a summary of its players, updated by every write
+# through PlayerDAOV2, so that TeamSummaryPageDAO can read a summary page with one get_item instead of a query.
+# The top earner isn't stored: the roster's highest sort key is the highest salary, see TeamSummaryPageDAO.
+ROSTER = "Roster"  # {player sort key: player name}
+PLAYER_COUNT = "PlayerCount"
+PAYROLL = "Payroll"
+TEAM_SUMMARY_ATTRIBUTES = (ROSTER, PLAYER_COUNT, PAYROLL)
+# Starts an empty summary, if_not_exists leaves one that is already there alone
+SUMMARY_INIT_EXPRESSION = ("#roster = if_not_exists(#roster, :empty_roster), #player_count = if_not_exists(#player_count, :zero), "
+                           "#payroll = if_not_exists(#payroll, :zero)")
+SUMMARY_INIT_NAMES = {'#roster': ROSTER, '#player_count': PLAYER_COUNT, '#payroll': PAYROLL}
+SUMMARY_INIT_VALUES = {':empty_roster': {}, ':zero': 0}
+
+
+class TeamRecord(Record):
+    # See Record, team.wins is also team[WINS]
+    __slots__ = ("team", "wins")
+    _fields = __slots__
+    _keys = TEAM_ATTRIBUTES
 
 class TeamDAOV2():
-    def __init__(self, session):
-        self.team_table = session.resource('dynamodb').Table(TABLE_NAME)
+    def __init__(self, session, cache=None, fast_path=False, summary=False):
+        self.team_table = throttled(metered(get_resource(session).Table(TABLE_NAME)))
+        self.cache = cache  # Optional cache.LRUCache, share it with PlayerDAOV2 and TeamSummaryPageDAO
+        # With fast_path reads skip the resource's (de)serialization, see wire.py
+        self.fast_table = throttled(metered(RawTable(get_client(session), TABLE_NAME))) if fast_path else None
+        self.summary = summary  # Keep the materialized summary, a put would replace it so writes become updates
 
+    @instrumented(TABLE_NAME)
     def write(self, team_name, wins):
-        self.team_table.put_item(
-            Item={
-                TEAM_NAME: team_name,
-                SORT_KEY: TEAM_SORT_KEY,
-                WINS: wins,
-            }
+        if self.summary:
+            self.team_table.update_item(**self._summary_update(team_name, wins))
+            self._invalidate([{TEAM_NAME: team_name}])
+            return
+        item = self._to_dynamo_item(team_name, wins)
+        self.team_table.put_item(Item=item)
+        self._invalidate([item])
+
+    @instrumented(TABLE_NAME)
+    def write_many(self, teams):
+        # teams is any iterable of (team_name, wins) tuples, it is consumed 25 items at a time
+        if self.summary:
+            return self._write_many_with_summary(teams)
+        return batch_write(self.team_table, (self._to_dynamo_item(*team) for team in teams), PRIMARY_KEY,
+                           on_written=self._invalidate)
+
+    def _write_many_with_summary(self, teams):
+        # BatchWriteItem can only put whole items, so the updates go in transactions of up to 100 teams instead
+        written = 0
+        for chunk in chunked(teams, TRANSACTION_SIZE):
+            updates = dict(chunk)  # A transaction can only touch an item once, the last write for a team wins
+            self.team_table.meta.client.transact_write_items(TransactItems=[
+                {'Update': dict(self._summary_update(team_name, wins), TableName=TABLE_NAME)} for team_name, wins in updates.items()
+            ])
+            self._invalidate([{TEAM_NAME: team_name} for team_name in updates])
+            written += len(updates)
+        return written
+
+    @staticmethod
+    def _summary_update(team_name, wins):
+        return dict(
+            Key={TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY},
+            UpdateExpression="SET #wins = :wins, " + SUMMARY_INIT_EXPRESSION,
+            ExpressionAttributeNames=dict(SUMMARY_INIT_NAMES, **{'#wins': WINS}),
+            ExpressionAttributeValues=dict(SUMMARY_INIT_VALUES, **{':wins': wins}),
         )
 
+    @instrumented(TABLE_NAME)
     def read(self, team_name):
+        if self.cache is None:
+            return self._read(team_name)
+        return self.cache.get((TABLE_NAME, team_name), TEAM_TYPE, lambda: self._read(team_name))
+
+    @instrumented(TABLE_NAME)
+    def read_many(self, team_names):
+        # Returns the teams in the order they were asked for, None for teams that don't exist
+        if self.cache is None:
+            return self._read_many(team_names)
+        return self.cache.get_many([(TABLE_NAME, team_name) for team_name in team_names], TEAM_TYPE,
+                                   lambda partitions: self._read_many([p[1] for p in partitions]))
+
+    def _read_many(self, team_names):
         try:
-            response = self.team_table.get_item(Key={TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY}) # Use the SK to get only the "Team" items
+            items = batch_get(self.team_table, [{TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY} for team_name in team_names],
+                              **projection(SORT_KEY, *TEAM_ATTRIBUTES))  # batch_get needs the whole key to match up results
         except ClientError as e:
             print(e.response['Error']['Message'])
+            return [None] * len(team_names)  # Still one per team, like when they don't exist
         else:
+            return [item and self._from_dynamo_item(item) for item in items]
+
+    def _read(self, team_name):
+        try:
+            response = (self.fast_table or self.team_table).get_item(Key={TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY}, # Use the SK to get only the "Team" items
+                                                                      **projection(*TEAM_ATTRIBUTES))
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+        else:
+            if self.fast_table:
+                return self._from_wire_item(response['Item'])
             return self._from_dynamo_item(response['Item'])
 
+    def _invalidate(self, items):
+        # Any write to a team's partition also changes its summary page, so drop everything cached for the team
+        if self.cache is not None:
+            for item in items:
+                self.cache.invalidate((TABLE_NAME, item[TEAM_NAME]))
+
+    @staticmethod
+    def _to_dynamo_item(team_name, wins):
+        return {
+            TEAM_NAME: team_name,
+            SORT_KEY: TEAM_SORT_KEY,
+            WINS: wins,
+        }
 
     @staticmethod
     def _from_dynamo_item(dynamo_item):
-        return {k: dynamo_item[k] for k in (TEAM_NAME, WINS)}
\ No newline at end of file
+        # No wins on a team item that was only started by a summary, because its players came before the team
+        return TeamRecord(dynamo_item[TEAM_NAME], dynamo_item.get(WINS))
+
+    @staticmethod
+    def _from_wire_item(wire_item):
+        return TeamRecord(wire_item[TEAM_NAME]['S'], decode_number(wire_item[WINS]['N']) if WINS in wire_item else None)
@@ -1,24 +1,116 @@
+from decimal import Decimal
+from itertools import islice
+
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
-from single_table.PlayerDAOV2 import PLAYER_SORT_KEY_PREFIX, PlayerDAOV2
-from single_table.SingleTableDAO import TABLE_NAME, TEAM_NAME, SORT_KEY
-from single_table.TeamDAOV2 import TEAM_SORT_KEY, TeamDAOV2
+from connection import get_client, get_resource
+from helpers import ThreadLocalTable, prefetch, projection, query_items, scatter_gather
+from metrics import bind, instrumented, metered
+from single_table.PlayerDAOV2 import PLAYER_ATTRIBUTES, PLAYER_SORT_KEY_PREFIX, PlayerDAOV2, PlayerRecord
+from single_table.SingleTableDAO import TABLE_NAME, TEAM_NAME, SORT_KEY, get_shard_count, get_shard_partitions
+from single_table.TeamDAOV2 import (PAYROLL, PLAYER_COUNT, ROSTER, TEAM_ATTRIBUTES, TEAM_SORT_KEY, TEAM_SUMMARY_ATTRIBUTES,
+                                    WINS, TeamDAOV2, TeamRecord)
+from throttle import throttled
+from wire import RawTable, decode_number
+
+SUMMARY_TYPE = "Summary"
+# Everything the team and player records need, plus the sort key to tell the two apart
+SUMMARY_ATTRIBUTES = tuple(dict.fromkeys((SORT_KEY,) + TEAM_ATTRIBUTES + PLAYER_ATTRIBUTES))
 
 class TeamSummaryPageDAO:
-    def __init__(self, session):
-        self.table = session.resource('dynamodb').Table(TABLE_NAME)
+    def __init__(self, session, cache=None, fast_path=False, shards=1, summary=False):
+        self.table = throttled(metered(get_resource(session).Table(TABLE_NAME)))
+        self.cache = cache  # Optional cache.LRUCache, it is invalidated by writes through TeamDAOV2/PlayerDAOV2
+        # With fast_path queries skip the resource's (de)serialization, see wire.py
+        self.fast_table = throttled(metered(RawTable(get_client(session), TABLE_NAME))) if fast_path else None
+        # Must match the shards the players were written with, see PlayerDAOV2
+        self.shards = shards
+        # For the shard queries, which run on several threads
+        self.thread_table = ThreadLocalTable(lambda: throttled(metered(
+            RawTable(get_client(session), TABLE_NAME) if fast_path else get_resource(session).Table(TABLE_NAME))))
+        # Read the materialized summary kept on the team item instead of querying the partition, see TeamDAOV2. Only
+        # for teams written with summary=True (or rebuilt).
+        self.summary = summary
 
+    @instrumented(TABLE_NAME)
     def read(self, team_name):
+        read = self._read_summary if self.summary else self._read
+        if self.cache is None:
+            return read(team_name)
+        return self.cache.get((TABLE_NAME, team_name), SUMMARY_TYPE, lambda: read(team_name))
+
+    @instrumented(TABLE_NAME)
+    def rebuild(self, team_name):
+        # Works the team's summary out from its partition and stores it on the team item. For teams that were written
+        # without summary=True, or to repair one.
+        players = [record for record in self.iter_by_team(team_name) if isinstance(record, PlayerRecord)]
+        self.table.update_item(**PlayerDAOV2._summary_update(team_name, players))
+        if self.cache is not None:
+            self.cache.invalidate((TABLE_NAME, team_name))
+
+    def _read_summary(self, team_name):
+        try:
+            response = (self.fast_table or self.table).get_item(Key={TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY},
+                                                                **projection(*TEAM_ATTRIBUTES + TEAM_SUMMARY_ATTRIBUTES))
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+        else:
+            if 'Item' not in response:
+                return None
+            if self.fast_table:
+                return self._from_wire_summary_item(response['Item'])
+            return self._from_summary_item(response['Item'])
+
+    def _read(self, team_name):
         try:
-            response = self.table.query(
-                KeyConditionExpression=Key(TEAM_NAME).eq(team_name),
-                ScanIndexForward=False
-            )
+            items = list(self._query(team_name))  # Every page of the partition, not just the first 1MB
         except ClientError as e:
             print(e.response['Error']['Message'])
         else:
-            return self._from_dynamo_item(response['Items'])
+            if self.fast_table:
+                return self._from_wire_item(items)
+            return self._from_dynamo_item(items)
+
+    def iter_by_team(self, team_name, page_size=None, limit=None):
+        # Streams the team item followed by the players, without holding the whole partition in memory
+        if self.fast_table:
+            get_sort_key, team_mapper, player_mapper = lambda item: item[SORT_KEY]['S'], TeamDAOV2._from_wire_item, PlayerDAOV2._from_wire_item
+        else:
+            get_sort_key, team_mapper, player_mapper = lambda item: item[SORT_KEY], TeamDAOV2._from_dynamo_item, PlayerDAOV2._from_dynamo_item
+
+        for item in self._query(team_name, page_size, limit):
+            sort_key = get_sort_key(item)
+            if sort_key == TEAM_SORT_KEY:
+                yield team_mapper(item)
+            elif sort_key.startswith(PLAYER_SORT_KEY_PREFIX):
+                yield player_mapper(item)
+
+    def _query(self, team_name, page_size=None, limit=None):
+        shard_count = get_shard_count(self.shards, team_name)
+        if shard_count == 1:
+            return self._query_partition(self.fast_table or self.table, team_name, page_size, limit)
+
+        # The team item is under the plain team name and the players are spread over the shards. Query them all at once
+        # and merge them back into the order a single partition would have returned them in, "TEAM#" first.
+        if self.fast_table:
+            get_sort_key = lambda item: item[SORT_KEY]['S']
+        else:
+            get_sort_key = lambda item: item[SORT_KEY]
+        queries = [bind(lambda partition=partition: prefetch(self._query_partition(self.thread_table, partition, page_size, limit)))
+                   for partition in [team_name] + get_shard_partitions(team_name, shard_count)]
+        return islice(scatter_gather(queries, key=get_sort_key, reverse=True), limit)
+
+    @staticmethod
+    def _query_partition(table, partition_key, page_size, limit):
+        return query_items(
+            table,
+            page_size=page_size,
+            limit=limit,
+            KeyConditionExpression=Key(TEAM_NAME).eq(partition_key),
+            ScanIndexForward=False,
+            **projection(*SUMMARY_ATTRIBUTES)
+        )
 
     @staticmethod
     def _from_dynamo_item(dynamo_item):
@@ -30,3 +122,40 @@ class TeamSummaryPageDAO:
             "Players": players
         }
 
+    @staticmethod
+    def _from_wire_item(wire_items):
+        team = TeamDAOV2._from_wire_item(next(filter(lambda item: item[SORT_KEY]['S']==TEAM_SORT_KEY,wire_items)))
+        players = list(map(PlayerDAOV2._from_wire_item, filter(lambda item: item[SORT_KEY]['S'].startswith(PLAYER_SORT_KEY_PREFIX),wire_items)))
+
+        return {
+            "Team": team,
+            "Players": players
+        }
+
+    @staticmethod
+    def _from_summary_item(dynamo_item):
+        team = TeamRecord(dynamo_item[TEAM_NAME], dynamo_item.get(WINS))  # No wins if the players came before the team
+        # The roster's keys are the players' sort keys, which sort by salary and have the salary in them
+        players = [PlayerRecord(player_name, team.team, Decimal(sort_key[len(PLAYER_SORT_KEY_PREFIX):]))
+                   for sort_key, player_name in sorted(dynamo_item.get(ROSTER, {}).items(), reverse=True)]
+        return {
+            "Team": team,
+            "Players": players,
+            "PlayerCount": dynamo_item.get(PLAYER_COUNT, 0),
+            "Payroll": dynamo_item.get(PAYROLL, 0),
+            "TopEarner": players[0] if players else None,  # Highest paid first, so always in step with the roster
+        }
+
+    @staticmethod
+    def _from_wire_summary_item(wire_item):
+        team = TeamRecord(wire_item[TEAM_NAME]['S'], decode_number(wire_item[WINS]['N']) if WINS in wire_item else None)
+        roster = wire_item[ROSTER]['M'] if ROSTER in wire_item else {}
+        players = [PlayerRecord(roster[sort_key]['S'], team.team, int(sort_key[len(PLAYER_SORT_KEY_PREFIX):]))
+                   for sort_key in sorted(roster, reverse=True)]
+        return {
+            "Team": team,
+            "Players": players,
+            "PlayerCount": decode_number(wire_item[PLAYER_COUNT]['N']) if PLAYER_COUNT in wire_item else 0,
+            "Payroll": decode_number(wire_item[PAYROLL]['N']) if PAYROLL in wire_item else 0,
+            "TopEarner": players[0] if players else None,
+        }
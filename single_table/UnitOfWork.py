@@ -0,0 +1,306 @@
+from botocore.exceptions import ClientError
+
+from connection import get_resource
+from helpers import TRANSACTION_SIZE, batch_get, cancellation_reasons, projection
+from metrics import instrumented, metered
+from single_table.PlayerDAOV2 import (LEAGUE, LEAGUE_NAME, LEADERBOARD_SHARDS, PLAYER_NAME, PLAYER_TYPE, SALARY,
+                                      PlayerDAOV2)
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME, TEAM_NAME, get_partition_key
+from single_table.TeamDAOV2 import (PAYROLL, PLAYER_COUNT, ROSTER, SUMMARY_INIT_EXPRESSION, SUMMARY_INIT_NAMES,
+                                    SUMMARY_INIT_VALUES, TEAM_SORT_KEY, TEAM_TYPE, WINS, TeamDAOV2)
+from throttle import throttled
+
+# A unit of work collects writes to team and player items and commits them together in one TransactWriteItems call:
+# either all of them happen or none do. A trade is a player deleted from one team and put on another, which as separate
+# writes could leave the player on both teams (or neither) if the second one failed.
+#
+#   work = UnitOfWork(session)
+#   phillies, yankees, harper = work.versions(team_names=["Phillies", "Yankees"], players=[("Yankees", 11538462)])
+#   work.delete_player("Phillies", 11538462)
+#   work.put_player("Bryce Harper", 11538462, "Yankees", version=harper)
+#   work.update_team("Phillies", 80, version=phillies)
+#   work.commit()
+#
+# Optimistic locking: every item written by a unit of work carries a VERSION attribute, which goes up by one on each
+# write. Passing the version we read makes the write conditional on the item still being at that version, so if someone
+# else changed it in the meantime the whole transaction is cancelled with a VersionConflict instead of silently
+# overwriting their change. Read again and retry. Version 0 is an item that doesn't exist or was never written by a unit
+# of work, and version=None skips the check.
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/DynamoDBMapper.OptimisticLocking.html
+#
+# With summary=True the teams' materialized summaries (see TeamDAOV2) are updated in the same transaction, one update per
+# team for all of its players' changes. Players are then only counted once: a put with version 0 also checks that the
+# player doesn't exist yet, and a delete that the player does. A team's own write (update_team, or put_team, which becomes
+# an update that keeps the summary) is merged into that update, which means a team can't be put or deleted in the same
+# unit of work that changes its players.
+
+VERSION = "Version"
+
+
+class VersionConflict(Exception):
+    # conflicts are the keys of the actions whose version (or existence) check failed, ("Team", team_name) or
+    # ("Player", team_name, salary)
+    def __init__(self, conflicts):
+        super().__init__("Version conflict on %s" % ", ".join(map(str, conflicts)))
+        self.conflicts = conflicts
+
+
+class UnitOfWork():
+    def __init__(self, session, cache=None, shards=1, summary=False):
+        self.table = throttled(metered(get_resource(session).Table(TABLE_NAME)))
+        self.cache = cache  # Optional cache.LRUCache, the teams written are invalidated once the transaction commits
+        self.players = PlayerDAOV2(session, shards=shards)  # For the players' (possibly sharded) keys
+        self.summary = summary  # Keep the teams' materialized summaries up to date, every writer of a team has to
+        self._actions = []  # (TransactWriteItems action, key, version after the commit)
+        self._items = set()  # An item can only be written once per transaction
+        self._team_updates = {}  # team name -> the Update of its team item, which the summary changes are merged into
+        self._summaries = {}  # team name -> changes to its summary, see _summary_change
+
+    def __len__(self):
+        return len(self._actions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Commits at the end of a with block, unless it raised
+        if exc_type is None:
+            self.commit()
+
+    # Teams
+
+    def put_team(self, team_name, wins, version=0):
+        # Replaces the whole team item. With summary=True it is an update instead, which keeps (or starts) the summary.
+        if self.summary:
+            if version is None:
+                raise ValueError("A put needs the version it replaces, 0 for a new item")
+            self._update({TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY}, (TEAM_TYPE, team_name), {WINS: wins}, version,
+                         must_exist=False, init_summary=True)
+            return
+        self._put(TeamDAOV2._to_dynamo_item(team_name, wins), (TEAM_TYPE, team_name), version)
+
+    def update_team(self, team_name, wins, version=None):
+        self._update({TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY}, (TEAM_TYPE, team_name), {WINS: wins}, version)
+
+    def delete_team(self, team_name, version=None):
+        self._delete({TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY}, (TEAM_TYPE, team_name), version)
+
+    # Players, which are keyed by team and salary
+
+    def put_player(self, player_name, salary, team, version=0):
+        item = self.players._to_sharded_item(player_name, salary, team)
+        self._put(item, (PLAYER_TYPE, team, salary), version, must_not_exist=self.summary and version == 0)
+        self._summary_change(team, item[SORT_KEY], player_name, new=version == 0, salary=item[SALARY])
+
+    def update_player(self, team, salary, player_name, version=None):
+        key = self._player_key(team, salary)
+        self._update(key, (PLAYER_TYPE, team, salary), {
+            PLAYER_NAME: player_name,
+            LEAGUE: get_partition_key(LEAGUE_NAME, player_name, LEADERBOARD_SHARDS),  # The leaderboard shard follows the name
+        }, version)
+        self._summary_change(team, key[SORT_KEY], player_name)
+
+    def delete_player(self, team, salary, version=None):
+        key = self._player_key(team, salary)
+        self._delete(key, (PLAYER_TYPE, team, salary), version, must_exist=self.summary)
+        self._summary_change(team, key[SORT_KEY], None, deleted=True, salary=salary)
+
+    @instrumented(TABLE_NAME)
+    def versions(self, team_names=(), players=()):
+        # The current versions of teams and of players ((team, salary) pairs), teams first, in one BatchGetItem.
+        # 0 for items that don't exist or have no version yet.
+        keys = [{TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY} for team_name in team_names] + \
+               [self._player_key(team, salary) for team, salary in players]
+        try:
+            items = batch_get(self.table, keys, **projection(TEAM_NAME, SORT_KEY, VERSION))
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+        else:
+            return [int(item.get(VERSION, 0)) if item else 0 for item in items]
+
+    @instrumented(TABLE_NAME)
+    def commit(self):
+        # Sends everything collected so far as one transaction and starts over. Returns the version of each item after
+        # the commit, in the order they were added: None for deletes and for updates made without a version. If it fails
+        # nothing was written, and the unit of work still holds its writes.
+        if not self._actions:
+            return []
+        self._add_summaries()
+        for attempt in range(2):
+            try:
+                # No ClientRequestToken: botocore makes one up for each call and sends the same one when it retries the
+                # call, so a retried commit that had already gone through doesn't fail its own version checks
+                self.table.meta.client.transact_write_items(
+                    TransactItems=[self._render(action) for action, _, _ in self._actions])
+                break
+            except ClientError as e:
+                reasons = cancellation_reasons(e)
+                if 'ConditionalCheckFailed' not in reasons:
+                    raise
+                conflicts = [key for (_, key, _), reason in zip(self._actions, reasons) if reason == 'ConditionalCheckFailed']
+                if attempt == 0 and self._start_summaries(conflicts):
+                    continue  # Only a team without a summary yet, try again now that it has one
+                raise VersionConflict(conflicts)
+
+        actions, self._actions, self._items, self._team_updates, self._summaries = self._actions, [], set(), {}, {}
+        if self.cache is not None:
+            for team_name in {key[1] for _, key, _ in actions}:
+                self.cache.invalidate((TABLE_NAME, team_name))
+        return [version for _, _, version in actions]
+
+    def _put(self, item, key, version, must_not_exist=False):
+        if version is None:
+            raise ValueError("A put needs the version it replaces, 0 for a new item")
+        condition, names, values = self._version_condition(version, must_exist=False, must_not_exist=must_not_exist)
+        item[VERSION] = version + 1
+        self._add({'Put': dict(self._expression(condition, names, values), TableName=TABLE_NAME, Item=item)},
+                  (item[TEAM_NAME], item[SORT_KEY]), key, version + 1)
+
+    def _update(self, dynamo_key, key, attributes, version, must_exist=True, init_summary=False):
+        # Updates only touch the attributes given, and ADD starts the version at 1 on an item that doesn't have one.
+        # Kept in parts until the commit, so that a team's summary changes can be merged in.
+        placeholders = ['#a%s' % i for i in range(len(attributes))]
+        condition, condition_names, condition_values = self._version_condition(version, must_exist=must_exist)
+        update = {
+            'Key': dynamo_key,
+            'SET': ["%s = :a%s" % (name, i) for i, name in enumerate(placeholders)],
+            'REMOVE': [],
+            'ADD': ["#version :one"],
+            'names': {**dict(zip(placeholders, attributes)), **condition_names, '#version': VERSION},
+            'values': {**{':a%s' % i: value for i, value in enumerate(attributes.values())}, **condition_values, ':one': 1},
+            'conditions': [condition] if condition else [],
+            'init_summary': init_summary,
+        }
+        if init_summary:
+            update['SET'].append(SUMMARY_INIT_EXPRESSION)
+            update['names'].update(SUMMARY_INIT_NAMES)
+            update['values'].update(SUMMARY_INIT_VALUES)
+        self._add({'Update': update}, (dynamo_key[TEAM_NAME], dynamo_key[SORT_KEY]), key,
+                  None if version is None else version + 1)
+        if dynamo_key[SORT_KEY] == TEAM_SORT_KEY:
+            self._team_updates[dynamo_key[TEAM_NAME]] = update
+
+    def _delete(self, dynamo_key, key, version, must_exist=False):
+        condition, names, values = self._version_condition(version, must_exist=must_exist)
+        self._add({'Delete': dict(self._expression(condition, names, values), TableName=TABLE_NAME, Key=dynamo_key)},
+                  (dynamo_key[TEAM_NAME], dynamo_key[SORT_KEY]), key, None)
+
+    def _add(self, action, item_key, key, version):
+        if len(self._actions) == TRANSACTION_SIZE:
+            raise ValueError("A unit of work is one transaction, which takes at most %s writes" % TRANSACTION_SIZE)
+        if item_key in self._items:
+            raise ValueError("%s is already written by this unit of work" % (key,))
+        self._items.add(item_key)
+        self._actions.append((action, key, version))
+
+    # Materialized summaries
+
+    def _summary_change(self, team_name, sort_key, player_name, new=False, deleted=False, salary=0):
+        # Puts the player on the roster under player_name, or takes them off it if deleted. New and deleted players also
+        # change the count and payroll by one and their salary.
+        if not self.summary:
+            return
+        change = self._summaries.setdefault(team_name, {'roster': {}, 'count': 0, 'payroll': 0})
+        change['roster'][sort_key] = None if deleted else player_name
+        if new or deleted:
+            change['count'] += -1 if deleted else 1
+            change['payroll'] += -salary if deleted else salary
+
+    def _add_summaries(self):
+        # Adds an update of the team item for each team whose summary changes but that isn't written itself. The changes
+        # are merged in when the actions are rendered, so a commit can be sent again after it failed.
+        for team_name in self._summaries:
+            update = self._team_updates.get(team_name)
+            if update is None:
+                if (team_name, TEAM_SORT_KEY) in self._items:
+                    raise ValueError("%s is deleted by this unit of work, its players' changes can't be added to its "
+                                     "summary" % team_name)
+                update = {'Key': {TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY}, 'SET': [], 'REMOVE': [], 'ADD': [],
+                          'names': {}, 'values': {}, 'conditions': [], 'init_summary': False}
+                self._add({'Update': update}, (team_name, TEAM_SORT_KEY), (TEAM_TYPE, team_name), None)
+                self._team_updates[team_name] = update
+            elif update['init_summary']:
+                # The roster may not exist yet, and Dynamo won't start it and add to it in one expression
+                raise ValueError("%s is put by this unit of work, put it on its own before changing its players" % team_name)
+
+    def _with_summary(self, update):
+        # A copy of the team's update with its summary changes added
+        change = self._summaries.get(update['Key'][TEAM_NAME])
+        if update['Key'][SORT_KEY] != TEAM_SORT_KEY or change is None:
+            return update
+        update = dict(update, SET=list(update['SET']), REMOVE=list(update['REMOVE']), ADD=list(update['ADD']),
+                      names=dict(update['names'], **{'#roster': ROSTER}), values=dict(update['values']),
+                      conditions=update['conditions'] + ['attribute_exists(#roster)'])  # Dynamo can't add to a missing map
+        for i, (sort_key, player_name) in enumerate(change['roster'].items()):
+            update['names']['#r%s' % i] = sort_key
+            if player_name is None:
+                update['REMOVE'].append('#roster.#r%s' % i)
+            else:
+                update['SET'].append('#roster.#r%s = :r%s' % (i, i))
+                update['values'][':r%s' % i] = player_name
+        if change['count'] or change['payroll']:
+            update['ADD'].append('#player_count :player_count, #payroll :payroll')
+            update['names'].update({'#player_count': PLAYER_COUNT, '#payroll': PAYROLL})
+            update['values'].update({':player_count': change['count'], ':payroll': change['payroll']})
+        return update
+
+    def _start_summaries(self, conflicts):
+        # Starts the summaries of the conflicting teams that don't have one yet. True if that was all of the conflicts.
+        team_names = [key[1] for key in conflicts if key[0] == TEAM_TYPE and key[1] in self._team_updates]
+        if not self.summary or len(team_names) != len(conflicts):
+            return False
+        try:
+            items = batch_get(self.table, [{TEAM_NAME: team_name, SORT_KEY: TEAM_SORT_KEY} for team_name in team_names],
+                              **projection(TEAM_NAME, SORT_KEY, ROSTER))
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return False
+        if any(item and ROSTER in item for item in items):
+            return False  # A real version conflict
+        for team_name in team_names:
+            self.players._start_summary(team_name)
+        return True
+
+    def _render(self, action):
+        if 'Update' not in action:
+            return action
+        update = self._with_summary(action['Update'])
+        expression = " ".join("%s %s" % (clause, ", ".join(update[clause])) for clause in ('SET', 'REMOVE', 'ADD')
+                              if update[clause])
+        return {'Update': dict(
+            self._expression(" AND ".join(update['conditions']), update['names'], update['values']),
+            TableName=TABLE_NAME,
+            Key=update['Key'],
+            UpdateExpression=expression,
+        )}
+
+    @staticmethod
+    def _version_condition(version, must_exist, must_not_exist=False):
+        # (condition, names, values) for the version check. An update must also find its item, or it would create one.
+        conditions, names, values = [], {}, {}
+        if must_exist or must_not_exist:
+            conditions.append("attribute_exists(#sk)" if must_exist else "attribute_not_exists(#sk)")
+            names['#sk'] = SORT_KEY
+        if version == 0:
+            conditions.append("attribute_not_exists(#version)")
+            names['#version'] = VERSION
+        elif version is not None:
+            conditions.append("#version = :version")
+            names['#version'] = VERSION
+            values[':version'] = version
+        return " AND ".join(conditions), names, values
+
+    @staticmethod
+    def _expression(condition, names, values):
+        expression = {}
+        if condition:
+            expression['ConditionExpression'] = condition
+        if names:
+            expression['ExpressionAttributeNames'] = names
+        if values:
+            expression['ExpressionAttributeValues'] = values
+        return expression
+
+    def _player_key(self, team, salary):
+        sort_key = PlayerDAOV2._get_sort_key(salary)
+        return {TEAM_NAME: self.players._get_partition_key(team, sort_key), SORT_KEY: sort_key}
@@ -0,0 +1,38 @@
+import pytest
+
+import metrics
+import throttle
+from local_dynamodb import LocalDynamoDB, LocalSession
+from provision import TABLE_SPECS
+
+# The tests run against local_dynamodb, so they need no AWS account. Every test gets a fresh in memory Dynamo with the
+# tables from provision.py.
+
+
+@pytest.fixture
+def dynamo():
+    dynamo = LocalDynamoDB(seed=0)
+    client = LocalSession(dynamo).client('dynamodb')
+    for table_name, spec in TABLE_SPECS.items():
+        client.create_table(TableName=table_name, **spec)
+    dynamo.calls.clear()
+    return dynamo
+
+
+@pytest.fixture
+def session(dynamo):
+    return LocalSession(dynamo)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    # Backoff sleeps would only slow the tests down
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+
+
+@pytest.fixture(autouse=True)
+def reset_globals():
+    # metrics and throttle keep module level state, don't let it leak between tests
+    yield
+    metrics.set_sink(None)
+    throttle._limiters.clear()
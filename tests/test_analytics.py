@@ -0,0 +1,49 @@
+import statistics
+
+import pytest
+
+from analytics import PayrollStats
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.TeamDAOV2 import TeamDAOV2
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+
+TEAMS = [("Phillies", 80), ("Mets", 75), ("Marlins", 0)]
+PLAYERS = [("P%s" % p, 500000 + 1000 * p, TEAMS[p % 2][0]) for p in range(11)]
+
+
+@pytest.fixture
+def league(session):
+    TeamDAOV2(session).write_many(TEAMS)
+    PlayerDAOV2(session, shards={"Phillies": 3}).write_many(PLAYERS)  # Shard keys are counted under their team
+    return session
+
+
+def salaries(team_name):
+    return sorted((salary for _, salary, team in PLAYERS if team == team_name), reverse=True)
+
+
+@pytest.mark.parametrize("page_size", [None, 2])
+def test_stats_from_table(league, page_size):
+    stats = PayrollStats.from_table(league, page_size=page_size)
+    assert stats.payroll() == {"Phillies": sum(salaries("Phillies")), "Mets": sum(salaries("Mets")), "Marlins": 0}
+    assert stats.player_counts()["Phillies"] == 6
+    assert stats.median_salary() == {"Phillies": statistics.median(salaries("Phillies")), "Mets": statistics.median(salaries("Mets"))}
+    assert stats.mean_salary()["Mets"] == statistics.mean(salaries("Mets"))
+    assert stats.top_k(2)["Phillies"] == [("P10", 510000), ("P8", 508000)]
+    assert [team for team, _ in stats.salary_per_win()] == sorted(["Phillies", "Mets"], key=lambda team: sum(salaries(team)) / dict(TEAMS)[team])
+
+
+def test_stats_from_records(league):
+    stats = PayrollStats()
+    for team_name, _ in TEAMS:
+        stats.add_records(TeamSummaryPageDAO(league, shards={"Phillies": 3}).iter_by_team(team_name))
+    assert stats.payroll() == PayrollStats.from_table(league).payroll()
+    assert stats.top_k(1) == {"Phillies": [("P10", 510000)], "Mets": [("P9", 509000)]}
+
+
+def test_more_players_after_a_statistic(league):
+    stats = PayrollStats.from_table(league)
+    assert stats.top_k(1)["Mets"] == [("P9", 509000)]
+    stats.add_players(["Mets"], [900000], ["New"])
+    assert stats.top_k(1)["Mets"] == [("New", 900000)]
+    assert stats.player_counts()["Mets"] == 6
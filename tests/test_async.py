@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+import throttle
+from connection import get_async_resource, get_resource
+from provision import TABLE_SPECS
+from single_table.AsyncPlayerDAOV2 import AsyncPlayerDAOV2
+from single_table.AsyncTeamDAOV2 import AsyncTeamDAOV2
+from single_table.AsyncTeamSummaryPageDAO import AsyncTeamSummaryPageDAO
+from single_table.SingleTableDAO import TABLE_NAME
+
+
+class AsyncResource():
+    # Gives the local_dynamodb resource the shape of an aioboto3 one, whose Table() and requests are coroutines
+    def __init__(self, resource):
+        self.resource = resource
+
+    async def Table(self, name):
+        return AsyncTable(self.resource.Table(name))
+
+
+class AsyncRequests():
+    def __init__(self, target):
+        self.target = target
+
+    def __getattr__(self, operation):
+        async def call(**kwargs):
+            await asyncio.sleep(0)  # Let other tasks run, like a request in flight would
+            return getattr(self.target, operation)(**kwargs)
+        return call
+
+
+class AsyncTable(AsyncRequests):
+    def __init__(self, table):
+        super().__init__(table)
+        self.name = table.name
+        self.meta = SimpleNamespace(client=AsyncRequests(table.meta.client))
+
+
+@pytest.fixture
+def dynamo_resource(session):
+    return AsyncResource(get_resource(session))
+
+
+def test_async_write_and_read(dynamo_resource):
+    async def run():
+        await AsyncTeamDAOV2(dynamo_resource).write("Phillies", 81)
+        players = AsyncPlayerDAOV2(dynamo_resource)
+        for player in [("Rhys Hoskins", 57500, "Phillies"), ("Bryce Harper", 11538462, "Phillies")]:
+            await players.write(*player)
+        return (await AsyncTeamDAOV2(dynamo_resource).read("Phillies"), await players.get_by_team("Phillies"),
+                await players.get_top_paid("Phillies"))
+
+    team, players, top_paid = asyncio.run(run())
+    assert team.wins == 81
+    assert [player.player_name for player in players] == ["Rhys Hoskins", "Bryce Harper"]
+    assert [player.player_name for player in top_paid] == ["Bryce Harper"]
+
+
+def test_async_summary_pages_keep_their_order(dynamo_resource):
+    async def run():
+        teams = AsyncTeamDAOV2(dynamo_resource)
+        for team_name, wins in [("Phillies", 81), ("Yankees", 103), ("Dodgers", 106)]:
+            await teams.write(team_name, wins)
+        await AsyncPlayerDAOV2(dynamo_resource).write("J.A. Happ", 17000000, "Yankees")
+        return await AsyncTeamSummaryPageDAO(dynamo_resource).read_many(["Dodgers", "Yankees", "Phillies"], concurrency=2)
+
+    pages = asyncio.run(run())
+    assert [page["Team"].team for page in pages] == ["Dodgers", "Yankees", "Phillies"]
+    assert [player.player_name for player in pages[1]["Players"]] == ["J.A. Happ"]
+
+
+def test_async_operations_are_recorded(dynamo_resource):
+    sink = metrics.InMemorySink()
+    metrics.set_sink(sink)  # Before the DAOs make their tables
+
+    async def run():
+        teams = AsyncTeamDAOV2(dynamo_resource)
+        await asyncio.gather(teams.write("Phillies", 81), teams.write("Yankees", 103))  # Two operations at once
+        await AsyncTeamSummaryPageDAO(dynamo_resource).read_many(["Phillies", "Yankees"])
+
+    asyncio.run(run())
+    summary = sink.summary()
+    assert summary["AsyncTeamDAOV2.write"]["count"] == 2 and summary["AsyncTeamDAOV2.write"]["requests"] == 2
+    assert summary["AsyncTeamDAOV2.write"]["write_units"] > 0
+    # The reads it started count towards read_many, rather than being operations of their own
+    assert summary["AsyncTeamSummaryPageDAO.read_many"]["requests"] == 2
+    assert "AsyncTeamSummaryPageDAO.read" not in summary
+
+
+def test_async_requests_are_rate_limited_without_blocking(dynamo_resource, monkeypatch):
+    throttle.configure_table(TABLE_NAME, write_capacity=1.25)  # 1 WCU a second, and a second's worth of burst
+    monkeypatch.setattr("time.sleep", lambda seconds: pytest.fail("Blocked the event loop"))
+    waits = []
+
+    async def sleep(seconds):
+        if seconds:
+            waits.append(seconds)
+
+    monkeypatch.setattr("asyncio.sleep", sleep)
+
+    async def run():
+        players = AsyncPlayerDAOV2(dynamo_resource)
+        for salary in (57500, 555000, 11538462):
+            await players.write("Player", salary, "Phillies")
+
+    asyncio.run(run())
+    assert len(waits) == 2  # The first write was covered by the burst
+
+
+@pytest.fixture
+def moto_dynamodb(monkeypatch):
+    # A real aioboto3 session, talking to moto's DynamoDB server instead of AWS
+    pytest.importorskip("aioboto3")
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    for name, value in [("AWS_ENDPOINT_URL_DYNAMODB", "http://127.0.0.1:%s" % port), ("AWS_ACCESS_KEY_ID", "testing"),
+                        ("AWS_SECRET_ACCESS_KEY", "testing"), ("AWS_DEFAULT_REGION", "us-east-1")]:
+        monkeypatch.setenv(name, value)
+    yield
+    server.stop()
+
+
+def test_get_async_resource(moto_dynamodb):
+    import aioboto3
+
+    async def run():
+        async with get_async_resource(aioboto3.Session()) as dynamo:
+            await dynamo.meta.client.create_table(TableName=TABLE_NAME, **TABLE_SPECS[TABLE_NAME])
+            await AsyncTeamDAOV2(dynamo).write("Phillies", 81)
+            players = AsyncPlayerDAOV2(dynamo)
+            for player in [("Rhys Hoskins", 57500, "Phillies"), ("Bryce Harper", 11538462, "Phillies")]:
+                await players.write(*player)
+            return await AsyncTeamSummaryPageDAO(dynamo).read("Phillies"), await players.get_top_paid("Phillies")
+
+    page, top_paid = asyncio.run(run())
+    assert page["Team"].wins == 81
+    assert [player.player_name for player in page["Players"]] == ["Bryce Harper", "Rhys Hoskins"]
+    assert [player.player_name for player in top_paid] == ["Bryce Harper"]
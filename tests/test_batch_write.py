@@ -0,0 +1,81 @@
+import pytest
+
+from connection import get_resource
+from helpers import batch_write
+from local_dynamodb import LocalDynamoDB, LocalSession
+from multitable.PlayerDAO import PlayerDAO
+from multitable.TeamDAO import TeamDAO
+from provision import TABLE_SPECS
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.SingleTableDAO import PRIMARY_KEY, TABLE_NAME
+from single_table.TeamDAOV2 import TeamDAOV2
+
+
+def players(n, team="Phillies"):
+    return [("Player %s" % i, 500000 + i, team) for i in range(n)]
+
+
+def test_write_many_sends_batches_of_25(session, dynamo):
+    assert PlayerDAOV2(session).write_many(players(60)) == 60
+    assert dynamo.calls['BatchWriteItem'] == 3
+    assert len(PlayerDAOV2(session).get_by_team("Phillies")) == 60
+
+
+def test_write_many_takes_a_generator(session):
+    assert TeamDAOV2(session).write_many(("Team %s" % i, i) for i in range(30)) == 30
+    assert TeamDAOV2(session).read("Team 29").wins == 29
+
+
+def test_write_many_same_key_last_one_wins(session, dynamo):
+    # Players are keyed by team and salary, two on the league minimum would make Dynamo reject the batch
+    assert PlayerDAOV2(session).write_many([("Rhys Hoskins", 555000, "Phillies"), ("Nick Williams", 555000, "Phillies"),
+                                           ("Aaron Nola", 9000000, "Phillies")]) == 3
+    assert dynamo.calls['BatchWriteItem'] == 1
+    assert [player.player_name for player in PlayerDAOV2(session).get_by_team("Phillies")] == ["Nick Williams", "Aaron Nola"]
+
+
+def test_duplicates_dont_shrink_a_batch(session, dynamo):
+    # 26 items with 25 different keys still fit in one batch
+    assert TeamDAOV2(session).write_many([("Team 0", 1)] + [("Team %s" % i, i) for i in range(25)]) == 26
+    assert dynamo.calls['BatchWriteItem'] == 1
+    assert TeamDAOV2(session).read("Team 0").wins == 0
+
+
+def test_multitable_write_many_same_key(session):
+    assert TeamDAO(session).write_many([("Phillies", 80), ("Phillies", 81)]) == 2
+    assert PlayerDAO(session).write_many([("Rhys Hoskins", 555000, "Phillies"), ("Nick Williams", 555000, "Phillies")]) == 2
+    assert TeamDAO(session).read("Phillies")["Wins"] == 81
+    assert [player["PlayerName"] for player in PlayerDAO(session).get_by_team("Phillies")] == ["Nick Williams"]
+
+
+def test_multitable_write_many(session):
+    assert TeamDAO(session).write_many([("Phillies", 81), ("Yankees", 103)]) == 2
+    assert PlayerDAO(session).write_many(players(30)) == 30
+    assert len(PlayerDAO(session).get_by_team("Phillies")) == 30
+
+
+def test_write_many_does_not_print(session, capsys):
+    PlayerDAOV2(session).write_many(players(3))
+    assert capsys.readouterr().out == ""
+
+
+def test_unprocessed_items_are_retried(no_sleep):
+    dynamo = LocalDynamoDB(throttle_rate=0.3, seed=1)
+    LocalSession(dynamo).client('dynamodb').create_table(TableName=TABLE_NAME, **TABLE_SPECS[TABLE_NAME])
+    session = LocalSession(dynamo)
+    chunks = []
+    assert batch_write(get_resource(session).Table(TABLE_NAME), [PlayerDAOV2._to_dynamo_item(*player) for player in players(50)],
+                       PRIMARY_KEY,                        on_written=chunks.append) == 50
+    assert dynamo.calls['BatchWriteItem'] > 2  # Some batches came back partly unprocessed
+    assert [len(chunk) for chunk in chunks] == [25, 25]
+    dynamo.throttle_rate = 0
+    assert len(PlayerDAOV2(session).get_by_team("Phillies")) == 50
+
+
+def test_gives_up_after_max_retries(no_sleep):
+    dynamo = LocalDynamoDB(throttle_rate=1.0)
+    LocalSession(dynamo).client('dynamodb').create_table(TableName=TABLE_NAME, **TABLE_SPECS[TABLE_NAME])
+    table = get_resource(LocalSession(dynamo)).Table(TABLE_NAME)
+    with pytest.raises(RuntimeError):
+        batch_write(table, [PlayerDAOV2._to_dynamo_item(*player) for player in players(3)], PRIMARY_KEY, max_retries=2)
+    assert dynamo.calls['BatchWriteItem'] == 3
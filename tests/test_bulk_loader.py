@@ -0,0 +1,58 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from load import read_players, read_teams
+from local_dynamodb import LocalDynamoDB, LocalSession
+from single_table.BulkLoader import BulkLoader
+from single_table.PlayerDAOV2 import PLAYER_TYPE, PlayerDAOV2
+from single_table.TeamDAOV2 import TEAM_TYPE, TeamDAOV2
+
+
+def league(teams=6, players=30):
+    return ([(TEAM_TYPE, "Team %s" % t, 60 + t) for t in range(teams)] +
+            [(PLAYER_TYPE, "Player %s-%s" % (t, p), 500000 + p, "Team %s" % t) for t in range(teams) for p in range(players)])
+
+
+def test_load_spreads_records_over_workers(session, dynamo):
+    assert BulkLoader(lambda: LocalSession(dynamo), workers=4, queue_size=10).load(iter(league())) == 186
+    assert [team.wins for team in TeamDAOV2(session).read_many(["Team 0", "Team 5"])] == [60, 65]
+    assert len(PlayerDAOV2(session).get_by_team("Team 3")) == 30
+
+
+def test_load_sharded_players_read_back_with_the_same_shards(session, dynamo):
+    BulkLoader(lambda: LocalSession(dynamo), workers=3, shards=4).load(league(teams=2))
+    assert len(PlayerDAOV2(session, shards=4).get_by_team("Team 1")) == 30
+    assert PlayerDAOV2(session).get_by_team("Team 1") == []  # They're not under the plain team name
+
+
+@pytest.mark.parametrize("shards", [1, 4])
+def test_load_repeated_keys_last_one_wins(session, dynamo, tmp_path, shards):
+    # A CSV with two players on the same team and salary: both go to the same worker, which keeps the later one
+    (tmp_path / "players.csv").write_text("".join("Player %s,555000,Team %s\n" % (p, p % 3) for p in range(60)))
+    assert BulkLoader(lambda: LocalSession(dynamo), workers=2, shards=shards).load(read_players(tmp_path / "players.csv")) == 60
+    for t in range(3):
+        assert [player.player_name for player in PlayerDAOV2(session, shards=shards).get_by_team("Team %s" % t)] == [
+            "Player %s" % (57 + t)]
+
+
+def test_a_partition_always_goes_to_the_same_worker():
+    loader = BulkLoader(None, workers=8)
+    assert loader._get_worker("Phillies") == BulkLoader(None, workers=8)._get_worker("Phillies")
+
+
+def test_unknown_record_type(dynamo):
+    with pytest.raises(ValueError):
+        BulkLoader(lambda: LocalSession(dynamo), workers=2).load([("Coach", "Gabe Kapler")])
+
+
+def test_a_failing_worker_surfaces_its_error():
+    dynamo = LocalDynamoDB()  # No tables
+    with pytest.raises(ClientError):
+        BulkLoader(lambda: LocalSession(dynamo), workers=2, queue_size=1).load(league())
+
+
+def test_read_csv(tmp_path):
+    (tmp_path / "teams.csv").write_text("Phillies,81\n")
+    (tmp_path / "players.csv").write_text("Bryce Harper,11538462,Phillies\n")
+    assert list(read_teams(tmp_path / "teams.csv")) == [(TEAM_TYPE, "Phillies", 81)]
+    assert list(read_players(tmp_path / "players.csv")) == [(PLAYER_TYPE, "Bryce Harper", 11538462, "Phillies")]
@@ -0,0 +1,94 @@
+from cache import LRUCache
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.SingleTableDAO import TABLE_NAME
+from single_table.TeamDAOV2 import TeamDAOV2
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+
+
+def test_get_loads_once():
+    cache = LRUCache()
+    loads = []
+    for _ in range(3):
+        assert cache.get("Phillies", "Team", lambda: loads.append(1) or "value") == "value"
+    assert len(loads) == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_misses_are_not_cached():
+    cache = LRUCache()
+    assert cache.get("Phillies", "Team", lambda: None) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire():
+    cache = LRUCache(ttl=0)
+    cache.put("Phillies", "Team", "value")
+    assert cache.lookup("Phillies", "Team") is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache(max_bytes=len(repr("a" * 10)) * 2)
+    cache.put("A", "Team", "a" * 10)
+    cache.put("B", "Team", "b" * 10)
+    cache.lookup("A", "Team")
+    cache.put("C", "Team", "c" * 10)
+    assert cache.lookup("B", "Team") is None
+    assert cache.lookup("A", "Team") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_drops_every_kind_of_the_partition():
+    cache = LRUCache()
+    cache.put("Phillies", "Team", 1)
+    cache.put("Phillies", "Summary", 2)
+    cache.put("Yankees", "Team", 3)
+    cache.invalidate("Phillies")
+    assert cache.lookup("Phillies", "Team") is None and cache.lookup("Phillies", "Summary") is None
+    assert cache.lookup("Yankees", "Team") == 3
+
+
+def test_a_load_that_races_an_invalidation_is_not_cached():
+    # The write (and its invalidate) lands while the read is still loading the old value
+    cache = LRUCache()
+
+    def load():
+        cache.invalidate("Phillies")
+        return "before the write"
+
+    assert cache.get("Phillies", "Team", load) == "before the write"
+    assert cache.lookup("Phillies", "Team") is None
+    assert cache.get("Phillies", "Team", lambda: "after the write") == "after the write"
+    assert cache.lookup("Phillies", "Team") == "after the write"
+
+
+def test_get_many_skips_values_that_raced_an_invalidation():
+    cache = LRUCache()
+
+    def load(partitions):
+        cache.invalidate("Phillies")
+        return ["old %s" % partition for partition in partitions]
+
+    assert cache.get_many(["Phillies", "Yankees"], "Team", load) == ["old Phillies", "old Yankees"]
+    assert cache.lookup("Phillies", "Team") is None
+    assert cache.lookup("Yankees", "Team") == "old Yankees"
+
+
+def test_a_load_that_races_a_clear_is_not_cached():
+    cache = LRUCache()
+    assert cache.get("Phillies", "Team", lambda: cache.clear() or "value") == "value"
+    assert cache.lookup("Phillies", "Team") is None
+
+
+def test_writes_invalidate_the_summary_page(session, dynamo):
+    cache = LRUCache()
+    TeamDAOV2(session, cache=cache).write("Phillies", 81)
+    PlayerDAOV2(session, cache=cache).write("Bryce Harper", 11538462, "Phillies")
+    summary_table = TeamSummaryPageDAO(session, cache=cache)
+    assert len(summary_table.read("Phillies")["Players"]) == 1
+    queries = dynamo.calls['Query']
+    summary_table.read("Phillies")
+    assert dynamo.calls['Query'] == queries  # Cached
+
+    PlayerDAOV2(session, cache=cache).write("Rhys Hoskins", 57500, "Phillies")
+    assert cache.lookup((TABLE_NAME, "Phillies"), "Summary") is None
+    assert len(summary_table.read("Phillies")["Players"]) == 2
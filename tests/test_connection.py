@@ -0,0 +1,34 @@
+import threading
+
+import connection
+from connection import get_client, get_resource, make_session
+from local_dynamodb import LocalSession
+
+
+def test_one_resource_per_session(session, dynamo):
+    assert get_resource(session) is get_resource(session)
+    assert get_resource(session) is not get_resource(LocalSession(dynamo))
+    assert get_client(session) is get_client(session)
+
+
+def test_threads_get_their_own_resource(session):
+    resources = []
+    thread = threading.Thread(target=lambda: resources.append(get_resource(session)))
+    thread.start()
+    thread.join()
+    assert resources[0] is not get_resource(session)
+
+
+def test_configure_keeps_the_other_settings(monkeypatch):
+    monkeypatch.setattr(connection, "_config_kwargs", dict(connection._config_kwargs))
+    monkeypatch.setattr(connection, "_config", connection._config)
+    connection.configure(max_pool_connections=7)
+    assert connection._config.max_pool_connections == 7
+    assert connection._config.tcp_keepalive  # The other settings are kept
+
+
+def test_make_session_uses_the_environment(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "AKIDEXAMPLE")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "secret")
+    credentials = make_session().get_credentials()
+    assert (credentials.access_key, credentials.secret_key) == ("AKIDEXAMPLE", "secret")
@@ -0,0 +1,64 @@
+import gzip
+import json
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+from export import TableExporter, _plain_number
+from local_dynamodb import LocalSession
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME, TEAM_NAME
+from single_table.TeamDAOV2 import TEAM_SORT_KEY, WINS, TeamDAOV2
+
+
+@pytest.fixture
+def league(session):
+    TeamDAOV2(session).write_many([("Team %s" % t, 60 + t) for t in range(10)])
+    PlayerDAOV2(session).write_many([("Player %s" % p, 500000 + p, "Team %s" % (p % 10)) for p in range(50)])
+    return session
+
+
+def read_ndjson(path):
+    with gzip.open(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_export_every_item(league, dynamo, tmp_path):
+    path = str(tmp_path / "league.ndjson.gz")
+    assert TableExporter(lambda: LocalSession(dynamo), segments=4).export(TABLE_NAME, path) == 60
+    records = read_ndjson(path)
+    assert len(records) == 60
+    assert {"type": "Player", "team": "Team 3", "wins": None, "player_name": "Player 13", "salary": 500013} in records
+    assert [path.name for path in tmp_path.iterdir()] == ["league.ndjson.gz"]
+
+
+def test_failed_segment_leaves_no_partial_file(league, dynamo, tmp_path, monkeypatch):
+    path = tmp_path / "league.ndjson.gz"
+    path.write_text("the last good export")
+    scan = dynamo.scan
+
+    def failing_scan(**kwargs):
+        if kwargs.get('Segment') == 2:
+            raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': "Segment failed"}}, 'Scan')
+        return scan(**kwargs)
+    monkeypatch.setattr(dynamo, "scan", failing_scan)
+
+    with pytest.raises(ClientError):
+        TableExporter(lambda: LocalSession(dynamo), segments=4).export(TABLE_NAME, str(path))
+    assert path.read_text() == "the last good export"
+    assert [path.name for path in tmp_path.iterdir()] == ["league.ndjson.gz"]  # No temporary file either
+
+
+def test_plain_number():
+    assert _plain_number(Decimal("81")) == 81 and type(_plain_number(Decimal("81"))) is int
+    assert _plain_number(Decimal("0.5")) == 0.5
+    assert _plain_number("Phillies") == "Phillies"
+
+
+def test_parquet_takes_fractional_numbers(session, dynamo, tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    session.resource('dynamodb').Table(TABLE_NAME).put_item(Item={TEAM_NAME: "Phillies", SORT_KEY: TEAM_SORT_KEY, WINS: Decimal("80.5")})
+    path = str(tmp_path / "league.parquet")
+    TableExporter(lambda: LocalSession(dynamo), segments=2).export(TABLE_NAME, path, "parquet")
+    assert pyarrow_parquet.read_table(path).to_pylist()[0]["wins"] == 80.5
@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+import pytest
+
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.TeamDAOV2 import TeamDAOV2
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+from wire import decode_number
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("81", 81),
+    ("-7", -7),
+    ("12345678901234567890", 12345678901234567890),
+    ("0.5", 0.5),
+    ("0.1000000000000000000001", Decimal("0.1000000000000000000001")),  # Would lose digits as a float
+    ("1E+3", Decimal("1E+3")),
+])
+def test_decode_number(value, expected):
+    number = decode_number(value)
+    assert number == expected and type(number) is type(expected)
+
+
+@pytest.fixture
+def league(session):
+    TeamDAOV2(session).write_many([("Phillies", 80), ("Yankees", 95)])
+    PlayerDAOV2(session).write_many([("Bryce Harper", 11538462, "Phillies"), ("Aaron Nola", 9000000, "Phillies")])
+    return session
+
+
+def test_fast_path_reads_the_same_records(league, dynamo):
+    assert TeamDAOV2(league, fast_path=True).read_many(["Phillies", "Mets"]) == TeamDAOV2(league).read_many(["Phillies", "Mets"])
+    assert PlayerDAOV2(league, fast_path=True).get_by_team("Phillies") == PlayerDAOV2(league).get_by_team("Phillies")
+    assert TeamSummaryPageDAO(league, fast_path=True).read("Phillies") == TeamSummaryPageDAO(league).read("Phillies")
+
+
+def test_fast_path_numbers_are_ints(league):
+    team = TeamDAOV2(league, fast_path=True).read("Phillies")
+    players = PlayerDAOV2(league, fast_path=True).get_by_team("Phillies")
+    assert type(team.wins) is int
+    assert [type(player.salary) for player in players] == [int, int]
+    assert type(TeamDAOV2(league).read("Phillies").wins) is Decimal  # What the resource gives
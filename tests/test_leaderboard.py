@@ -0,0 +1,43 @@
+import pytest
+
+from multitable.PlayerDAO import PLAYER_NAME, PlayerDAO
+from single_table.PlayerDAOV2 import LEADERBOARD_SHARDS, PlayerDAOV2
+from single_table.TeamDAOV2 import TeamDAOV2
+
+PLAYERS = [("Player %s" % p, 500000 + 1000 * p, ("Phillies", "Mets", "Braves")[p % 3]) for p in range(30)]
+
+
+@pytest.fixture
+def league(session, dynamo):
+    TeamDAOV2(session, summary=True).write_many([("Phillies", 80), ("Mets", 75), ("Braves", 90)])
+    PlayerDAOV2(session, shards={"Phillies": 3}).write_many(PLAYERS)
+    PlayerDAO(session).write_many(PLAYERS)
+    dynamo.calls.clear()
+    return session
+
+
+def top(n, team_name=None):
+    return sorted([player for player in PLAYERS if team_name in (None, player[2])], key=lambda player: -player[1])[:n]
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+def test_league_leaderboard(league, dynamo, fast_path):
+    players = PlayerDAOV2(league, fast_path=fast_path).get_by_salary(n=5)
+    assert [(player.player_name, player.salary, player.team) for player in players] == top(5)
+    assert dynamo.calls['Query'] == LEADERBOARD_SHARDS  # n items from each leaderboard partition, no scan
+
+
+@pytest.mark.parametrize("team_name", ["Phillies", "Mets"])
+def test_team_leaderboard(league, team_name):
+    players = PlayerDAOV2(league, shards={"Phillies": 3}).get_by_salary(team_name, n=3)
+    assert [(player.player_name, player.salary, player.team) for player in players] == top(3, team_name)
+
+
+def test_team_items_stay_out_of_the_indexes(league):
+    # The team items (with their summaries) have no Salary or League, so the sparse indexes only hold players
+    assert len(PlayerDAOV2(league).get_by_salary(n=100)) == len(PLAYERS)
+
+
+def test_multitable_leaderboard(league):
+    assert [player[PLAYER_NAME] for player in PlayerDAO(league).get_by_salary(n=5)] == [player[0] for player in top(5)]
+    assert [player[PLAYER_NAME] for player in PlayerDAO(league).get_by_salary("Mets", n=2)] == [player[0] for player in top(2, "Mets")]
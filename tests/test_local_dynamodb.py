@@ -0,0 +1,82 @@
+import json
+from argparse import Namespace
+
+import pytest
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from benchmarks.run import BENCHMARKS
+from local_dynamodb import LocalDynamoDB, LocalSession
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME, TEAM_NAME
+
+
+@pytest.fixture
+def table(session):
+    table = session.resource('dynamodb').Table(TABLE_NAME)
+    for sort_key in ("PLAYER#1", "PLAYER#2", "TEAM#"):
+        table.put_item(Item={TEAM_NAME: "Phillies", SORT_KEY: sort_key})
+    return table
+
+
+def test_query_begins_with(table):
+    items = table.query(KeyConditionExpression=Key(TEAM_NAME).eq("Phillies") & Key(SORT_KEY).begins_with("PLAYER#"))['Items']
+    assert [item[SORT_KEY] for item in items] == ["PLAYER#1", "PLAYER#2"]
+
+
+def test_query_pages(table):
+    page = table.query(KeyConditionExpression=Key(TEAM_NAME).eq("Phillies"), Limit=2)
+    assert len(page['Items']) == 2
+    rest = table.query(KeyConditionExpression=Key(TEAM_NAME).eq("Phillies"), ExclusiveStartKey=page['LastEvaluatedKey'])
+    assert [item[SORT_KEY] for item in rest['Items']] == ["TEAM#"]
+    assert 'LastEvaluatedKey' not in rest
+
+
+@pytest.mark.parametrize("query", [
+    dict(KeyConditionExpression=Key(TEAM_NAME).eq("Phillies"), Limit=0),
+    dict(KeyConditionExpression=Key(TEAM_NAME).eq("Phillies") & Key(SORT_KEY).between("PLAYER#2", "PLAYER#1")),
+])
+def test_query_rejects_what_dynamo_rejects(table, query):
+    with pytest.raises(ClientError) as e:
+        table.query(**query)
+    assert e.value.response['Error']['Code'] == 'ValidationException'
+
+
+def test_batch_write_rejects_duplicate_keys(table, dynamo):
+    item = {TEAM_NAME: "Phillies", SORT_KEY: "PLAYER#3"}
+    with pytest.raises(ClientError) as e:
+        table.meta.client.batch_write_item(RequestItems={TABLE_NAME: [{'PutRequest': {'Item': item}}] * 2})
+    assert e.value.response['Error']['Code'] == 'ValidationException'
+    assert 'Item' not in table.get_item(Key=item)  # Nothing in the batch was written
+
+
+def test_conditional_put(table):
+    with pytest.raises(ClientError) as e:
+        table.put_item(Item={TEAM_NAME: "Phillies", SORT_KEY: "TEAM#"}, ConditionExpression="attribute_not_exists(#sk)",
+                       ExpressionAttributeNames={'#sk': SORT_KEY})
+    assert e.value.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+def test_deleted_table_is_not_found(dynamo, session):
+    session.client('dynamodb').delete_table(TableName=TABLE_NAME)
+    with pytest.raises(ClientError) as e:
+        session.resource('dynamodb').Table(TABLE_NAME).get_item(Key={TEAM_NAME: "Phillies", SORT_KEY: "TEAM#"})
+    assert e.value.response['Error']['Code'] == 'ResourceNotFoundException'
+
+
+def test_throttling_is_injected():
+    dynamo = LocalDynamoDB(throttle_rate=1.0)
+    client = LocalSession(dynamo).client('dynamodb')
+    client.create_table(TableName="t", KeySchema=[{'AttributeName': 'k', 'KeyType': 'HASH'}],
+                        AttributeDefinitions=[{'AttributeName': 'k', 'AttributeType': 'S'}])
+    with pytest.raises(ClientError) as e:
+        client.put_item(TableName="t", Item={'k': {'S': "a"}})
+    assert e.value.response['Error']['Code'] == 'ProvisionedThroughputExceededException'
+
+
+def test_benchmarks_report_json(capsys):
+    # Small enough to run with the tests, the numbers themselves aren't checked
+    args = Namespace(teams=3, players=4, latency=0.0, seed=0)
+    results = {name: benchmark(args) for name, benchmark in BENCHMARKS.items()}
+    json.dumps(results)
+    assert results["writes"]["write"]["requests"] == 12
+    assert results["writes"]["write_many"]["requests"] == 1
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+import metrics
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.SingleTableDAO import TABLE_NAME
+from single_table.TeamDAOV2 import TeamDAOV2
+
+
+@pytest.fixture
+def sink():
+    sink = metrics.InMemorySink()
+    metrics.set_sink(sink)
+    return sink
+
+
+def test_operations_are_recorded(session, sink):
+    teams = TeamDAOV2(session)
+    teams.write_many([("Phillies", 80), ("Mets", 75)])
+    teams.read("Phillies")
+    summary = sink.summary()
+    assert summary["TeamDAOV2.write_many"]["items"] == 2
+    assert summary["TeamDAOV2.write_many"]["write_units"] > 0
+    assert summary["TeamDAOV2.read"]["requests"] == 1
+    assert summary["TeamDAOV2.read"]["table"] == TABLE_NAME
+
+
+def test_shard_queries_count_towards_the_operation(session, sink):
+    players = PlayerDAOV2(session, shards=4)
+    players.write_many([("Player %s" % i, 500000 + i, "Phillies") for i in range(20)])
+    assert len(players.get_by_team("Phillies")) == 20
+    assert sink.summary()["PlayerDAOV2.get_by_team"]["requests"] == 4  # One query per shard, on the executor threads
+
+
+def test_record_adds_are_thread_safe():
+    record = metrics.OperationRecord("TeamDAOV2", "read", TABLE_NAME)
+
+    def add():
+        for _ in range(10000):
+            record.add(requests=1, read_units=0.5)
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert record.requests == 80000 and record.read_units == 40000
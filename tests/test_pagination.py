@@ -0,0 +1,43 @@
+from itertools import islice
+
+import pytest
+
+from local_dynamodb import LocalDynamoDB, LocalSession
+from multitable.PlayerDAO import PlayerDAO
+from provision import TABLE_SPECS
+from single_table.PlayerDAOV2 import PlayerDAOV2
+
+
+@pytest.fixture
+def small_pages():
+    # Pages of ~1KB instead of 1MB, so a team of 100 players takes several
+    dynamo = LocalDynamoDB(page_bytes=1024)
+    client = LocalSession(dynamo).client('dynamodb')
+    for table_name, spec in TABLE_SPECS.items():
+        client.create_table(TableName=table_name, **spec)
+    session = LocalSession(dynamo)
+    PlayerDAOV2(session).write_many(("Player %s" % i, 500000 + i, "Phillies") for i in range(100))
+    PlayerDAO(session).write_many(("Player %s" % i, 500000 + i, "Phillies") for i in range(100))
+    dynamo.calls.clear()
+    return dynamo, session
+
+
+@pytest.mark.parametrize("dao_class", [PlayerDAO, PlayerDAOV2])
+def test_get_by_team_follows_every_page(small_pages, dao_class):
+    dynamo, session = small_pages
+    assert len(dao_class(session).get_by_team("Phillies")) == 100
+    assert dynamo.calls['Query'] > 1
+
+
+def test_iter_by_team_is_lazy(small_pages):
+    dynamo, session = small_pages
+    players = PlayerDAOV2(session).iter_by_team("Phillies", page_size=10)
+    assert dynamo.calls['Query'] == 0
+    assert [player.player_name for player in islice(players, 15)][-1] == "Player 14"
+    assert dynamo.calls['Query'] == 2
+
+
+def test_limit_stops_after_n_items(small_pages):
+    dynamo, session = small_pages
+    assert len(list(PlayerDAOV2(session).iter_by_team("Phillies", page_size=7, limit=20))) == 20
+    assert dynamo.calls['Query'] == 3
@@ -0,0 +1,30 @@
+from local_dynamodb import LocalDynamoDB, LocalSession
+from provision import TABLE_SPECS, provision, provision_table
+from single_table.PlayerDAOV2 import LEAGUE_SALARY_INDEX, PlayerDAOV2
+from single_table.SingleTableDAO import TABLE_NAME
+
+
+def test_creates_every_table(no_sleep):
+    client = LocalSession(LocalDynamoDB()).client('dynamodb')
+    assert provision(client) == {table_name: ["created"] for table_name in TABLE_SPECS}
+    assert sorted(client.list_tables()['TableNames']) == sorted(TABLE_SPECS)
+
+
+def test_existing_tables_keep_their_data(session, no_sleep):
+    PlayerDAOV2(session).write("Bryce Harper", 11538462, "Phillies")
+    assert provision(session.client('dynamodb')) == {table_name: [] for table_name in TABLE_SPECS}
+    assert len(PlayerDAOV2(session).get_by_team("Phillies")) == 1
+
+
+def test_adds_missing_indexes(session, dynamo, no_sleep):
+    client = session.client('dynamodb')
+    client.update_table(TableName=TABLE_NAME, GlobalSecondaryIndexUpdates=[{'Delete': {'IndexName': LEAGUE_SALARY_INDEX}}])
+    assert provision_table(client, TABLE_NAME) == ["index %s" % LEAGUE_SALARY_INDEX]
+    indexes = client.describe_table(TableName=TABLE_NAME)['Table']['GlobalSecondaryIndexes']
+    assert LEAGUE_SALARY_INDEX in [index['IndexName'] for index in indexes]
+
+
+def test_reports_different_keys(session, no_sleep, capsys):
+    spec = dict(TABLE_SPECS[TABLE_NAME], KeySchema=[{'AttributeName': "Other", 'KeyType': 'HASH'}])
+    assert provision_table(session.client('dynamodb'), TABLE_NAME, spec) == ["keys differ"]
+    assert "Keys can't be changed" in capsys.readouterr().out
@@ -0,0 +1,71 @@
+import pytest
+
+from cache import LRUCache
+from multitable.PlayerDAO import PlayerDAO
+from multitable.TeamDAO import TEAM_TABLE_NAME, TeamDAO
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.SingleTableDAO import TABLE_NAME
+from single_table.TeamDAOV2 import TeamDAOV2
+
+
+@pytest.fixture
+def league(session):
+    teams = [("Phillies", 81), ("Yankees", 103), ("Dodgers", 106)]
+    TeamDAO(session).write_many(teams)
+    TeamDAOV2(session).write_many(teams)
+    return session
+
+
+def test_read_many_keeps_the_order_asked_for(league, dynamo):
+    teams = TeamDAOV2(league).read_many(["Dodgers", "Mets", "Phillies", "Dodgers"])
+    assert [team and team.wins for team in teams] == [106, None, 81, 106]
+    assert dynamo.calls['BatchGetItem'] == 1
+
+
+def test_read_many_over_100_keys(session, dynamo):
+    TeamDAOV2(session).write_many(("Team %s" % i, i) for i in range(150))
+    teams = TeamDAOV2(session).read_many(["Team %s" % i for i in range(150)])
+    assert [team.wins for team in teams] == list(range(150))
+    assert dynamo.calls['BatchGetItem'] == 2
+
+
+def test_multitable_read_many(league):
+    assert [team and team["Wins"] for team in TeamDAO(league).read_many(["Yankees", "Mets"])] == [103, None]
+
+
+def test_player_read_many(session):
+    PlayerDAOV2(session).write_many([("Bryce Harper", 11538462, "Phillies"), ("Rhys Hoskins", 57500, "Phillies")])
+    players = PlayerDAOV2(session).read_many([("Phillies", 57500), ("Phillies", 1), ("Phillies", 11538462)])
+    assert [player and player.player_name for player in players] == ["Rhys Hoskins", None, "Bryce Harper"]
+
+
+@pytest.mark.parametrize("dao_class", [TeamDAO, TeamDAOV2])
+def test_read_many_through_the_cache(league, dynamo, dao_class):
+    dao = dao_class(league, cache=LRUCache())
+    dao.read_many(["Phillies", "Yankees"])
+    dao.read_many(["Phillies", "Yankees", "Dodgers"])
+    assert dynamo.calls['BatchGetItem'] == 2  # The second only asked for the Dodgers
+    assert dao.cache.stats()["hits"] == 2
+
+
+@pytest.mark.parametrize("dao_class, table_name", [(TeamDAO, TEAM_TABLE_NAME), (TeamDAOV2, TABLE_NAME)])
+@pytest.mark.parametrize("cached", [False, True])
+def test_read_many_errors_give_one_none_per_team(league, dynamo, capsys, dao_class, table_name, cached):
+    dao = dao_class(league, cache=LRUCache() if cached else None)
+    del dynamo.tables[table_name]
+    assert dao.read_many(["Phillies", "Yankees"]) == [None, None]
+    assert "not found" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("dao_class, table_name", [(PlayerDAO, "Players-abc123"), (PlayerDAOV2, TABLE_NAME)])
+def test_player_read_many_errors_give_one_none_per_player(session, dynamo, dao_class, table_name):
+    dao = dao_class(session)
+    del dynamo.tables[table_name]
+    assert dao.read_many([("Phillies", 57500)]) == [None]
+
+
+def test_get_many_treats_a_failed_load_as_misses():
+    cache = LRUCache()
+    cache.put("Phillies", "Team", 81)
+    assert cache.get_many(["Phillies", "Yankees"], "Team", lambda partitions: None) == [81, None]
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,38 @@
+import json
+import pickle
+
+import pytest
+
+from single_table.PlayerDAOV2 import PLAYER_NAME, SALARY, PlayerDAOV2, PlayerRecord
+from single_table.SingleTableDAO import TEAM_NAME
+from single_table.TeamDAOV2 import WINS, TeamDAOV2, TeamRecord
+
+
+def test_records_are_read_only_mappings():
+    player = PlayerRecord("Bryce Harper", "Phillies", 11538462)
+    assert player.salary == player[SALARY] == 11538462
+    assert PLAYER_NAME in player and "Salary" in player.keys()
+    assert player.get("Nickname", "none") == "none"
+    assert player == {PLAYER_NAME: "Bryce Harper", TEAM_NAME: "Phillies", SALARY: 11538462}
+    with pytest.raises(KeyError):
+        player["Nickname"]
+    with pytest.raises(AttributeError):
+        player.salary = 1
+
+
+def test_records_serialize():
+    team = TeamRecord("Phillies", 80)
+    assert json.loads(json.dumps(dict(team))) == {TEAM_NAME: "Phillies", WINS: 80}
+    assert pickle.loads(pickle.dumps(team)) == team
+    assert hash(team) == hash(TeamRecord("Phillies", 80))
+    assert repr(team) == "TeamRecord(team='Phillies', wins=80)"
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+def test_daos_return_records(session, fast_path):
+    teams, players = TeamDAOV2(session, fast_path=fast_path), PlayerDAOV2(session, fast_path=fast_path)
+    teams.write("Phillies", 80)
+    players.write("Bryce Harper", 11538462, "Phillies")
+    assert dict(teams.read("Phillies")) == {TEAM_NAME: "Phillies", WINS: 80}
+    assert [dict(player) for player in players.get_by_team("Phillies")] == \
+        [{PLAYER_NAME: "Bryce Harper", TEAM_NAME: "Phillies", SALARY: 11538462}]
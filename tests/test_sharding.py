@@ -0,0 +1,51 @@
+from itertools import islice
+
+import pytest
+
+import helpers
+from single_table.PlayerDAOV2 import PlayerDAOV2, PlayerRecord
+from single_table.TeamDAOV2 import TeamDAOV2, TeamRecord
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+
+SHARDS = 4
+
+
+@pytest.fixture
+def sharded_team(session, dynamo):
+    TeamDAOV2(session).write("Phillies", 80)
+    PlayerDAOV2(session, shards=SHARDS).write_many(("Player %s" % i, 500000 + i, "Phillies") for i in range(100))
+    dynamo.calls.clear()
+    return session
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+def test_shards_merge_in_salary_order(sharded_team, fast_path):
+    players = PlayerDAOV2(sharded_team, fast_path=fast_path, shards=SHARDS).get_by_team("Phillies")
+    assert [player.salary for player in players] == list(range(500000, 500100))
+
+
+def test_later_pages_are_only_read_when_used(sharded_team, dynamo):
+    players = PlayerDAOV2(sharded_team, shards=SHARDS).iter_by_team("Phillies", page_size=5)
+    assert [player.player_name for player in islice(players, 3)] == ["Player 0", "Player 1", "Player 2"]
+    assert dynamo.calls['Query'] == SHARDS  # The first page of each shard, not the whole team
+
+
+def test_limit_reads_n_per_shard(sharded_team, dynamo):
+    top = PlayerDAOV2(sharded_team, shards=SHARDS).get_top_paid("Phillies", n=3)
+    assert [player.salary for player in top] == [500099, 500098, 500097]
+    assert dynamo.calls['Query'] == SHARDS
+
+
+def test_summary_page_of_a_sharded_team(sharded_team, dynamo):
+    records = list(islice(TeamSummaryPageDAO(sharded_team, shards=SHARDS).iter_by_team("Phillies", page_size=5), 3))
+    assert records[0] == TeamRecord("Phillies", 80)
+    assert records[1:] == [PlayerRecord("Player 99", "Phillies", 500099), PlayerRecord("Player 98", "Phillies", 500098)]
+    assert dynamo.calls['Query'] == SHARDS + 1  # The team's own partition and the shards
+    assert helpers.get_executor(1)._max_workers >= SHARDS + 1  # Every partition gets a thread
+
+
+def test_daos_share_one_executor(sharded_team):
+    executor = helpers.get_executor(SHARDS)
+    for _ in range(3):
+        PlayerDAOV2(sharded_team, shards=SHARDS).get_by_team("Phillies")
+    assert helpers.get_executor(1) is executor  # No pool per DAO, and no new one while it is big enough
@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+import pytest
+
+from single_table.PlayerDAOV2 import PlayerDAOV2
+
+
+@pytest.fixture
+def phillies(session):
+    players = PlayerDAOV2(session)
+    players.write_many([("Rhys Hoskins", 57500, "Phillies"), ("Nick Williams", 555000, "Phillies"),
+                        ("Bryce Harper", 11538462, "Phillies")])
+    return players
+
+
+def test_sort_keys_sort_like_the_salaries():
+    salaries = [57500, 555000, 11538462, 9, 0]
+    assert sorted(salaries, key=PlayerDAOV2._get_sort_key) == sorted(salaries)
+
+
+def test_get_top_paid(phillies):
+    assert [player.player_name for player in phillies.get_top_paid("Phillies", 2)] == ["Bryce Harper", "Nick Williams"]
+
+
+def test_get_salary_range_is_inclusive(phillies):
+    assert [player.salary for player in phillies.get_salary_range("Phillies", 57500, 555000)] == [57500, 555000]
+
+
+def test_fractional_range_bounds_are_rounded_inwards(phillies):
+    assert [player.salary for player in phillies.get_salary_range("Phillies", 57499.5, 555000.5)] == [57500, 555000]
+    assert phillies.get_salary_range("Phillies", 57500.5, 554999.9) == []
+
+
+def test_get_top_paid_none(phillies, dynamo):
+    dynamo.calls.clear()
+    assert phillies.get_top_paid("Phillies", 0) == []
+    assert dynamo.calls['Query'] == 0
+
+
+@pytest.mark.parametrize("low, high, salaries", [
+    (-1, 60000, [57500]),
+    (555000, float('inf'), [555000, 11538462]),
+    (float('-inf'), float('inf'), [57500, 555000, 11538462]),
+    (57500.2, 57500.8, []),  # Rounds to 57501..57500
+    (600000, 500000, []),
+    (10 ** 12, float('inf'), []),
+])
+def test_salary_range_bounds_are_clamped(phillies, low, high, salaries):
+    assert [player.salary for player in phillies.get_salary_range("Phillies", low, high)] == salaries
+
+
+@pytest.mark.parametrize("salary", [57500, Decimal("57500"), 57500.0])
+def test_whole_salaries_are_accepted(salary):
+    assert PlayerDAOV2._get_sort_key(salary) == "PLAYER#000000057500"
+
+
+@pytest.mark.parametrize("salary", [57500.5, Decimal("57500.5"), "57500", True, -1, 10 ** 12])
+def test_other_salaries_are_rejected(salary):
+    with pytest.raises(ValueError):
+        PlayerDAOV2._get_sort_key(salary)
+
+
+def test_writing_a_fractional_salary_fails(session):
+    with pytest.raises(ValueError):
+        PlayerDAOV2(session).write("Rhys Hoskins", 57500.5, "Phillies")
@@ -0,0 +1,75 @@
+import pytest
+
+from single_table.PlayerDAOV2 import PlayerDAOV2, PlayerRecord
+from single_table.SingleTableDAO import SORT_KEY, TABLE_NAME
+from single_table.TeamDAOV2 import TeamDAOV2, TeamRecord
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+
+
+def read_summary(session, team_name, fast_path=False):
+    return TeamSummaryPageDAO(session, fast_path=fast_path, summary=True).read(team_name)
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+def test_summary_matches_the_partition(session, fast_path):
+    TeamDAOV2(session, summary=True).write("Phillies", 80)
+    PlayerDAOV2(session, summary=True).write_many([("Bryce Harper", 11538462, "Phillies"), ("Aaron Nola", 9000000, "Phillies")])
+    summary = read_summary(session, "Phillies", fast_path)
+    assert summary["Team"] == TeamRecord("Phillies", 80)
+    assert summary["Players"] == [PlayerRecord("Bryce Harper", "Phillies", 11538462), PlayerRecord("Aaron Nola", "Phillies", 9000000)]
+    assert summary["PlayerCount"] == 2 and summary["Payroll"] == 20538462
+    assert summary["TopEarner"] == summary["Players"][0]
+
+
+def test_existing_players_are_retried_in_one_transaction(session, dynamo):
+    TeamDAOV2(session, summary=True).write("Phillies", 80)
+    players = PlayerDAOV2(session, summary=True)
+    players.write("Bryce Harper", 11538462, "Phillies")
+    dynamo.calls.clear()
+    players.write_many([("Harper", 11538462, "Phillies"), ("Aaron Nola", 9000000, "Phillies")])
+    assert dynamo.calls['TransactWriteItems'] == 2  # Cancelled once, then the same chunk with Harper as existing
+    summary = read_summary(session, "Phillies")
+    assert [player.player_name for player in summary["Players"]] == ["Harper", "Aaron Nola"]
+    assert summary["PlayerCount"] == 2 and summary["Payroll"] == 20538462
+
+
+def test_existing_player_of_a_team_without_a_summary(session, dynamo):
+    # The player is already there and the team has no summary to add to: both are fixed before the one retry
+    PlayerDAOV2(session).write("Bryce Harper", 11538462, "Phillies")
+    dynamo.calls.clear()
+    PlayerDAOV2(session, summary=True).write_many([("Bryce Harper", 11538462, "Phillies"), ("Aaron Nola", 9000000, "Phillies")])
+    assert dynamo.calls['TransactWriteItems'] == 2
+    summary = read_summary(session, "Phillies")
+    assert len(summary["Players"]) == 2 and summary["TopEarner"].player_name == "Bryce Harper"
+    assert summary["PlayerCount"] == 2 and summary["Payroll"] == 20538462  # Harper came before the summary, still counted
+
+
+@pytest.mark.parametrize("shards", [1, 4])
+def test_summary_is_started_from_the_partition(session, shards):
+    PlayerDAOV2(session, shards=shards).write_many([("Bryce Harper", 11538462, "Phillies"), ("Rhys Hoskins", 57500, "Phillies")])
+    PlayerDAOV2(session, shards=shards, summary=True).write("Aaron Nola", 9000000, "Phillies")
+    summary = read_summary(session, "Phillies")
+    assert [player.player_name for player in summary["Players"]] == ["Bryce Harper", "Aaron Nola", "Rhys Hoskins"]
+    assert summary["PlayerCount"] == 3 and summary["Payroll"] == 20595962
+    TeamSummaryPageDAO(session, shards=shards).rebuild("Phillies")
+    assert read_summary(session, "Phillies") == summary  # Nothing for a rebuild to fix
+
+
+def test_players_before_their_team_start_a_summary(session):
+    PlayerDAOV2(session, summary=True).write("Bryce Harper", 11538462, "Phillies")
+    TeamDAOV2(session, summary=True).write("Phillies", 80)
+    summary = read_summary(session, "Phillies")
+    assert summary["Team"] == TeamRecord("Phillies", 80)
+    assert summary["PlayerCount"] == 1 and summary["Payroll"] == 11538462
+
+
+def test_gives_up_after_the_attempts(session, monkeypatch):
+    TeamDAOV2(session, summary=True).write("Phillies", 80)
+    players = PlayerDAOV2(session, summary=True)
+    players.write("Bryce Harper", 11538462, "Phillies")
+    # A player deleted and recreated behind our back every time flips between new and existing forever
+    monkeypatch.setattr(PlayerDAOV2, "_put_action", staticmethod(lambda item, new: {'Put': {
+        'TableName': TABLE_NAME, 'Item': item, 'ConditionExpression': 'attribute_not_exists(#sk)',
+        'ExpressionAttributeNames': {'#sk': SORT_KEY}}}))
+    with pytest.raises(Exception, match="ConditionalCheckFailed"):
+        players.write("Bryce Harper", 11538462, "Phillies")
@@ -0,0 +1,68 @@
+import pytest
+
+import throttle
+from local_dynamodb import LocalDynamoDB, LocalSession
+from provision import TABLE_SPECS
+from single_table.PlayerDAOV2 import PlayerDAOV2
+from single_table.SingleTableDAO import TABLE_NAME
+from single_table.TeamDAOV2 import TeamDAOV2
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    return sleeps
+
+
+def test_limiter_halves_on_throttle_and_recovers():
+    limiter = throttle.AdaptiveRateLimiter(100)
+    limiter.on_throttle()
+    assert limiter.rate == 50 and limiter.throttles == 1
+    limiter.on_success()
+    assert limiter.rate == 52
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 100
+
+
+def test_configure_table_applies_to_existing_daos(session, sleeps):
+    teams = TeamDAOV2(session)
+    throttle.configure_table(TABLE_NAME, write_capacity=1)
+    for team in ("Phillies", "Mets", "Braves"):
+        teams.write(team, 80)
+    assert sleeps  # A 0.8 WCU bucket can't pay for three writes in a row
+
+
+def test_throttled_requests_are_retried(sleeps):
+    dynamo = LocalDynamoDB(throttle_rate=0.5, seed=3)
+    client = LocalSession(dynamo).client('dynamodb')
+    client.create_table(TableName=TABLE_NAME, **TABLE_SPECS[TABLE_NAME])
+    throttle.configure_table(TABLE_NAME, read_capacity=1000, write_capacity=1000)
+    teams = TeamDAOV2(LocalSession(dynamo))
+    for team in range(10):
+        teams.write("Team %s" % team, 80)
+    dynamo.throttle_rate = 0
+    assert len([team for team in teams.read_many(["Team %s" % team for team in range(10)]) if team]) == 10
+    write_limiter = throttle.get_limiters(TABLE_NAME)[1]
+    assert 0 < write_limiter.throttles == dynamo.calls['PutItem'] - 10
+
+
+@pytest.mark.parametrize("limited", [False, True])
+def test_partial_batches_are_backed_off_once(monkeypatch, sleeps, limited):
+    dynamo = LocalDynamoDB(throttle_rate=0.3, seed=1)
+    client = LocalSession(dynamo).client('dynamodb')
+    client.create_table(TableName=TABLE_NAME, **TABLE_SPECS[TABLE_NAME])
+    if limited:
+        throttle.configure_table(TABLE_NAME, write_capacity=100)
+    backoffs = []
+    monkeypatch.setattr("helpers.decorrelated_jitter", lambda delay: backoffs.append(delay) or 0)
+    PlayerDAOV2(LocalSession(dynamo)).write_many([("Player %s" % i, 500000 + i, "Phillies") for i in range(50)])
+    resends = dynamo.calls['BatchWriteItem'] - 2  # 50 players are two batches
+    assert resends > 0
+    if limited:
+        # The limiter makes the resend wait for the bucket, batch_write doesn't back off on top of it
+        assert throttle.get_limiters(TABLE_NAME)[1].throttles == resends
+        assert backoffs == []
+    else:
+        assert len(backoffs) == resends
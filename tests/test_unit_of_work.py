@@ -0,0 +1,110 @@
+import pytest
+
+from single_table.PlayerDAOV2 import PLAYER_TYPE, PlayerDAOV2
+from single_table.TeamDAOV2 import TEAM_TYPE, TeamDAOV2
+from single_table.TeamSummaryPageDAO import TeamSummaryPageDAO
+from single_table.UnitOfWork import UnitOfWork, VersionConflict
+
+
+def trade(session, summary=False):
+    # Moves Nick Williams from the Phillies to the Yankees, reading the versions first like main.py does
+    work = UnitOfWork(session, summary=summary)
+    phillies, yankees, player = work.versions(team_names=["Phillies", "Yankees"], players=[("Yankees", 555000)])
+    work.delete_player("Phillies", 555000)
+    work.put_player("Nick Williams", 555000, "Yankees", version=player)
+    work.update_team("Phillies", 81, version=phillies)
+    work.update_team("Yankees", 103, version=yankees)
+    return work
+
+
+def read_summary(session, team_name):
+    return TeamSummaryPageDAO(session, summary=True).read(team_name)
+
+
+@pytest.fixture
+def teams(session):
+    TeamDAOV2(session, summary=True).write("Phillies", 80)
+    TeamDAOV2(session, summary=True).write("Yankees", 100)
+    PlayerDAOV2(session, summary=True).write_many([("Nick Williams", 555000, "Phillies"),
+                                                  ("Giancarlo Stanton", 26000000, "Yankees")])
+
+
+def test_trade_commits_and_bumps_the_versions(session, teams):
+    assert trade(session).commit() == [None, 1, 1, 1]
+    assert trade(session).commit() == [None, 2, 2, 2]  # Running it again reads the versions the first one left
+
+
+def test_stale_version_conflicts(session, teams):
+    work = trade(session)
+    other = UnitOfWork(session)  # Someone else changes the Phillies after the versions were read
+    other.update_team("Phillies", 90, version=0)
+    other.commit()
+    with pytest.raises(VersionConflict) as e:
+        work.commit()
+    assert e.value.conflicts == [(TEAM_TYPE, "Phillies")]
+
+
+def test_new_player_that_exists_conflicts(session, teams):
+    trade(session).commit()
+    work = UnitOfWork(session)
+    work.put_player("Nick Williams", 555000, "Yankees")  # version 0, but he was put by the trade
+    with pytest.raises(VersionConflict) as e:
+        work.commit()
+    assert e.value.conflicts == [(PLAYER_TYPE, "Yankees", 555000)]
+
+
+def test_failed_commit_keeps_its_writes(session, dynamo, teams):
+    work = trade(session)
+    dynamo.throttle_rate = 1.0  # Every call is throttled
+    with pytest.raises(Exception):
+        work.commit()
+    dynamo.throttle_rate = 0.0
+    assert work.commit() == [None, 1, 1, 1]
+    assert work.commit() == []
+
+
+def test_summary_follows_the_trade(session, teams):
+    trade(session, summary=True).commit()
+    phillies, yankees = read_summary(session, "Phillies"), read_summary(session, "Yankees")
+    assert phillies["Team"].wins == 81 and phillies["PlayerCount"] == 0 and phillies["Payroll"] == 0
+    assert phillies["Players"] == []
+    assert yankees["Team"].wins == 103 and yankees["PlayerCount"] == 2 and yankees["Payroll"] == 26555000
+    assert [player.player_name for player in yankees["Players"]] == ["Giancarlo Stanton", "Nick Williams"]
+
+
+def test_summary_is_unchanged_by_a_conflict(session, teams):
+    trade(session, summary=True).commit()
+    with pytest.raises(VersionConflict):
+        trade(session, summary=True).commit()  # Williams is no longer a Phillie, the delete finds nothing
+    yankees = read_summary(session, "Yankees")
+    assert yankees["PlayerCount"] == 2 and yankees["Payroll"] == 26555000
+
+
+def test_summary_counts_a_deleted_player_on_no_salary(session, teams):
+    PlayerDAOV2(session, summary=True).write("Walk-on", 0, "Phillies")
+    work = UnitOfWork(session, summary=True)
+    work.delete_player("Phillies", 0)
+    work.commit()
+    phillies = read_summary(session, "Phillies")
+    assert [player.player_name for player in phillies["Players"]] == ["Nick Williams"]
+    assert phillies["PlayerCount"] == 1 and phillies["Payroll"] == 555000
+
+
+def test_summary_is_started_for_a_team_without_one(session, dynamo):
+    TeamDAOV2(session).write("Mets", 70)  # No summary
+    PlayerDAOV2(session).write("Jacob deGrom", 7000000, "Mets")
+    work = UnitOfWork(session, summary=True)
+    work.put_player("Pete Alonso", 555000, "Mets")
+    dynamo.calls.clear()
+    assert work.commit() == [1, None]
+    assert dynamo.calls['TransactWriteItems'] == 2  # Cancelled for the missing roster, then sent again
+    summary = read_summary(session, "Mets")
+    assert summary["PlayerCount"] == 2 and summary["Payroll"] == 7555000  # deGrom was already there
+
+
+def test_team_put_with_player_changes_is_rejected(session):
+    work = UnitOfWork(session, summary=True)
+    work.put_team("Mets", 70)
+    work.put_player("Pete Alonso", 555000, "Mets")
+    with pytest.raises(ValueError):
+        work.commit()
@@ -0,0 +1,218 @@
+import asyncio
+import math
+import threading
+import time
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+from helpers import decorrelated_jitter
+
+# Provisioned tables throttle requests that go over their read/write capacity, and a client that just retries
+# straight away makes things worse for everyone. AWS recommends staying below 80% of a table's capacity, so each table
+# can be given a client side rate limit in RCU/WCU that every DAO (and the bulk loaders) go through:
+#
+#   throttle.configure_table(TABLE_NAME, read_capacity=100, write_capacity=50)
+#
+# The limit adapts to what Dynamo tells us (AIMD, like TCP congestion control): every throttled request halves the rate,
+# every successful one adds a little back, up to the configured target. Throttled requests are retried with
+# decorrelated jitter so that many clients backing off at once don't retry in lockstep.
+# https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+#
+# botocore retries throttled requests itself as well, consider connection.configure(retries={'max_attempts': 1}) so that
+# only the limiter does.
+
+THROTTLE_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+READ_OPERATIONS = ('get_item', 'query', 'scan', 'batch_get_item')
+WRITE_OPERATIONS = ('put_item', 'update_item', 'delete_item', 'batch_write_item', 'transact_write_items')
+
+_limiters = {}  # table name -> (read limiter, write limiter)
+
+
+class AdaptiveRateLimiter():
+    # A token bucket measured in capacity units per second. Callers reserve their units up front and sleep until the
+    # bucket has paid for them, so the bucket can go into debt and the wait is shared fairly between threads.
+    def __init__(self, rate, min_rate=1.0, increase=0.02, decrease=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.increase = increase * rate  # Added to the rate after each successful request
+        self.decrease = decrease  # The rate is multiplied by this after each throttled request
+        self.tokens = rate  # Allow up to a second's worth of burst
+        self.throttles = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units=1):
+        wait = self.reserve(units)
+        if wait:
+            time.sleep(wait)
+
+    def reserve(self, units=1):
+        # Takes the units out of the bucket and returns how long to wait before using them, for callers that can't
+        # block in acquire (the asyncio DAOs)
+        with self._lock:
+            self._refill()
+            self.tokens -= units
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def consume(self, units):
+        # Settle up once the real cost of a request is known (a query's cost depends on how much it read)
+        with self._lock:
+            self._refill()
+            self.tokens -= units
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0)
+            self.throttles += 1
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+def configure_table(table_name, read_capacity=None, write_capacity=None, target_utilization=0.8):
+    # Capacities are the table's provisioned RCU/WCU, the limiter aims for target_utilization of them. Leave one out
+    # to not limit that kind of request.
+    _limiters[table_name] = (
+        AdaptiveRateLimiter(read_capacity * target_utilization) if read_capacity else None,
+        AdaptiveRateLimiter(write_capacity * target_utilization) if write_capacity else None,
+    )
+
+
+def get_limiters(table_name):
+    return _limiters.get(table_name, (None, None))
+
+
+def throttled(table):
+    # Wraps a boto3 Table (or wire.RawTable) so its requests go through the table's limiters. The limiters are looked up
+    # on every request, so configure_table also applies to DAOs that were created before it was called. Requests to
+    # tables without limits go straight through.
+    return ThrottledTable(table)
+
+
+def throttled_async(table):
+    # The same for an aioboto3 Table
+    return AsyncThrottledTable(table)
+
+
+class ThrottledTable():
+    def __init__(self, table, max_attempts=10):
+        self.table = table
+        self.name = table.name
+        self.max_attempts = max_attempts
+        if hasattr(table, 'meta'):
+            # helpers.batch_write/batch_get go through table.meta.client
+            self.meta = SimpleNamespace(client=_ThrottledClient(table.meta.client, self))
+
+    def __getattr__(self, operation):
+        return self.call(getattr(self.table, operation), operation)
+
+    def get_limiter(self, operation):
+        read_limiter, write_limiter = get_limiters(self.name)
+        if operation in READ_OPERATIONS:
+            return read_limiter
+        if operation in WRITE_OPERATIONS:
+            return write_limiter
+        return None
+
+    def call(self, method, operation):
+        limiter = self.get_limiter(operation)
+        if limiter is None:
+            return method
+
+        def call(**kwargs):
+            units = self._estimate_units(operation, kwargs)
+            delay = 0
+            for attempt in range(self.max_attempts):
+                limiter.acquire(units)
+                try:
+                    response = method(**dict(kwargs, ReturnConsumedCapacity=kwargs.get('ReturnConsumedCapacity', 'TOTAL')))
+                except ClientError as e:
+                    delay = self._on_error(limiter, e, attempt, delay)
+                    time.sleep(delay)
+                    continue
+                return self._on_response(limiter, response, units)
+        return call
+
+    def _on_error(self, limiter, error, attempt, delay):
+        # Re-raises anything but throttling (and the last attempt), otherwise returns how long to back off for
+        if error.response['Error']['Code'] not in THROTTLE_ERRORS or attempt == self.max_attempts - 1:
+            raise error
+        limiter.on_throttle()
+        return decorrelated_jitter(delay)
+
+    def _on_response(self, limiter, response, units):
+        limiter.consume(self._consumed_units(response, units) - units)
+        if response.get('UnprocessedItems') or response.get('UnprocessedKeys'):
+            # Batches report throttling by handing items back. The caller sends them again, on_throttle has already
+            # made that wait for the bucket, see paces_retries.
+            limiter.on_throttle()
+        else:
+            limiter.on_success()
+        return response
+
+    @staticmethod
+    def _estimate_units(operation, kwargs):
+        # What we reserve before the request, corrected with the ConsumedCapacity Dynamo sends back
+        if operation == 'batch_write_item':
+            return sum(len(requests) for requests in kwargs['RequestItems'].values())
+        if operation == 'batch_get_item':
+            return sum(len(request['Keys']) for request in kwargs['RequestItems'].values()) / 2
+        if operation == 'transact_write_items':
+            return 2 * len(kwargs['TransactItems'])
+        return 1
+
+    @staticmethod
+    def _consumed_units(response, estimate):
+        consumed = response.get('ConsumedCapacity')
+        if consumed is None:
+            return estimate
+        if isinstance(consumed, list):  # Batches and transactions report one entry per table
+            return math.fsum(entry.get('CapacityUnits', 0) for entry in consumed)
+        return consumed.get('CapacityUnits', estimate)
+
+
+class AsyncThrottledTable(ThrottledTable):
+    # aioboto3's requests are coroutines, and waiting for the bucket or backing off must not block the event loop
+    def call(self, method, operation):
+        limiter = self.get_limiter(operation)
+        if limiter is None:
+            return method
+
+        async def call(**kwargs):
+            units = self._estimate_units(operation, kwargs)
+            delay = 0
+            for attempt in range(self.max_attempts):
+                wait = limiter.reserve(units)
+                if wait:
+                    await asyncio.sleep(wait)
+                try:
+                    response = await method(**dict(kwargs, ReturnConsumedCapacity=kwargs.get('ReturnConsumedCapacity', 'TOTAL')))
+                except ClientError as e:
+                    delay = self._on_error(limiter, e, attempt, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                return self._on_response(limiter, response, units)
+        return call
+
+
+class _ThrottledClient():
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+
+    def __getattr__(self, operation):
+        return self.table.call(getattr(self.client, operation), operation)
+
+    def paces_retries(self, operation):
+        # Whether a batch handed back by this operation has already been backed off for by the limiter. helpers.py then
+        # resends it without sleeping on top, so each partial batch is only backed off for once.
+        return self.table.get_limiter(operation) is not None
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer
+
+# The boto3 resource converts every attribute of every item between Dynamo's wire format ({"N": "81"}) and Python with
+# TypeSerializer/TypeDeserializer, and turns all numbers into Decimal. For hot read paths that is a lot of work for a
+# handful of attributes we already know the types of, so the DAOs' fast_path mode calls the low level client instead and
+# decodes the wire format straight into their records.
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Programming.LowLevelAPI.html#Programming.LowLevelAPI.DataTypeDescriptors
+
+_serializer = TypeSerializer()
+
+
+def decode_number(value):
+    # Dynamo sends numbers as strings. Integers always fit in an int. Anything else only becomes a float if it survives
+    # the round trip unchanged, otherwise we fall back to Decimal like boto3 does.
+    if '.' not in value and 'e' not in value and 'E' not in value:
+        return int(value)
+    number = float(value)
+    return number if repr(number) == value else Decimal(value)
+
+
+class RawTable():
+    # Wraps the low level client so it can be used like a boto3 Table (and with helpers.query_items). Requests are
+    # written the same way, with Key conditions and Python key values, but responses are left in the wire format.
+    def __init__(self, client, table_name):
+        self.client = client
+        self.name = table_name
+
+    def get_item(self, Key, **kwargs):
+        return self.client.get_item(TableName=self.name, Key=self._serialize(Key), **kwargs)
+
+    def query(self, KeyConditionExpression, **kwargs):
+        expression = ConditionExpressionBuilder().build_expression(KeyConditionExpression, is_key_condition=True)
+        kwargs['ExpressionAttributeNames'] = dict(kwargs.get('ExpressionAttributeNames', {}),
+                                                  **expression.attribute_name_placeholders)
+        kwargs['ExpressionAttributeValues'] = self._serialize(expression.attribute_value_placeholders)
+        return self.client.query(
+            TableName=self.name,
+            KeyConditionExpression=expression.condition_expression,
+            **kwargs
+        )
+
+    def scan(self, **kwargs):
+        # ExclusiveStartKey is passed back as it came, already in the wire format
+        return self.client.scan(TableName=self.name, **kwargs)
+
+    @staticmethod
+    def _serialize(values):
+        return {name: _serializer.serialize(value) for name, value in values.items()}